@@ -0,0 +1,172 @@
+import numpy as np
+from aspen_processtools import closure_solvers
+from aspen_warmstart import capture_state, restore_state
+
+########################################################################################################################
+# CONTINUATION ORDERING AND HOMOTOPY STEPPING OF SCENARIO SWEEPS
+########################################################################################################################
+
+# Aspen Plus converges best if a run starts close to the converged state of the run before. Thus, the scenarios of a
+# campaign are ordered along a short path through the scenario table (nearest neighbour, improved by 2-opt), and a
+# scenario far from the last converged scenario is approached by intermediate homotopy steps. The results keep the
+# original scenario ids, only the order of the simulations changes.
+
+def input_vectors(scenarios, inputs=("FLUEGAS CO2 conc",), scale=1.0):
+    # Input vectors of the scenarios divided by the scale of each input (scenarios x inputs)
+    return np.array([[scenario[name] for name in inputs] for scenario in scenarios], dtype=float) / scale
+
+
+def path_length(vectors, order):
+    return float(np.sum(np.linalg.norm(np.diff(vectors[order], axis=0), axis=1)))
+
+
+def continuation_order(scenarios, inputs=("FLUEGAS CO2 conc",), scale=1.0, start=None, max_passes=20):
+    """
+    Order of the scenarios with a short total distance between consecutive scenarios
+    :param scenarios: list of scenarios (e.g. dicts of Scenario_Source)
+    :param inputs: keys of the scenario forming the input vector
+    :param scale: scale of each input (scalar or one per input) for the distance of input vectors
+    :param start: scenario (dict) the path starts closest to, e.g. the state of the bkp file. None starts at the
+                  scenario farthest from the centre of the table, thus the path does not have to return.
+    :param max_passes: maximum number of passes of 2-opt improvement
+    :return: list of indices of the scenarios in simulation order
+    """
+    vectors = input_vectors(scenarios, inputs, scale)
+    n = len(vectors)
+    if n < 3:
+        return list(range(n))
+    distances = np.linalg.norm(vectors[:, np.newaxis] - vectors[np.newaxis], axis=2)
+
+    if start is not None:
+        first = int(np.argmin(np.linalg.norm(vectors - input_vectors([start], inputs, scale)[0], axis=1)))
+    else:
+        first = int(np.argmax(np.linalg.norm(vectors - vectors.mean(axis=0), axis=1)))
+
+    # Nearest neighbour path
+    order = [first]
+    visited = np.zeros(n, dtype=bool)
+    visited[first] = True
+    for _ in range(n - 1):
+        remaining = np.where(visited, np.inf, distances[order[-1]])
+        order.append(int(np.argmin(remaining)))
+        visited[order[-1]] = True
+
+    # 2-opt: reverse a section of the path if this shortens it (the first scenario stays first)
+    order = np.array(order)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, n - 1):
+            a, b = order[i - 1], order[i]
+            # Reversing order[i:j+1] replaces the edges (a, b) and (c, d) by (a, c) and (b, d)
+            c, d = order[i + 1:], np.append(order[i + 2:], -1)
+            change = distances[a, c] - distances[a, b]
+            change[:-1] += distances[b, d[:-1]] - distances[c[:-1], d[:-1]]
+            j = int(np.argmin(change))
+            if change[j] < -1e-12:
+                order[i:i + j + 2] = order[i:i + j + 2][::-1]
+                improved = True
+        if not improved:
+            break
+    return order.tolist()
+
+
+class Continuation:
+    """
+    Simulation of the scenarios of one Aspen Plus instance along a path. If a scenario is farther than max_step from
+    the last converged scenario, intermediate scenarios are simulated first. A step which does not converge is halved
+    down to min_step. Every step starts from the inputs of the last converged scenario (see capture_state), also after a
+    step which did not converge. Below min_step, the scenario is simulated directly.
+    """
+
+    def __init__(self, Aspen_Sim, inputs=("FLUEGAS CO2 conc",), scale=1.0, max_step=0.02, min_step=0.0025):
+        """
+        :param Aspen_Sim: Aspen_Plus_ProcessTools
+        :param inputs: keys of the scenario which are varied by the homotopy steps
+        :param scale: scale of each input (scalar or one per input) for the distance of input vectors
+        :param max_step: maximum scaled distance of consecutive simulations
+        :param min_step: minimum scaled distance of a homotopy step
+        """
+        self.Aspen_Sim = Aspen_Sim
+        self.inputs = list(inputs)
+        self.scale = np.broadcast_to(np.asarray(scale, dtype=float), (len(self.inputs),))
+        self.max_step = max_step
+        self.min_step = min_step
+        # Scaled input vector and state of the flowsheet and the solvers of the last converged scenario
+        self.point = None
+        self.state = None
+        self.homotopy_steps = 0
+
+    def converged(self, Aspen_Plus, point, solvers):
+        # The flowsheet holds the converged state of point
+        self.point = point
+        self.state = capture_state(Aspen_Plus, solvers)
+
+    def reset(self, Aspen_Plus, solvers):
+        # Return to the inputs of the last converged scenario after a simulation which did not converge
+        if self.state is not None:
+            restore_state(Aspen_Plus, self.state, solvers)
+
+    def restore(self, Aspen_Plus, scenario, target, solvers, warm_start):
+        # Restore the nearest state of the warm-start store if it is closer to the scenario than the last converged
+        # scenario of this instance, the homotopy steps start from the restored state
+        found = warm_start.nearest(scenario)
+        if found is None:
+            return False
+        stored = dict(scenario)
+        stored.update(zip(warm_start.inputs, found[3].tolist()))
+        point = input_vectors([stored], self.inputs, self.scale)[0]
+        if self.point is not None and np.linalg.norm(target - point) >= np.linalg.norm(target - self.point):
+            return False
+        if warm_start.restore(Aspen_Plus, scenario, solvers):
+            self.converged(Aspen_Plus, point, solvers)
+            return True
+        return False
+
+    def simulate(self, Aspen_Plus, scenario, closure="sequential", solvers=None, warm_start=None, **options):
+        """
+        Simulate a scenario, with homotopy steps from the last converged scenario or from a closer state of the
+        warm-start store (see Aspen_Plus_ProcessTools.simulate). The homotopy steps only adjust the design specification
+        and close the balances (see Aspen_Plus_ProcessTools.step), the results are retrieved and the state is saved to
+        the warm-start store for the scenario only.
+        :return: result of the scenario with the number of homotopy steps. The closure runs include the runs of the
+                 homotopy steps.
+        """
+        solvers = solvers if solvers is not None else closure_solvers()
+        target = input_vectors([scenario], self.inputs, self.scale)[0]
+        if warm_start is not None:
+            self.restore(Aspen_Plus, scenario, target, solvers, warm_start)
+
+        steps = 0
+        closure_runs = 0
+        step = self.max_step
+
+        while self.point is not None and np.linalg.norm(target - self.point) > step >= self.min_step:
+            point = self.point + step * (target - self.point) / np.linalg.norm(target - self.point)
+            intermediate = dict(scenario)
+            intermediate.update(zip(self.inputs, (point * self.scale).tolist()))
+            values = ", ".join(f"{name} {intermediate[name]:.5g}" for name in self.inputs)
+            print(f"  Homotopy step {steps + 1}: {values}")
+
+            Aspen_Result, _, runs, converged = self.Aspen_Sim.step(Aspen_Plus, intermediate, closure, solvers,
+                                                                   **options)
+            steps += 1
+            closure_runs += runs
+            if converged:
+                self.converged(Aspen_Result, point, solvers)
+                step = self.max_step
+            else:
+                # The halved step starts from the last converged scenario, not from the diverged flowsheet
+                self.reset(Aspen_Plus, solvers)
+                step /= 2
+
+        Aspen_Result, status, runs, converged = self.Aspen_Sim.step(Aspen_Plus, scenario, closure, solvers, **options)
+        data = self.Aspen_Sim.retrieve_results(Aspen_Result)
+        if converged:
+            self.converged(Aspen_Result, target, solvers)
+            if warm_start is not None:
+                warm_start.save(Aspen_Result, scenario, solvers)
+        else:
+            self.reset(Aspen_Plus, solvers)
+        self.homotopy_steps += steps
+        return {"data": data, "status": status, "closure_runs": closure_runs + runs, "converged": converged,
+                "homotopy_steps": steps}
@@ -0,0 +1,274 @@
+import numpy as np
+
+########################################################################################################################
+# SOLVERS FOR CLOSING MASS BALANCES OF TEAR STREAMS
+########################################################################################################################
+
+# The mass balances of the tear streams are closed by adjusting manipulated variables (e.g. the CO2 loading of LEANMEA)
+# until the residuals (e.g. the difference of the MEA mass flows of LEANMEA and LEANMEAC) are within the tolerance.
+# Every evaluation of the residuals is a full Aspen Plus run. Thus, the solvers estimate the slope (Jacobian) of the
+# residuals from the runs already done and keep the estimate for the next closure.
+
+class Secant_Solver:
+    """
+    Secant steps for one manipulated variable. As soon as the root is bracketed by residuals of opposite sign, the
+    steps stay inside the bracket (regula falsi). Steps are limited to max_step and to the bounds.
+    """
+
+    def __init__(self, slope, max_step=np.inf, lower=-np.inf, upper=np.inf):
+        """
+        :param slope: estimate of d residual / d variable, updated by every step and kept for the next closure
+        :param max_step: maximum change of the variable per step
+        :param lower: lower bound of the variable
+        :param upper: upper bound of the variable
+        """
+        self.slope = slope
+        self.max_step = max_step
+        self.lower = lower
+        self.upper = upper
+        self.reset()
+
+    def reset(self):
+        # Start a new closure (the slope estimate is kept)
+        self._last = None
+        self._below = None
+        self._above = None
+
+    def step(self, x, r):
+        """
+        :param x: current value of the variable (array of size 1)
+        :param r: residual at x (array of size 1)
+        :return: next value of the variable (array of size 1)
+        """
+        x = float(np.ravel(x)[0])
+        r = float(np.ravel(r)[0])
+
+        # Secant slope from the last run, only accepted with the expected sign
+        if self._last is not None:
+            x_last, r_last = self._last
+            if x != x_last and r != r_last:
+                slope = (r - r_last) / (x - x_last)
+                if np.sign(slope) == np.sign(self.slope):
+                    self.slope = slope
+        self._last = (x, r)
+
+        if r < 0:
+            self._below = (x, r)
+        else:
+            self._above = (x, r)
+
+        x_new = x + np.clip(-r / self.slope, -self.max_step, self.max_step)
+
+        if self._below is not None and self._above is not None:
+            (x1, r1), (x2, r2) = self._below, self._above
+            if not min(x1, x2) < x_new < max(x1, x2):
+                x_new = x1 - r1 * (x2 - x1) / (r2 - r1)
+
+        return np.array([np.clip(x_new, self.lower, self.upper)])
+
+    def candidates(self, points, count, spread=0.5):
+        """
+        Several next values of the variable which are evaluated at once (see close_balance_speculative). If the root is
+        bracketed, the candidates divide the tightest bracket evenly, plus the regula falsi estimate. Otherwise, they
+        are spread around the secant step from the point with the smallest residual, or placed at multiples of max_step
+        if the secant step exceeds it.
+        :param points: list of (variable, residual) of all runs of the closure
+        :param count: number of candidates
+        :param spread: spacing of the candidates relative to the secant step
+        :return: array of candidates
+        """
+        xs = np.array([point[0] for point in points], dtype=float)
+        rs = np.array([point[1] for point in points], dtype=float)
+
+        # Secant slope from the points with the smallest residuals, only accepted with the expected sign
+        order = np.argsort(np.abs(rs))
+        x_best, r_best = xs[order[0]], rs[order[0]]
+        for k in order[1:]:
+            if xs[k] != x_best and rs[k] != r_best:
+                slope = (rs[k] - r_best) / (xs[k] - x_best)
+                if np.sign(slope) == np.sign(self.slope):
+                    self.slope = slope
+                break
+
+        below, above = np.where(rs < 0)[0], np.where(rs >= 0)[0]
+        if len(below) and len(above):
+            widths = np.abs(xs[below][:, np.newaxis] - xs[above][np.newaxis])
+            i, j = np.unravel_index(np.argmin(widths), widths.shape)
+            (x1, r1), (x2, r2) = (xs[below[i]], rs[below[i]]), (xs[above[j]], rs[above[j]])
+            candidates = np.append(np.linspace(x1, x2, count + 1)[1:-1], x1 - r1 * (x2 - x1) / (r2 - r1))
+        elif abs(r_best / self.slope) > self.max_step:
+            # The root is farther than the maximum step: the candidates march towards it in multiples of the step
+            step = -np.sign(r_best / self.slope) * self.max_step
+            candidates = x_best + step * np.arange(1, count + 1)
+        else:
+            step = -r_best / self.slope
+            candidates = x_best + step * (1 + spread * (np.arange(count) - (count - 1) / 2))
+
+        return np.unique(np.clip(candidates, self.lower, self.upper))
+
+    def get_estimate(self):
+        return self.slope
+
+    def set_estimate(self, slope):
+        # Slope estimate of a converged state (see Warm_Start_Store)
+        self.slope = slope
+
+
+class Broyden_Solver:
+    """
+    Quasi-Newton steps for several manipulated variables. The Jacobian estimate is updated by Broyden's rank-one update
+    after every run and kept for the next closure. Steps are scaled down to max_step and clipped to the bounds.
+    """
+
+    def __init__(self, jacobian, max_step=np.inf, lower=-np.inf, upper=np.inf):
+        """
+        :param jacobian: estimate of d residuals / d variables (residuals x variables)
+        :param max_step: maximum change of each variable per step (scalar or array)
+        :param lower: lower bounds of the variables (scalar or array)
+        :param upper: upper bounds of the variables (scalar or array)
+        """
+        self.jacobian = np.array(jacobian, dtype=float)
+        self.max_step = np.broadcast_to(np.asarray(max_step, dtype=float), (self.jacobian.shape[1],))
+        self._scale = np.where(np.isfinite(self.max_step), self.max_step, 1.0)
+        self.lower = lower
+        self.upper = upper
+        self.reset()
+
+    def reset(self):
+        # Start a new closure (the Jacobian estimate is kept)
+        self._last = None
+
+    def step(self, x, r):
+        """
+        :param x: current values of the variables
+        :param r: residuals at x
+        :return: next values of the variables
+        """
+        x = np.asarray(x, dtype=float)
+        r = np.asarray(r, dtype=float)
+
+        # Broyden update in variables scaled by max_step, as the variables may differ by orders of magnitude
+        if self._last is not None:
+            x_last, r_last = self._last
+            dx = x - x_last
+            weights = dx / self._scale ** 2
+            if weights @ dx > 0:
+                self.jacobian += np.outer(r - r_last - self.jacobian @ dx, weights) / (weights @ dx)
+        self._last = (x, r)
+
+        dx = -np.linalg.lstsq(self.jacobian, r, rcond=None)[0]
+        with np.errstate(divide="ignore"):
+            scale = min(1.0, np.min(self.max_step / np.abs(dx)))
+        return np.clip(x + scale * dx, self.lower, self.upper)
+
+    def get_estimate(self):
+        return self.jacobian.tolist()
+
+    def set_estimate(self, jacobian):
+        # Jacobian estimate of a converged state (see Warm_Start_Store)
+        self.jacobian = np.array(jacobian, dtype=float)
+
+
+def close_balance(Aspen_Plus, x0, set_variables, get_residuals, solver, tol, max_runs=25, name="Delta"):
+    """
+    Close a balance with one Aspen Plus run per step of the solver
+    :param Aspen_Plus: Aspen_Plus_Interface
+    :param x0: current values of the manipulated variables
+    :param set_variables: function writing the manipulated variables to Aspen Plus, called with the array of values
+    :param get_residuals: function reading the residuals from the results of the last run, returns an array
+    :param solver: Secant_Solver or Broyden_Solver
+    :param tol: tolerance of the residuals (scalar or array)
+    :param max_runs: maximum number of Aspen Plus runs
+    :param name: name of the residuals for printing
+    :return: values of the variables, residuals and number of Aspen Plus runs. The residuals are inf if a run was
+             stopped at the time limit.
+    """
+    solver.reset()
+    x = np.atleast_1d(np.asarray(x0, dtype=float))
+    r = np.atleast_1d(get_residuals())
+    print(f"  {name}: ", np.round(r, 2))
+
+    runs = 0
+    while np.any(np.abs(r) > tol) and runs < max_runs:
+        runs += 1
+        x = solver.step(x, r)
+        set_variables(x)
+
+        Aspen_Plus.run_simulation()
+        if not Aspen_Plus.check_run_completion():
+            # The results of a stopped run are not valid, the closure is not continued from them
+            r = np.full(r.shape, np.inf)
+            print(f"  Check {runs}: run stopped at the time limit, {name.lower()} not closed")
+            break
+
+        r = np.atleast_1d(get_residuals())
+        print(f"  Check {runs}: variables ", np.round(x, 5), f", {name.lower()} ", np.round(r, 2))
+
+    return x, r, runs
+
+
+def close_balance_speculative(instances, x0, set_variable, get_residual, solver, tol, max_rounds=25, spread=0.5,
+                              name="Delta"):
+    """
+    Close a balance with several Aspen Plus instances at once. Each round runs one candidate of the manipulated variable
+    (see Secant_Solver.candidates) per instance, except on the instance holding the best state so far, which is kept.
+    The residuals of all candidates bracket the root. The runs of a round are started asynchronously, thus they overlap.
+    :param instances: list of Aspen_Plus_Interface with the same inputs, the first holds the results of x0
+    :param x0: current value of the manipulated variable
+    :param set_variable: function writing the variable to an instance, called with the instance and the value
+    :param get_residual: function reading the residual from the results of an instance, called with the instance
+    :param solver: Secant_Solver
+    :param tol: tolerance of the residual
+    :param max_rounds: maximum number of rounds of parallel runs
+    :param spread: spacing of the candidates relative to the secant step
+    :param name: name of the residual for printing
+    :return: value of the variable with the smallest residual of all runs, its residual, the instance holding its
+             results and the number of Aspen Plus runs
+    """
+    solver.reset()
+    best = instances[0]
+    x = float(np.ravel(x0)[0])
+    r = float(np.ravel(get_residual(best))[0])
+    points = [(x, r)]
+    print(f"  {name}: ", round(r, 2))
+
+    runs = 0
+    rounds = 0
+    # False if the state of x was overwritten by a candidate (only with a single instance)
+    held = True
+    while abs(r) > tol and rounds < max_rounds:
+        rounds += 1
+        others = [Aspen_Plus for Aspen_Plus in instances if Aspen_Plus is not best] or [best]
+        candidates = solver.candidates(points, len(others), spread).tolist()
+        active = others[:len(candidates)]
+
+        # The runs of all instances are started first and waited for afterwards, thus they run at the same time
+        for Aspen_Plus, candidate in zip(active, candidates):
+            set_variable(Aspen_Plus, candidate)
+            Aspen_Plus.run_simulation(asynchronous=True)
+        completed = [Aspen_Plus.check_run_completion() for Aspen_Plus in active]
+        runs += len(active)
+        if best in active:
+            held = False
+
+        # The results of runs stopped at the time limit are not valid
+        results = [(candidate, float(np.ravel(get_residual(Aspen_Plus))[0]), Aspen_Plus)
+                   for Aspen_Plus, candidate, done in zip(active, candidates, completed) if done]
+        points += [(candidate, residual) for candidate, residual, _ in results]
+        for candidate, residual, Aspen_Plus in results:
+            if abs(residual) < abs(r):
+                x, r, best, held = candidate, residual, Aspen_Plus, True
+        print(f"  Round {rounds}: candidates ", np.round(candidates, 5), f", {name.lower()} ",
+              [round(residual, 2) for _, residual, _ in results])
+        if not results:
+            print(f"  Round {rounds}: all runs stopped at the time limit, {name.lower()} not closed")
+            break
+
+    if not held:
+        # The single instance ran a worse candidate last, the best state is simulated again
+        set_variable(best, x)
+        best.run_simulation()
+        runs += 1
+        r = float(np.ravel(get_residual(best))[0]) if best.check_run_completion() else np.inf
+
+    return x, r, best, runs
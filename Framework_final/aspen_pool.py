@@ -0,0 +1,357 @@
+import collections
+import multiprocessing as mp
+import multiprocessing.connection
+import os
+import shutil
+import time
+
+########################################################################################################################
+# POOL OF ASPEN PLUS INSTANCES FOR PARALLEL SCENARIOS
+########################################################################################################################
+
+# Each worker process runs its own simulation backend, by default an Aspen Plus instance with its own COM apartment and
+# a private copy of the bkp file in the run directory of the worker. The scenarios are handed out one by one to the
+# next free worker and the results are returned in scenario order. After a number of runs a worker closes its backend
+# and starts a new one, which limits the effect of memory leaks and corrupted states of Aspen Plus. The backend can be
+# replaced by a local stand-in (Local_Backend) to test the scheduling without Aspen Plus.
+#
+# The pool supervises the workers: a worker whose process exited, whose heartbeat stopped (e.g. a COM call to a hung
+# Aspen Plus) or whose scenario exceeded its wall-clock budget is killed together with its Aspen Plus instance. A new
+# worker reloads the bkp file and the scenario is retried, after the last retry it is returned as failed.
+
+class Aspen_Backend:
+    """
+    Aspen Plus instance of one worker process
+    """
+
+    def __init__(self, worker, run_dir, bkp_file, closure="sequential", visible_state=0, dialog_state=1,
+                 heartbeat=None, started=None, warm_start=None, continuation=None, helpers=0):
+        """
+        :param worker: index of the worker
+        :param run_dir: run directory of the worker, receives the copy of the bkp file
+        :param bkp_file: location of the Aspen Plus file
+        :param closure: closure of the balances of the tear streams (see Aspen_Plus_ProcessTools.simulate)
+        :param visible_state: Aspen Plus user interface, 0 is invisible and 1 is visible
+        :param dialog_state: Aspen Plus dialogs, 0 is not to suppress and 1 is to suppress
+        :param heartbeat: function called while Aspen Plus is running
+        :param started: function called with the process IDs of the Aspen Plus instances as soon as they are started
+        :param warm_start: dict of arguments of the Warm_Start_Store shared by the workers (absolute filepath), None for
+                           no warm starts
+        :param continuation: dict of arguments of Continuation (e.g. {"max_step": 0.02}) for homotopy steps between the
+                             scenarios of the worker, None for no homotopy steps
+        :param helpers: number of further Aspen Plus instances of the worker for closure="speculative"
+        """
+        # Aspen Plus and COM are only imported in the worker, thus the pool itself runs without them
+        import pythoncom
+        from aspen_processtools import Aspen_Plus_Interface, Aspen_Plus_ProcessTools, closure_solvers
+        from aspen_utils import AspenProcessIDs
+        from aspen_warmstart import Warm_Start_Store
+        from aspen_campaign import Continuation
+
+        pythoncom.CoInitialize()
+        bkp_copy = shutil.copy(bkp_file, os.path.join(run_dir, os.path.basename(bkp_file)))
+        os.chdir(run_dir)
+
+        # The instances are started one after another (see _pool_worker), thus the new AspenPlus.exe processes are the
+        # only ones which were not running before
+        running = AspenProcessIDs()
+        self.Aspen_Plus = Aspen_Plus_Interface()
+        self.helpers = [Aspen_Plus_Interface() for _ in range(helpers)]
+        self.process_ids = sorted(AspenProcessIDs() - running)
+        if started is not None:
+            started(self.process_ids)
+
+        # Instances which cannot load the bkp file are not left running
+        try:
+            for Aspen_Plus in [self.Aspen_Plus] + self.helpers:
+                Aspen_Plus.heartbeat = heartbeat
+                Aspen_Plus.load_bkp(bkp_copy, visible_state, dialog_state)
+        except Exception:
+            self.kill(self.process_ids)
+            raise
+        self.Aspen_Sim = Aspen_Plus_ProcessTools()
+        self.solvers = closure_solvers()
+        self.closure = closure
+        self.warm_start = Warm_Start_Store(bkp_file=bkp_copy, **warm_start) if warm_start else None
+        self.continuation = Continuation(self.Aspen_Sim, **continuation) if continuation else None
+
+    def run(self, scenario):
+        simulator = self.continuation if self.continuation is not None else self.Aspen_Sim
+        return simulator.simulate(self.Aspen_Plus, scenario, self.closure, self.solvers, warm_start=self.warm_start,
+                                  helpers=self.helpers)
+
+    def close(self):
+        import pythoncom
+        if self.warm_start is not None:
+            self.warm_start.close()
+        for Aspen_Plus in [self.Aspen_Plus] + self.helpers:
+            Aspen_Plus.close_bkp()
+        pythoncom.CoUninitialize()
+
+    @staticmethod
+    def kill(process_ids):
+        # Kill the Aspen Plus instances of a worker which was terminated by the pool
+        from aspen_utils import KillAspenProcess
+        for process_id in process_ids:
+            KillAspenProcess(process_id)
+
+
+def echo_scenario(scenario):
+    # Result of the stand-in backend
+    return {"scenario": scenario}
+
+
+class Local_Backend:
+    """
+    Stand-in for Aspen_Backend without Aspen Plus, e.g. for testing the pool on Linux
+    """
+
+    def __init__(self, worker, run_dir, evaluate=echo_scenario, delay=0.0, heartbeat=None, started=None):
+        """
+        :param evaluate: function of the scenario returning the result (must be importable by the worker processes)
+        :param delay: simulated run time in s
+        :param heartbeat: function called while the run is simulated
+        :param started: function called with the process IDs of the backend (none for the stand-in)
+        """
+        self.worker = worker
+        self.evaluate = evaluate
+        self.delay = delay
+        self.heartbeat = heartbeat
+        self.process_ids = []
+
+    def run(self, scenario):
+        end = time.perf_counter() + self.delay
+        while time.perf_counter() < end:
+            time.sleep(min(0.1, end - time.perf_counter()))
+            if self.heartbeat is not None:
+                self.heartbeat()
+        return self.evaluate(scenario)
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def kill(process_ids):
+        pass
+
+
+def _discard(backend, instance):
+    # Close a backend, a backend which cannot be closed (e.g. a crashed Aspen Plus) is killed
+    try:
+        instance.close()
+    except Exception:
+        backend.kill(instance.process_ids)
+
+
+def _pool_worker(worker, backend, backend_options, run_dir, recycle_after, connection, heartbeat, start_lock,
+                 start_timeout):
+    os.makedirs(run_dir, exist_ok=True)
+    # Backends may change the working directory, new backends start from the original one
+    home = os.getcwd()
+
+    def beat():
+        heartbeat.value = time.time()
+
+    instance = None
+    runs = 0
+    while True:
+        task = connection.recv()
+        if task is None:
+            break
+        index, scenario = task
+        beat()
+
+        def started(process_ids):
+            # The pool can kill the Aspen Plus instances also if the worker hangs while loading the bkp file
+            connection.send(("processes", index, process_ids))
+
+        try:
+            if instance is None:
+                os.chdir(home)
+                # A lock of a killed worker is never released, thus the lock is only waited for until start_timeout
+                locked = start_lock.acquire(timeout=start_timeout)
+                try:
+                    instance = backend(worker, run_dir, heartbeat=beat, started=started, **backend_options)
+                finally:
+                    if locked:
+                        start_lock.release()
+            beat()
+            connection.send(("running", index))
+            result = instance.run(scenario)
+        except Exception as error:
+            # The backend may be broken (e.g. a crashed Aspen Plus), the next scenario starts a new one
+            if instance is not None:
+                _discard(backend, instance)
+                instance = None
+                connection.send(("processes", index, []))
+            connection.send(("result", index, None, repr(error)))
+            continue
+        connection.send(("result", index, result, None))
+
+        runs += 1
+        if recycle_after and runs % recycle_after == 0:
+            _discard(backend, instance)
+            instance = None
+            connection.send(("processes", index, []))
+
+    if instance is not None:
+        _discard(backend, instance)
+
+
+class Aspen_Pool:
+
+    def __init__(self, workers=2, backend=Aspen_Backend, backend_options=None, work_dir="Aspen_Pool",
+                 recycle_after=50, scenario_timeout=3600, heartbeat_timeout=300, retries=2, check_interval=1.0):
+        """
+        :param workers: number of worker processes, each with its own backend (e.g. one Aspen Plus licence each)
+        :param backend: class of the backend (Aspen_Backend or Local_Backend), created in the worker process as
+                        backend(worker, run_dir, heartbeat=..., **backend_options)
+        :param backend_options: dict of further arguments of the backend, e.g. {"bkp_file": ...} for Aspen_Backend
+        :param work_dir: directory of the run directories of the workers
+        :param recycle_after: number of scenarios after which a worker starts a new backend, None for never
+        :param scenario_timeout: wall-clock budget of a scenario in s, None for no budget. Starting a new backend (e.g.
+                                 loading the bkp file) has a budget of the same length.
+        :param heartbeat_timeout: maximum time without heartbeat of a busy worker in s, None for no limit. Must exceed
+                                  the time limit of a single Aspen Plus run (see check_run_completion).
+        :param retries: number of retries of a scenario after its worker was killed or its backend failed
+        :param check_interval: interval of checking the workers in s
+        """
+        self.workers = workers
+        self.backend = backend
+        self.backend_options = backend_options or {}
+        self.work_dir = work_dir
+        self.recycle_after = recycle_after
+        self.scenario_timeout = scenario_timeout
+        self.heartbeat_timeout = heartbeat_timeout
+        self.retries = retries
+        self.check_interval = check_interval
+        self.restarts = 0
+
+    def _start_worker(self, context, worker, start_lock):
+        connection, worker_connection = context.Pipe()
+        heartbeat = context.Value("d", time.time(), lock=False)
+        run_dir = os.path.abspath(os.path.join(self.work_dir, f"worker_{worker}"))
+        process = context.Process(
+            target=_pool_worker,
+            args=(worker, self.backend, self.backend_options, run_dir, self.recycle_after, worker_connection,
+                  heartbeat, start_lock, self.scenario_timeout),
+        )
+        process.start()
+        worker_connection.close()
+        return {"worker": worker, "process": process, "connection": connection, "heartbeat": heartbeat,
+                "task": None, "since": None, "process_ids": []}
+
+    def _stop_worker(self, slot, timeout=0):
+        # Stop the worker, a worker which does not finish within the timeout is terminated with its Aspen Plus instance
+        if timeout:
+            try:
+                slot["connection"].send(None)
+            except OSError:
+                pass
+            slot["process"].join(timeout=timeout)
+        if slot["process"].is_alive():
+            slot["process"].terminate()
+            slot["process"].join(timeout=5)
+            if slot["process_ids"]:
+                self.backend.kill(slot["process_ids"])
+        slot["connection"].close()
+
+    def _failure(self, slot, now):
+        # Reason for killing a busy worker, None if the worker is healthy
+        if not slot["process"].is_alive():
+            return f"worker exited with code {slot['process'].exitcode}"
+        if self.scenario_timeout and now - slot["since"] > self.scenario_timeout:
+            return f"no result within {self.scenario_timeout} s"
+        if self.heartbeat_timeout and now - max(slot["heartbeat"].value, slot["since"]) > self.heartbeat_timeout:
+            return f"no heartbeat for {self.heartbeat_timeout} s"
+        return None
+
+    def imap(self, scenarios):
+        """
+        Simulate the scenarios on the workers
+        :param scenarios: list of scenarios (e.g. dicts of Scenario_Source)
+        :return: generator of the results in scenario order. The result of a scenario is the dict returned by the
+                 backend with the index of the worker and the number of attempts, or a dict with the error if the
+                 scenario failed.
+        """
+        scenarios = list(scenarios)
+
+        # Spawn (default on Windows) starts the workers with a fresh interpreter, each with its own COM apartment
+        context = mp.get_context("spawn")
+        start_lock = context.Lock()
+        queue = collections.deque(range(len(scenarios)))
+        attempts = [0] * len(scenarios)
+        slots = [self._start_worker(context, worker, start_lock) for worker in range(min(self.workers, len(scenarios)))]
+
+        # Results arriving before the results of earlier scenarios are kept until they are due
+        pending = {}
+        next_index = 0
+
+        def retry(index, worker, error):
+            # The scenario is retried on a new backend, after the last retry it is returned as failed
+            if attempts[index] <= self.retries:
+                queue.appendleft(index)
+            else:
+                pending[index] = {"error": error, "worker": worker, "attempts": attempts[index]}
+
+        def replace(position, failure):
+            # Kill a worker with its Aspen Plus instances and start a new one
+            slot = slots[position]
+            index = slot["task"]
+            print(f"  Worker {slot['worker']} killed in attempt {attempts[index]} of scenario {index}: {failure}")
+            self._stop_worker(slot)
+            slots[position] = self._start_worker(context, slot["worker"], start_lock)
+            self.restarts += 1
+            retry(index, slot["worker"], failure)
+
+        try:
+            while next_index < len(scenarios):
+                for position, slot in enumerate(slots):
+                    if slot["task"] is None and queue:
+                        index = queue.popleft()
+                        attempts[index] += 1
+                        slot["task"], slot["since"] = index, time.time()
+                        try:
+                            slot["connection"].send((index, scenarios[index]))
+                        except OSError:
+                            replace(position, "worker exited while idle")
+
+                busy = {slot["connection"]: slot for slot in slots if slot["task"] is not None}
+                for connection in mp.connection.wait(list(busy), timeout=self.check_interval):
+                    slot = busy[connection]
+                    try:
+                        message = connection.recv()
+                    except (EOFError, OSError):
+                        # The worker exited, it is restarted below
+                        continue
+                    if message[0] == "processes":
+                        slot["process_ids"] = message[2]
+                    elif message[0] == "running":
+                        # The budget of the scenario starts when the backend is ready
+                        slot["since"] = time.time()
+                    else:
+                        index, result, error = message[1:]
+                        slot["task"] = None
+                        if error is not None:
+                            print(f"  Worker {slot['worker']} failed in attempt {attempts[index]} of scenario "
+                                  f"{index}: {error}")
+                            retry(index, slot["worker"], error)
+                        else:
+                            pending[index] = result
+                            pending[index].update(worker=slot["worker"], attempts=attempts[index])
+
+                now = time.time()
+                for position, slot in enumerate(slots):
+                    failure = self._failure(slot, now) if slot["task"] is not None else None
+                    if failure is not None:
+                        replace(position, failure)
+
+                while next_index in pending:
+                    yield pending.pop(next_index)
+                    next_index += 1
+        finally:
+            for slot in slots:
+                self._stop_worker(slot, timeout=30)
+
+    def map(self, scenarios):
+        return list(self.imap(scenarios))
@@ -1,4 +1,6 @@
 from aspen_utils import *
+from aspen_closure import *
+import os
 import pandas as pd
 from openpyxl import load_workbook
 
@@ -16,6 +18,145 @@ MassConc_MEA = 0.3 # wt%
 FluegasH2Oconc = 0.1125 # vol%
 FluegasO2conc = 0.0381 # vol%
 
+# Molar mass of CO2 in g/mol as used by Aspen Plus for the target value of the design specification
+MolarMass_CO2 = 44.0095
+
+# Molar masses of the components of FLUEGAS in g/mol as used by Aspen Plus
+MolarMasses_FLUEGAS = {"CO2": MolarMass_CO2, "N2": 28.0134, "O2": 31.9988, "H2O": 18.01528}
+
+# Units of the total flow of FLUEGAS on a mole basis (FLOWBASE MOLE) and their factor to kmol/h
+MoleFlowUnits = {"kmol/hr": 1, "mol/hr": 1e-3, "kmol/sec": 3600, "mol/sec": 3.6, "kmol/min": 60, "mol/min": 0.06}
+
+# Units of the total flow of FLUEGAS on a mass basis (FLOWBASE MASS) and their factor to kg/h
+MassFlowUnits = {"kg/hr": 1, "kg/sec": 3600, "kg/min": 60, "tonne/hr": 1000, "g/hr": 1e-3, "lb/hr": 0.45359237}
+
+# Composition bases of FLUEGAS on a mole and on a mass basis (the bkp file omits BASIS for mole fractions)
+MoleCompositionBases = (None, "", "MOLE-FRAC", "MOLE-FLOW")
+MassCompositionBases = ("MASS-FRAC", "MASS-FLOW")
+
+def fluegas_N2conc(FluegasCO2conc):
+    # N2 conc. of the flue gas (concentration of H2O and O2 are kept constant.)
+    return 1 - FluegasCO2conc - FluegasO2conc - FluegasH2Oconc
+
+def H2OLoading_30wt(LEANMEA_CO2Loading):
+    # H2O loading in LEANMEA for the given CO2 loading to achieve 30 wt% MEA
+    return (1 / Mol_H2O) * (Mol_MEA / MassConc_MEA - Mol_MEA - LEANMEA_CO2Loading * Mol_CO2)
+
+def MEA_closure_solver():
+    # Secant solver for the MEA balance: CO2 loading of LEANMEA. Slope and maximum step correspond to the largest step
+    # of the step ladder of check_MEAbalance_tearstreams (0.01 for a delta MEA above 50 kg/h).
+    return Secant_Solver(slope=-5000, max_step=0.01, lower=0, upper=0.5)
+
+def water_closure_solver():
+    # Secant solver for the water balance: net water make-up (MAKEUP H2O - WATOUT) in kg/h, which lowers delta water by
+    # about the same amount
+    return Secant_Solver(slope=-1, max_step=500)
+
+def coupled_closure_solver():
+    # Broyden solver for closing MEA and water balance together: CO2 loading of LEANMEA and net water make-up. The
+    # coupling of both balances is learned from the runs.
+    return Broyden_Solver(jacobian=[[-5000, 0], [0, -1]], max_step=[0.01, 500], lower=[0, -np.inf], upper=[0.5, np.inf])
+
+def closure_solvers():
+    # Closure solvers of one Aspen Plus instance, their estimates are reused for all its runs
+    return {"MEA": MEA_closure_solver(), "H2O": water_closure_solver(), "coupled": coupled_closure_solver()}
+
+########################################################################################################################
+# SCENARIO TABLE
+########################################################################################################################
+
+class Scenario_Source:
+    """
+    Process parameters of all runs of a campaign (one row per run). The table is parsed once from an xlsx, csv or
+    Parquet file and checked for feasibility before any simulation is started.
+    """
+
+    def __init__(self, filepath, column_names=None, percent_columns=("FLUEGAS CO2 conc",), check=True):
+        """
+        :param filepath: scenario table (.xlsx, .csv or .parquet), one row per run after the header
+        :param column_names: names replacing the header of the table, e.g. ["Runs", "FLUEGAS CO2 conc"]
+        :param percent_columns: columns given in %, which are converted to fractions
+        :param check: check the feasibility of all runs (see check_feasibility)
+        """
+        extension = os.path.splitext(filepath)[1].lower()
+        if extension in (".xlsx", ".xls"):
+            table = pd.read_excel(filepath, names=column_names)
+        elif extension == ".csv":
+            table = pd.read_csv(filepath, names=column_names, header=0 if column_names else "infer")
+        elif extension == ".parquet":
+            table = pd.read_parquet(filepath)
+            if column_names:
+                table.columns = column_names
+        else:
+            raise ValueError(f"Scenario table must be .xlsx, .csv or .parquet: {filepath}")
+
+        table = table.dropna(how="all").reset_index(drop=True)
+        for column in table.columns:
+            numeric = pd.to_numeric(table[column], errors="coerce")
+            if numeric.notna().sum() == table[column].notna().sum():
+                table[column] = numeric
+        for column in percent_columns:
+            if column in table:
+                table[column] = table[column] / 100
+
+        self.filepath = filepath
+        self.table = table
+        if check:
+            self.check_feasibility()
+
+    def check_feasibility(self):
+        """
+        Check all runs before spending simulation time, raises a ValueError naming the infeasible runs. The N2 conc. of
+        the flue gas set by design_spec must stay positive.
+        """
+        infeasible = []
+        if "FLUEGAS CO2 conc" in self.table:
+            for i, FluegasCO2conc in enumerate(self.table["FLUEGAS CO2 conc"]):
+                if not 0 <= FluegasCO2conc or fluegas_N2conc(FluegasCO2conc) <= 0:
+                    infeasible.append(f"run {i + 1}: FLUEGAS CO2 conc {FluegasCO2conc}")
+        if infeasible:
+            raise ValueError(f"Infeasible scenarios in {self.filepath}: " + ", ".join(infeasible))
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, i):
+        # Parameters of run i (0-based) as dict of column and value
+        return {column: value.item() if isinstance(value, np.generic) else value
+                for column, value in self.table.iloc[i].items()}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+# Scenario tables parsed by get_fluegasCO2 with the modification time of their file, by file and column names
+_scenario_sources = {}
+
+########################################################################################################################
+# NODES OF THE TEAR STREAMS AND THE WATER BALANCE
+########################################################################################################################
+
+# CO2 and H2O loading of tear stream LEANMEA
+LEANMEA_Loadings = [r"\Data\Streams\LEANMEA\Input\FLOW\MIXED\CO2", r"\Data\Streams\LEANMEA\Input\FLOW\MIXED\H2O"]
+
+# MEA and H2O mass flows of the tear streams LEANMEA and LEANMEAC
+TearStreams_MEA = [r"\Data\Streams\LEANMEA\Output\STR_MAIN\MASSFLOW\MIXED\MEA",
+                   r"\Data\Streams\LEAMEAC\Output\STR_MAIN\MASSFLOW\MIXED\MEA"]
+TearStreams_H2O = [r"\Data\Streams\LEANMEA\Output\STR_MAIN\MASSFLOW\MIXED\H2O",
+                   r"\Data\Streams\LEAMEAC\Output\STR_MAIN\MASSFLOW\MIXED\H2O"]
+
+# Water leaving at SPLIT and water make-up
+WATOUT_Flow = r"\Data\Blocks\SPLIT\Input\BASIS_FLOW\WATOUT"
+MAKEUP_H2OFlow = r"\Data\Streams\MAKEUP\Input\FLOW\MIXED\H2O"
+
+# Target value of design specification DS-1 and convergence method of the tear streams
+DS1_Target = r"\Data\Flowsheeting Options\Design-Spec\DS-1\Input\EXPR2"
+TearMethod = r"\Data\Convergence\Conv-Options\Input\TEAR_METHOD"
+
+# Inputs which are changed by a scenario and its closure, they are copied between the instances of a speculative closure
+Scenario_Nodes = ([r"\Data\Streams\FLUEGAS\Input\FLOW\MIXED\CO2", r"\Data\Streams\FLUEGAS\Input\FLOW\MIXED\N2"]
+                  + LEANMEA_Loadings + [DS1_Target, WATOUT_Flow, MAKEUP_H2OFlow])
+
 ########################################################################################################################
 # LOOPING SETTINGS
 ########################################################################################################################
@@ -37,54 +178,123 @@ SimRunNumber = 1    # Number of runs to perform
 class Aspen_Plus_ProcessTools:
 
     def get_fluegasCO2(self, SimRunIndex: int, column_names: list, process_param_filename ):
-        df_InputParameters_names = column_names
-        df_InputParameters = pd.read_excel(rf"{process_param_filename}.xlsx", names=df_InputParameters_names,
-                                           skiprows=SimRunIndex, nrows=1)
-        FluegasCO2conc = df_InputParameters.at[0, column_names[-1]] / 100
+        # The scenario table is parsed once and reused for all runs (see Scenario_Source), it is parsed again if the file
+        # was modified
+        filepath = rf"{process_param_filename}.xlsx"
+        key = (process_param_filename, tuple(column_names))
+        mtime = os.stat(filepath).st_mtime_ns
+        if key not in _scenario_sources or _scenario_sources[key][0] != mtime:
+            _scenario_sources[key] = (mtime, Scenario_Source(filepath, column_names, percent_columns=[column_names[-1]]))
+        FluegasCO2conc = _scenario_sources[key][1][SimRunIndex][column_names[-1]]
 
         return FluegasCO2conc
 
+    def fluegas_CO2massflow(self, Aspen_Plus):
+        """
+        CO2 mass flow of FLUEGAS from its feed specification, without running the simulation. This is only possible if
+        the total flow is given on a mole or mass basis. A total flow on a volume basis depends on the phase equilibrium
+        of the feed (the flue gas of the bkp file is two-phase with condensed water), thus the simulation has to be run.
+        :return: CO2 mass flow in kg/h, None if the feed specification is not of this form
+        """
+        composition = Aspen_Plus.find_node(r"\Data\Streams\FLUEGAS\Input\BASIS\MIXED")
+        flow_basis = Aspen_Plus.find_node(r"\Data\Streams\FLUEGAS\Input\FLOWBASE\MIXED")
+        total_flow = Aspen_Plus.find_node(r"\Data\Streams\FLUEGAS\Input\TOTFLOW\MIXED")
+        if flow_basis is None or total_flow is None:
+            return None
+        composition = composition.Value if composition is not None else None
+        if composition not in MoleCompositionBases and composition not in MassCompositionBases:
+            return None
+
+        # Aspen Plus normalizes the fractions of the components
+        fractions = np.array(Aspen_Plus.read_many([
+            rf"\Data\Streams\FLUEGAS\Input\FLOW\MIXED\{component}" for component in MolarMasses_FLUEGAS
+        ]))
+        fractions = fractions / fractions.sum()
+        molar_masses = np.array(list(MolarMasses_FLUEGAS.values()))
+        if composition in MassCompositionBases:
+            # Mole fractions from the mass fractions
+            fractions = fractions / molar_masses / np.sum(fractions / molar_masses)
+
+        unit = str(total_flow.UnitString).lower()
+        if flow_basis.Value == "MOLE" and unit in MoleFlowUnits:
+            TotalMoleFlow = total_flow.Value * MoleFlowUnits[unit]
+        elif flow_basis.Value == "MASS" and unit in MassFlowUnits:
+            TotalMoleFlow = total_flow.Value * MassFlowUnits[unit] / (fractions @ molar_masses)
+        else:
+            return None
+        return TotalMoleFlow * fractions[0] * MolarMass_CO2
+
     def design_spec(self, Aspen_Plus, FluegasCO2conc):
+        """
+        Adjust the flue gas composition and the target of the design specification DS-1, and run the simulation
+        :param FluegasCO2conc: CO2 concentration of FLUEGAS
+        :return: True if the runs completed, False if a run was stopped at the time limit
+        """
 
         # Set fluegas CO2 conc. to evaluate new target value for design specification
-        Aspen_Plus.Application.Tree.FindNode(r"\Data\Streams\FLUEGAS\Input\FLOW\MIXED\CO2").Value = FluegasCO2conc
-
         # Adjust N2 conc accordingly (concentration of H2O and O2 are kept constant.)
-        FluegasN2conc = 1 - FluegasCO2conc - FluegasO2conc - FluegasH2Oconc
-        Aspen_Plus.Application.Tree.FindNode(r"\Data\Streams\FLUEGAS\Input\FLOW\MIXED\N2").Value = FluegasN2conc
-
-        # Run process simulation with adjusted flue gas composition
-        Aspen_Plus.run_simulation()
-        Aspen_Plus.check_run_completion()
-
-        # Get new target value for design specification (CO2 removal efficiency is fixed at 95%)
-        DS_TargetValue = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\FLUEGAS\Output\MASSFLOW\MIXED\CO2").Value * 0.95 * 3600
+        FluegasN2conc = fluegas_N2conc(FluegasCO2conc)
+        Aspen_Plus.write_many({
+            r"\Data\Streams\FLUEGAS\Input\FLOW\MIXED\CO2": FluegasCO2conc,
+            r"\Data\Streams\FLUEGAS\Input\FLOW\MIXED\N2": FluegasN2conc,
+        })
+
+        # Get new target value for design specification (CO2 removal efficiency is fixed at 95%). It follows from the
+        # feed specification of FLUEGAS, otherwise the process simulation is run with the adjusted flue gas composition
+        # to get the CO2 mass flow.
+        FLUEGAS_CO2MassFlow = self.fluegas_CO2massflow(Aspen_Plus)
+        if FLUEGAS_CO2MassFlow is not None:
+            DS_TargetValue = FLUEGAS_CO2MassFlow * 0.95
+        else:
+            Aspen_Plus.run_simulation()
+            if not Aspen_Plus.check_run_completion():
+                # The CO2 mass flow of a stopped run is not valid
+                return False
+            DS_TargetValue = Aspen_Plus.read_many([r"\Data\Streams\FLUEGAS\Output\MASSFLOW\MIXED\CO2"])[0] * 0.95 * 3600
 
         # Set new target value in design specification
-        Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Flowsheeting Options\Design-Spec\DS-1\Input\EXPR2").Value = DS_TargetValue
+        Aspen_Plus.write_many({DS1_Target: DS_TargetValue})
 
         # Run process simulation again with adjusted design specification
         Aspen_Plus.run_simulation()
-        Aspen_Plus.check_run_completion()
+        return Aspen_Plus.check_run_completion()
+
+    def set_MEAloading(self, Aspen_Plus, x):
+        # Set CO2 loading (x[0]) and the corresponding H2O loading of LEANMEA
+        Aspen_Plus.write_many(dict(zip(LEANMEA_Loadings, [x[0], H2OLoading_30wt(x[0])])))
+
+    def get_deltaMEA(self, Aspen_Plus):
+        # Difference of the MEA mass flow of the tear streams LEANMEA and LEANMEAC in kg/h
+        LEANMEA_MEA, LEANMEAC_MEA = Aspen_Plus.read_many(TearStreams_MEA, 3600).tolist()
+        return np.array([LEANMEA_MEA - LEANMEAC_MEA])
 
-    def check_MEAbalance_tearstreams(self, Aspen_Plus, MEA_tol):
+    def check_MEAbalance_tearstreams(self, Aspen_Plus, MEA_tol, solver=None):
+        """
+        Close the MEA balance of the tear streams by adjusting the CO2 loading of LEANMEA
+        :param MEA_tol: tolerance of the MEA mass flow difference of LEANMEA and LEANMEAC in kg/h
+        :param solver: closure solver (e.g. MEA_closure_solver()), None for the step ladder
+        :return: number of Aspen Plus runs
+        """
 
         # MEA_tol in kg/h for defining tolerance for difference of water flows in tear streams LEANMEA and LEANMEAC
         print("  Tolerance for closing water balance: ", MEA_tol,
               " kg/h difference between tear streams LEANMEA and LEANMEAC")
 
         # Get loadings of stream LEANMEA
-        LEANMEA_CO2Loading = Aspen_Plus.Application.Tree.FindNode(r"\Data\Streams\LEANMEA\Input\FLOW\MIXED\CO2").Value
-        LEANMEA_H2OLoading = Aspen_Plus.Application.Tree.FindNode(r"\Data\Streams\LEANMEA\Input\FLOW\MIXED\H2O").Value
+        LEANMEA_CO2Loading, LEANMEA_H2OLoading = Aspen_Plus.read_many(LEANMEA_Loadings).tolist()
+
+        if solver is not None:
+            _, residuals, runs = close_balance(Aspen_Plus, [LEANMEA_CO2Loading],
+                                               lambda x: self.set_MEAloading(Aspen_Plus, x),
+                                               lambda: self.get_deltaMEA(Aspen_Plus), solver, MEA_tol, name="Delta MEA")
+            if np.all(np.abs(residuals) <= MEA_tol):
+                print(f"  Closing MEA mass balance finished successfully after {runs} runs.")
+            else:
+                print(f"  MEA mass balance not closed after {runs} runs.")
+            return runs
 
         # Get MEA mass flow rate in tear streams LEANMEA and LEANMEAC
-        LEANMEA_MEA = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\LEANMEA\Output\STR_MAIN\MASSFLOW\MIXED\MEA").Value * 3600
-
-        LEANMEAC_MEA = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\LEAMEAC\Output\STR_MAIN\MASSFLOW\MIXED\MEA").Value * 3600
+        LEANMEA_MEA, LEANMEAC_MEA = Aspen_Plus.read_many(TearStreams_MEA, 3600).tolist()
 
         # Calculate difference of MEA mass flow
         delta_MEA = LEANMEA_MEA - LEANMEAC_MEA
@@ -99,68 +309,73 @@ class Aspen_Plus_ProcessTools:
             print("  CO2 Loading: ", round(LEANMEA_CO2Loading, 2))
             if delta_MEA > 50:
                 LEANMEA_CO2Loading = LEANMEA_CO2Loading + 0.01
-                Aspen_Plus.Application.Tree.FindNode(
-                    r"\Data\Streams\LEANMEA\Input\FLOW\MIXED\CO2").Value = LEANMEA_CO2Loading
             elif 50 >= delta_MEA > 20:
                 LEANMEA_CO2Loading = LEANMEA_CO2Loading + 0.005
-                Aspen_Plus.Application.Tree.FindNode(
-                    r"\Data\Streams\LEANMEA\Input\FLOW\MIXED\CO2").Value = LEANMEA_CO2Loading
             elif 20 >= delta_MEA > 3:
                 LEANMEA_CO2Loading = LEANMEA_CO2Loading + 0.002
-                Aspen_Plus.Application.Tree.FindNode(
-                    r"\Data\Streams\LEANMEA\Input\FLOW\MIXED\CO2").Value = LEANMEA_CO2Loading
             elif -3 >= delta_MEA > -20:
                 LEANMEA_CO2Loading = LEANMEA_CO2Loading - 0.0002
-                Aspen_Plus.Application.Tree.FindNode(
-                    r"\Data\Streams\LEANMEA\Input\FLOW\MIXED\CO2").Value = LEANMEA_CO2Loading
             elif -20 > delta_MEA > -50:
                 LEANMEA_CO2Loading = LEANMEA_CO2Loading - 0.005
-                Aspen_Plus.Application.Tree.FindNode(
-                    r"\Data\Streams\LEANMEA\Input\FLOW\MIXED\CO2").Value = LEANMEA_CO2Loading
             else:
                 LEANMEA_CO2Loading = LEANMEA_CO2Loading - 0.01
-                Aspen_Plus.Application.Tree.FindNode(
-                    r"\Data\Streams\LEANMEA\Input\FLOW\MIXED\CO2").Value = LEANMEA_CO2Loading
 
             # Adjust H2O loading in LEANMEA based on LEANMEA_CO2Loading to achieve 30 wt% for all runs
             print("  H2O Loading: ", round(LEANMEA_H2OLoading, 2))
             LEANMEA_H2OLoading = (1 / Mol_H2O) * (Mol_MEA / MassConc_MEA - Mol_MEA - LEANMEA_CO2Loading * Mol_CO2)
-            Aspen_Plus.Application.Tree.FindNode(
-                r"\Data\Streams\LEANMEA\Input\FLOW\MIXED\H2O").Value = LEANMEA_H2OLoading
+            Aspen_Plus.write_many(dict(zip(LEANMEA_Loadings, [LEANMEA_CO2Loading, LEANMEA_H2OLoading])))
 
             # Run simulation with modified values
             Aspen_Plus.run_simulation()
             Aspen_Plus.check_run_completion()
 
             # Get new values for control
-            LEANMEA_CO2Loading_new = Aspen_Plus.Application.Tree.FindNode(
-                r"\Data\Streams\LEANMEA\Input\FLOW\MIXED\CO2").Value
-            LEANMEA_H2OLoading_new = Aspen_Plus.Application.Tree.FindNode(
-                r"\Data\Streams\LEANMEA\Input\FLOW\MIXED\H2O").Value
+            LEANMEA_CO2Loading_new, LEANMEA_H2OLoading_new = Aspen_Plus.read_many(LEANMEA_Loadings).tolist()
             print("  New CO2 loading: ", round(LEANMEA_CO2Loading_new, 2))
             print("  New H2O loading: ", round(LEANMEA_H2OLoading_new, 2))
 
-            LEANMEA_MEA = Aspen_Plus.Application.Tree.FindNode(
-                r"\Data\Streams\LEANMEA\Output\STR_MAIN\MASSFLOW\MIXED\MEA").Value * 3600
-            LEANMEAC_MEA = Aspen_Plus.Application.Tree.FindNode(
-                r"\Data\Streams\LEAMEAC\Output\STR_MAIN\MASSFLOW\MIXED\MEA").Value * 3600
+            LEANMEA_MEA, LEANMEAC_MEA = Aspen_Plus.read_many(TearStreams_MEA, 3600).tolist()
             delta_MEA = LEANMEA_MEA - LEANMEAC_MEA
             print("  New delta MEA: ", round(delta_MEA, 2))
 
         print("  Closing MEA mass balance finished successfully.")
+        return MEAbalance_counter
+
+    def set_water_makeup(self, Aspen_Plus, x):
+        # Set the net water make-up x[0] in kg/h: positive as MAKEUP H2O, negative as WATOUT
+        Aspen_Plus.write_many({WATOUT_Flow: max(-x[0], 0), MAKEUP_H2OFlow: max(x[0], 0)})
+
+    def get_deltaH2O(self, Aspen_Plus):
+        # Difference of the H2O mass flow of the tear streams LEANMEA and LEANMEAC in kg/h
+        LEANMEA_H2O, LEANMEAC_H2O = Aspen_Plus.read_many(TearStreams_H2O, 3600).tolist()
+        return np.array([LEANMEA_H2O - LEANMEAC_H2O])
 
-    def check_waterbalance_tearstreams(self, Aspen_Plus, H2O_tol):
+    def check_waterbalance_tearstreams(self, Aspen_Plus, H2O_tol, solver=None):
+        """
+        Close the water balance of the tear streams by adjusting WATOUT of SPLIT and the water make-up
+        :param H2O_tol: tolerance of the H2O mass flow difference of LEANMEA and LEANMEAC in kg/h
+        :param solver: closure solver (e.g. water_closure_solver()), None for the heuristic steps
+        :return: number of Aspen Plus runs
+        """
 
         # H2O_tol in kg/h for defining tolerance for difference of water flows in tear streams LEANMEA and LEANMEAC
         print("  Tolerance for closing water balance: ", H2O_tol,
               " kg/h difference between tear streams LEANMEA and LEANMEAC")
 
-        LEANMEA_H2O = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\LEANMEA\Output\STR_MAIN\MASSFLOW\MIXED\H2O").Value * 3600
-        print("  LEANMEA water: ", round(LEANMEA_H2O, 2))
+        if solver is not None:
+            WATOUT, MAKEUP = Aspen_Plus.read_many([WATOUT_Flow, MAKEUP_H2OFlow]).tolist()
+            _, residuals, runs = close_balance(Aspen_Plus, [MAKEUP - WATOUT],
+                                               lambda x: self.set_water_makeup(Aspen_Plus, x),
+                                               lambda: self.get_deltaH2O(Aspen_Plus), solver, H2O_tol,
+                                               name="Delta water")
+            if np.all(np.abs(residuals) <= H2O_tol):
+                print(f"  Closing water mass balance finished successfully after {runs} runs.")
+            else:
+                print(f"  Water mass balance not closed after {runs} runs.")
+            return runs
 
-        LEANMEAC_H2O = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\LEAMEAC\Output\STR_MAIN\MASSFLOW\MIXED\H2O").Value * 3600
+        LEANMEA_H2O, LEANMEAC_H2O = Aspen_Plus.read_many(TearStreams_H2O, 3600).tolist()
+        print("  LEANMEA water: ", round(LEANMEA_H2O, 2))
         print("  LEANMEAC water: ", round(LEANMEAC_H2O, 2))
 
         delta_H2O = LEANMEA_H2O - LEANMEAC_H2O
@@ -171,58 +386,199 @@ class Aspen_Plus_ProcessTools:
             H2Obalance_counter += 1
             print(f"  Check {H2Obalance_counter}:")
 
-            WATOUT = Aspen_Plus.Application.Tree.FindNode(r"\Data\Blocks\SPLIT\Input\BASIS_FLOW\WATOUT").Value
-            MAKEUP = Aspen_Plus.Application.Tree.FindNode(r"\Data\Streams\MAKEUP\Input\FLOW\MIXED\H2O").Value
+            WATOUT, MAKEUP = Aspen_Plus.read_many([WATOUT_Flow, MAKEUP_H2OFlow]).tolist()
 
             if WATOUT > 0 and delta_H2O > 1:
                 diff1 = WATOUT - delta_H2O
                 if diff1 > 0:
-                    Aspen_Plus.Application.Tree.FindNode(
-                        r"\Data\Blocks\SPLIT\Input\BASIS_FLOW\WATOUT").Value = WATOUT - delta_H2O
+                    Aspen_Plus.write_many({WATOUT_Flow: WATOUT - delta_H2O})
                 else:
-                    Aspen_Plus.Application.Tree.FindNode(r"\Data\Blocks\SPLIT\Input\BASIS_FLOW\WATOUT").Value = 0
-                    Aspen_Plus.Application.Tree.FindNode(
-                        r"\Data\Streams\MAKEUP\Input\FLOW\MIXED\H2O").Value = MAKEUP + delta_H2O - WATOUT
+                    Aspen_Plus.write_many({WATOUT_Flow: 0, MAKEUP_H2OFlow: MAKEUP + delta_H2O - WATOUT})
 
             if MAKEUP > 0.01 and delta_H2O > 1:
-                Aspen_Plus.Application.Tree.FindNode(
-                    r"\Data\Streams\MAKEUP\Input\FLOW\MIXED\H2O").Value = MAKEUP + delta_H2O
+                Aspen_Plus.write_many({MAKEUP_H2OFlow: MAKEUP + delta_H2O})
 
             if WATOUT > 0 and delta_H2O < -1:
-                Aspen_Plus.Application.Tree.FindNode(
-                    r"\Data\Blocks\SPLIT\Input\BASIS_FLOW\WATOUT").Value = WATOUT - delta_H2O
+                Aspen_Plus.write_many({WATOUT_Flow: WATOUT - delta_H2O})
 
             if MAKEUP > 0.01 and delta_H2O < -1:
                 diff2 = MAKEUP + delta_H2O
                 if diff2 > 0:
-                    Aspen_Plus.Application.Tree.FindNode(
-                        r"\Data\Streams\MAKEUP\Input\FLOW\MIXED\H2O").Value = MAKEUP + delta_H2O
+                    Aspen_Plus.write_many({MAKEUP_H2OFlow: MAKEUP + delta_H2O})
                 else:
-                    Aspen_Plus.Application.Tree.FindNode(r"\Data\Streams\MAKEUP\Input\FLOW\MIXED\H2O").Value = 0
-                    Aspen_Plus.Application.Tree.FindNode(
-                        r"\Data\Blocks\SPLIT\Input\BASIS_FLOW\WATOUT").Value = WATOUT - delta_H2O - MAKEUP
+                    Aspen_Plus.write_many({MAKEUP_H2OFlow: 0, WATOUT_Flow: WATOUT - delta_H2O - MAKEUP})
 
             Aspen_Plus.run_simulation()
             Aspen_Plus.check_run_completion()
 
-            LEANMEA_H2O = Aspen_Plus.Application.Tree.FindNode(
-                r"\Data\Streams\LEANMEA\Output\STR_MAIN\MASSFLOW\MIXED\H2O").Value * 3600
-            LEANMEAC_H2O = Aspen_Plus.Application.Tree.FindNode(
-                r"\Data\Streams\LEAMEAC\Output\STR_MAIN\MASSFLOW\MIXED\H2O").Value * 3600
-            delta_H2O = LEANMEA_H2O - LEANMEAC_H2O
-
             # Show results
-            LEANMEA_H2O = Aspen_Plus.Application.Tree.FindNode(
-                r"\Data\Streams\LEANMEA\Output\STR_MAIN\MASSFLOW\MIXED\H2O").Value * 3600
+            LEANMEA_H2O, LEANMEAC_H2O = Aspen_Plus.read_many(TearStreams_H2O, 3600).tolist()
             print("  LEANMEA water: ", round(LEANMEA_H2O, 2))
-            LEANMEAC_H2O = Aspen_Plus.Application.Tree.FindNode(
-                r"\Data\Streams\LEAMEAC\Output\STR_MAIN\MASSFLOW\MIXED\H2O").Value * 3600
             print("  LEANMEAC water: ", round(LEANMEAC_H2O, 2))
             delta_H2O = LEANMEA_H2O - LEANMEAC_H2O
             print("  Delta water: ", round(delta_H2O, 2))
 
         print("  Closing water mass balance finished successfully.")
+        return H2Obalance_counter
+
+
+    def close_balances_coupled(self, Aspen_Plus, MEA_tol, H2O_tol, solver=None, max_runs=25):
+        """
+        Close MEA and water balance of the tear streams in one joint iteration. Each run adjusts the CO2 loading of
+        LEANMEA and the net water make-up, until both differences are within their tolerance.
+        :param MEA_tol: tolerance of the MEA mass flow difference of LEANMEA and LEANMEAC in kg/h
+        :param H2O_tol: tolerance of the H2O mass flow difference of LEANMEA and LEANMEAC in kg/h
+        :param solver: Broyden_Solver for both variables, coupled_closure_solver() if None
+        :param max_runs: maximum number of Aspen Plus runs
+        :return: number of Aspen Plus runs
+        """
+        print("  Tolerance for closing MEA and water balance: ", MEA_tol, " and ", H2O_tol,
+              " kg/h difference between tear streams LEANMEA and LEANMEAC")
+
+        solver = solver if solver is not None else coupled_closure_solver()
+        LEANMEA_CO2Loading = Aspen_Plus.read_many(LEANMEA_Loadings[:1]).tolist()[0]
+        WATOUT, MAKEUP = Aspen_Plus.read_many([WATOUT_Flow, MAKEUP_H2OFlow]).tolist()
+
+        def set_variables(x):
+            self.set_MEAloading(Aspen_Plus, x[:1])
+            self.set_water_makeup(Aspen_Plus, x[1:])
 
+        def get_residuals():
+            return np.concatenate([self.get_deltaMEA(Aspen_Plus), self.get_deltaH2O(Aspen_Plus)])
+
+        _, residuals, runs = close_balance(Aspen_Plus, [LEANMEA_CO2Loading, MAKEUP - WATOUT], set_variables,
+                                           get_residuals, solver, np.array([MEA_tol, H2O_tol]), max_runs,
+                                           name="Delta MEA, water")
+        if np.all(np.abs(residuals) <= [MEA_tol, H2O_tol]):
+            print(f"  Closing MEA and water mass balance finished successfully after {runs} runs.")
+        else:
+            print(f"  MEA and water mass balance not closed after {runs} runs.")
+        return runs
+
+    def sync_instances(self, source, targets):
+        # Copy the inputs of the scenario from one Aspen Plus instance to others (unchanged values are skipped)
+        values = dict(zip(Scenario_Nodes, source.read_many(Scenario_Nodes).tolist()))
+        for Aspen_Plus in targets:
+            Aspen_Plus.write_many(values)
+
+    def close_balances_speculative(self, instances, MEA_tol, H2O_tol, solvers=None):
+        """
+        Close MEA and water balance of the tear streams one after another, with several candidates of the CO2 loading
+        of LEANMEA and of the net water make-up evaluated on several Aspen Plus instances at once
+        :param instances: list of Aspen_Plus_Interface, the first holds the scenario (design specification adjusted)
+        :param MEA_tol: tolerance of the MEA mass flow difference of LEANMEA and LEANMEAC in kg/h
+        :param H2O_tol: tolerance of the H2O mass flow difference of LEANMEA and LEANMEAC in kg/h
+        :param solvers: closure solvers (see closure_solvers), new solvers if None
+        :return: instance holding the results of the closed balances and number of Aspen Plus runs
+        """
+        print("  Tolerance for closing MEA and water balance: ", MEA_tol, " and ", H2O_tol,
+              " kg/h difference between tear streams LEANMEA and LEANMEAC, "
+              f"{max(len(instances) - 1, 1)} candidates per round")
+
+        solvers = solvers if solvers is not None else closure_solvers()
+        best = instances[0]
+        self.sync_instances(best, instances[1:])
+
+        LEANMEA_CO2Loading = best.read_many(LEANMEA_Loadings[:1]).tolist()[0]
+        _, _, best, runs = close_balance_speculative(instances, LEANMEA_CO2Loading,
+                                                     lambda Aspen_Plus, x: self.set_MEAloading(Aspen_Plus, [x]),
+                                                     self.get_deltaMEA, solvers["MEA"], MEA_tol, name="Delta MEA")
+        others = [Aspen_Plus for Aspen_Plus in instances if Aspen_Plus is not best]
+        self.sync_instances(best, others)
+
+        WATOUT, MAKEUP = best.read_many([WATOUT_Flow, MAKEUP_H2OFlow]).tolist()
+        _, _, best, H2O_runs = close_balance_speculative([best] + others, MAKEUP - WATOUT,
+                                                         lambda Aspen_Plus, x: self.set_water_makeup(Aspen_Plus, [x]),
+                                                         self.get_deltaH2O, solvers["H2O"], H2O_tol,
+                                                         name="Delta water")
+
+        # All instances start the next scenario from the inputs of the best state
+        self.sync_instances(best, [Aspen_Plus for Aspen_Plus in instances if Aspen_Plus is not best])
+        print(f"  Closing MEA and water mass balance finished after {runs + H2O_runs} runs.")
+        return best, runs + H2O_runs
+
+    def simulate(self, Aspen_Plus, scenario, closure="sequential", solvers=None, MEA_tol=6, H2O_tol=6,
+                 warm_start=None, helpers=None):
+        """
+        Simulate one scenario: design specification, closure of the balances of the tear streams and results
+        :param scenario: dict of process parameters with "FLUEGAS CO2 conc" (see Scenario_Source)
+        :param closure: "sequential" closes the MEA balance first and the water balance second, "coupled" closes both in
+                        one iteration (see close_balances_coupled), "speculative" closes them one after another with
+                        candidates evaluated on Aspen_Plus and the helpers at once (see close_balances_speculative)
+        :param solvers: closure solvers (see closure_solvers), new solvers if None
+        :param warm_start: Warm_Start_Store, the nearest converged state is restored before the scenario and the state
+                           is saved if the scenario converged
+        :param helpers: further Aspen_Plus_Interface with the same bkp file for the speculative closure
+        :return: dict with data (list of dataframes for run_LCA), status (see check_simulation_status), the number of
+                 Aspen Plus runs for closing the balances and whether the scenario converged
+        """
+        solvers = solvers if solvers is not None else closure_solvers()
+
+        if warm_start is not None:
+            warm_start.restore(Aspen_Plus, scenario, solvers)
+
+        Aspen_Plus, status, closure_runs, converged = self.step(Aspen_Plus, scenario, closure, solvers, MEA_tol,
+                                                                H2O_tol, helpers)
+        if warm_start is not None and converged:
+            warm_start.save(Aspen_Plus, scenario, solvers)
+
+        return {"data": self.retrieve_results(Aspen_Plus), "status": status, "closure_runs": closure_runs,
+                "converged": converged}
+
+    def step(self, Aspen_Plus, scenario, closure="sequential", solvers=None, MEA_tol=6, H2O_tol=6, helpers=None):
+        """
+        Design specification and closure of the balances of a scenario from the current state of the flowsheet, without
+        warm start and results (see simulate), e.g. for the homotopy steps of a Continuation
+        :return: instance holding the closed balances, status (see check_simulation_status), number of Aspen Plus runs
+                 for closing the balances and whether the scenario converged
+        """
+        solvers = solvers if solvers is not None else closure_solvers()
+
+        # Adjust design specification for new value of process parameter
+        print("2. Adjust design specification for simulation and start initial run with new values. Simulation running...")
+        closure_runs = 0
+        if not self.design_spec(Aspen_Plus, scenario["FLUEGAS CO2 conc"]):
+            # The closure is not continued from the results of a stopped run
+            print("  Run stopped at the time limit, the balances are not closed.")
+        elif closure == "coupled":
+            print("3./4. Close MEA and water mass balance together. Simulation running...")
+            closure_runs = self.close_balances_coupled(Aspen_Plus, MEA_tol, H2O_tol, solver=solvers["coupled"])
+        elif closure == "speculative":
+            print("3./4. Close MEA and water mass balance with candidates on several instances. Simulation running...")
+            # The results of the scenario are collected from the instance holding the best state
+            Aspen_Plus, closure_runs = self.close_balances_speculative([Aspen_Plus] + list(helpers or []), MEA_tol,
+                                                                       H2O_tol, solvers)
+        else:
+            print("3. Close MEA mass balance (by decreasing difference in mass flows in tear stroms below tolerance. Simulation running...")
+            closure_runs = self.check_MEAbalance_tearstreams(Aspen_Plus, MEA_tol, solver=solvers["MEA"])
+
+            if Aspen_Plus.last_run_completed:
+                print("4. Close water mass balance (by decreasing difference in mass flows in tear stroms below tolerance. Simulation running...")
+                closure_runs += self.check_waterbalance_tearstreams(Aspen_Plus, H2O_tol, solver=solvers["H2O"])
+        print(f"  {closure_runs} Aspen Plus runs for closing the balances ({closure}).")
+
+        print("5. Check simulation status of final results")
+        # Through adjusting the design specification and checking the component mass balance of MEA and H2O of tear streams
+        # LEANMEA and LEANMEAC the simulation has to be run several times. Thus, at the end, it is checked whether the simulation
+        # was successful or if there occurred a warning/ error.
+        status = self.check_simulation_status(Aspen_Plus, "Final simulation")
+
+        # Converged: no run stopped at the time limit, no errors and both balances within their tolerance
+        residuals = np.concatenate([self.get_deltaMEA(Aspen_Plus), self.get_deltaH2O(Aspen_Plus)])
+        converged = (Aspen_Plus.last_run_completed and not status[3] and not status[4]
+                     and bool(np.all(np.abs(residuals) <= [MEA_tol, H2O_tol])))
+        return Aspen_Plus, status, closure_runs, converged
+
+    def retrieve_results(self, Aspen_Plus):
+        # Results of the scenario for run_LCA
+        print("6. Collect results")
+        return [
+            self.retrieve_ProcessParam(Aspen_Plus),
+            self.retrieve_Foreground(Aspen_Plus),
+            self.retrieve_NaturalRes(Aspen_Plus, 4.2, 5),
+            self.retrieve_EnergyFlow(Aspen_Plus),
+            self.retrieve_Infrastruct(Aspen_Plus, k=2000, d=2000, diameter=1)
+        ]
 
     def check_simulation_status(self, Aspen_Plus, run_type="non-defined simulation type"):
         """
@@ -247,7 +603,7 @@ class Aspen_Plus_ProcessTools:
         other_error = False
 
         # Get the main simulation status
-        run_status = Aspen_Plus.Application.Tree.FindNode(r"\Data").AttributeValue(12)
+        run_status = Aspen_Plus.find_node(r"\Data").AttributeValue(12)
 
         if run_status == sim_success:
             print(f"  No errors encountered. {run_type.capitalize()} simulation finished.")
@@ -255,7 +611,7 @@ class Aspen_Plus_ProcessTools:
 
         elif run_status == sim_warning:
             print(f"  Warnings encountered during {run_type} run. Checking where the warnings occur...")
-            status_HX = Aspen_Plus.Application.Tree.FindNode(r"\Data\Blocks\HX").AttributeValue(12)
+            status_HX = Aspen_Plus.find_node(r"\Data\Blocks\HX").AttributeValue(12)
 
             if status_HX == sim_warning:
                 print(f"  -> Warning in HX during {run_type} run.")
@@ -267,7 +623,7 @@ class Aspen_Plus_ProcessTools:
         else:
             print(f"  Errors encountered during {run_type} run. Checking if the condenser is the issue.")
             other_error = True
-            status_COND = Aspen_Plus.Application.Tree.FindNode(r"\Data\Blocks\COND").AttributeValue(12)
+            status_COND = Aspen_Plus.find_node(r"\Data\Blocks\COND").AttributeValue(12)
 
             if status_COND == sim_error:
                 print("  -> Error at condenser. Trying to switch convergence solver.")
@@ -279,7 +635,7 @@ class Aspen_Plus_ProcessTools:
 
     def change_solver(self, Aspen_Plus, solver:str):
 
-        Aspen_Plus.Application.Tree.FindNode(r"\Data\Convergence\Conv-Options\Input\TEAR_METHOD").Value = solver
+        Aspen_Plus.write_many({TearMethod: solver})
 
         Aspen_Plus.run_simulation()
         Aspen_Plus.check_run_completion()
@@ -294,99 +650,48 @@ class Aspen_Plus_ProcessTools:
         return solver_results
 
     def retrieve_ProcessParam(self, Aspen_Plus):
-        LEANMEA_MassFlow = Aspen_Plus.Application.Tree.FindNode(r"\Data\Streams\LEANMEA\Output\MASSFLMX\MIXED").Value
-        LEANMEA_MassFlow = round(3600 * LEANMEA_MassFlow, 5)
+        LEANMEA_MassFlow = Aspen_Plus.read_many([r"\Data\Streams\LEANMEA\Output\MASSFLMX\MIXED"], 3600)
+        LEANMEA_MassFlow = round(LEANMEA_MassFlow[0], 5)
 
         # Dataframe for process parameters to export data to Excel
         df_ProcessParameters = pd.DataFrame([[LEANMEA_MassFlow]]).T
         return df_ProcessParameters
 
     def retrieve_Foreground(self, Aspen_Plus):
-        CO2OUT_CO2CaptureRate = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\CO2-OUT\Output\STR_MAIN\MASSFLOW\MIXED\CO2").Value
-        CO2OUT_CO2CaptureRate = round(3600 * CO2OUT_CO2CaptureRate, 7)
-
-        # FLUEGAS total flow rate in kg/h
-        FLUEGAS_TotalMassFlow = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\FLUEGAS\Output\MASSFLMX\MIXED").Value
-        FLUEGAS_TotalMassFlow = round(3600 * FLUEGAS_TotalMassFlow, 5)
-
-        # FLUEGAS CO2 flow rate in kg/h
-        FLUEGAS_CO2MassFlow = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\FLUEGAS\Output\STR_MAIN\MASSFLOW\MIXED\CO2").Value
-        FLUEGAS_CO2MassFlow = round(3600 * FLUEGAS_CO2MassFlow, 5)
-
-        # FLUEGAS N2 flow rate in kg/h
-        FLUEGAS_N2MassFlow = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\FLUEGAS\Output\STR_MAIN\MASSFLOW\MIXED\N2").Value
-        FLUEGAS_N2MassFlow = round(3600 * FLUEGAS_N2MassFlow, 5)
-
-        # FLUEGAS O2 flow rate in kg/h
-        FLUEGAS_O2MassFlow = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\FLUEGAS\Output\STR_MAIN\MASSFLOW\MIXED\O2").Value
-        FLUEGAS_O2MassFlow = round(3600 * FLUEGAS_O2MassFlow, 5)
-
-        # FLUEGAS H2O flow rate in kg/h
-        FLUEGAS_H2OMassFlow = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\FLUEGAS\Output\STR_MAIN\MASSFLOW\MIXED\H2O").Value
-        FLUEGAS_H2OMassFlow = round(3600 * FLUEGAS_H2OMassFlow, 5)
-
-        # MAKEUP H2O flow rate in kg/h
-        MAKEUP_H2OMassFlow = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\MAKEUP\Output\STR_MAIN\MASSFLOW\MIXED\H2O").Value
-        MAKEUP_H2OMassFlow = round(3600 * MAKEUP_H2OMassFlow, 5)
+        # Mass flows in kg/h read in one batch: CO2 capture rate (CO2-OUT), FLUEGAS total, CO2, N2, O2 and H2O, MAKEUP
+        # H2O and MEA, FLUEOFF total, CO2, N2, H2O and MEA, WASHWAT total, WATOUT total and MEA
+        MassFlows = Aspen_Plus.read_many([
+            r"\Data\Streams\CO2-OUT\Output\STR_MAIN\MASSFLOW\MIXED\CO2",
+            r"\Data\Streams\FLUEGAS\Output\MASSFLMX\MIXED",
+            r"\Data\Streams\FLUEGAS\Output\STR_MAIN\MASSFLOW\MIXED\CO2",
+            r"\Data\Streams\FLUEGAS\Output\STR_MAIN\MASSFLOW\MIXED\N2",
+            r"\Data\Streams\FLUEGAS\Output\STR_MAIN\MASSFLOW\MIXED\O2",
+            r"\Data\Streams\FLUEGAS\Output\STR_MAIN\MASSFLOW\MIXED\H2O",
+            r"\Data\Streams\MAKEUP\Output\STR_MAIN\MASSFLOW\MIXED\H2O",
+            r"\Data\Streams\MAKEUP\Output\STR_MAIN\MASSFLOW\MIXED\MEA",
+            r"\Data\Streams\FLUEOFF\Output\MASSFLMX\MIXED",
+            r"\Data\Streams\FLUEOFF\Output\STR_MAIN\MASSFLOW\MIXED\CO2",
+            r"\Data\Streams\FLUEOFF\Output\STR_MAIN\MASSFLOW\MIXED\N2",
+            r"\Data\Streams\FLUEOFF\Output\STR_MAIN\MASSFLOW\MIXED\H2O",
+            r"\Data\Streams\FLUEOFF\Output\STR_MAIN\MASSFLOW\MIXED\MEA",
+            r"\Data\Streams\WASHWAT\Output\MASSFLMX\MIXED",
+            r"\Data\Streams\WATOUT\Output\MASSFLMX\MIXED",
+            r"\Data\Streams\WATOUT\Output\STR_MAIN\MASSFLOW\MIXED\MEA",
+        ], 3600)
+        CO2OUT_CO2CaptureRate = round(MassFlows[0], 7)
+        (FLUEGAS_TotalMassFlow, FLUEGAS_CO2MassFlow, FLUEGAS_N2MassFlow, FLUEGAS_O2MassFlow, FLUEGAS_H2OMassFlow,
+         MAKEUP_H2OMassFlow, MAKEUP_MEAMassFlow, FLUEOFF_TotalMassFlow, FLUEOFF_CO2MassFlow, FLUEOFF_N2MassFlow,
+         FLUEOFF_H2OMassFlow, FLUEOFF_MEAMassFlow, WASHWAT_TotalMassFlow, WATOUT_Massflow,
+         WATOUT_MEAMassFlow) = np.round(MassFlows[1:], 5)
 
         if MAKEUP_H2OMassFlow < 0.01:
             MAKEUP_H2OMassFlow = 0
 
-        # MAKEUP MEA flow rate in kg/h
-        MAKEUP_MEAMassFlow = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\MAKEUP\Output\STR_MAIN\MASSFLOW\MIXED\MEA").Value
-        MAKEUP_MEAMassFlow = round(3600 * MAKEUP_MEAMassFlow, 5)
-
-        # FLUEOFF total flow rate in kg/h
-        FLUEOFF_TotalMassFlow = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\FLUEOFF\Output\MASSFLMX\MIXED").Value
-        FLUEOFF_TotalMassFlow = round(3600 * FLUEOFF_TotalMassFlow, 5)
-
-        # FLUEOFF CO2 flow rate in kg/h
-        FLUEOFF_CO2MassFlow = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\FLUEOFF\Output\STR_MAIN\MASSFLOW\MIXED\CO2").Value
-        FLUEOFF_CO2MassFlow = round(3600 * FLUEOFF_CO2MassFlow, 5)
-
-        # FLUEOFF N2 flow rate in kg/h
-        FLUEOFF_N2MassFlow = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\FLUEOFF\Output\STR_MAIN\MASSFLOW\MIXED\N2").Value
-        FLUEOFF_N2MassFlow = round(3600 * FLUEOFF_N2MassFlow, 5)
-
-        # FLUEOFF H2O flow rate in kg/h
-        FLUEOFF_H2OMassFlow = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\FLUEOFF\Output\STR_MAIN\MASSFLOW\MIXED\H2O").Value
-        FLUEOFF_H2OMassFlow = round(3600 * FLUEOFF_H2OMassFlow, 5)
         # FLUEOFF H2O is required in m³/h
         # Not able to extract partial density of H2O in FLUEOFF out of Aspen. Thus, a mean value is assumed.
         FLUEOFF_H2OPartialDensity = 0.705
         FLUEOFF_H2OVolumeFlow = round(FLUEOFF_H2OMassFlow / FLUEOFF_H2OPartialDensity, 5)
 
-        # FLUEOFF MEA flow rate in kg/h
-        FLUEOFF_MEAMassFlow = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\FLUEOFF\Output\STR_MAIN\MASSFLOW\MIXED\MEA").Value
-        FLUEOFF_MEAMassFlow = round(3600 * FLUEOFF_MEAMassFlow, 5)
-
-        # WASHWAT total flow rate in kg/h
-        WASHWAT_TotalMassFlow = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\WASHWAT\Output\MASSFLMX\MIXED").Value
-        WASHWAT_TotalMassFlow = round(3600 * WASHWAT_TotalMassFlow, 5)
-
-        # WATOUT flow rate in kg/h
-        WATOUT_Massflow = Aspen_Plus.Application.Tree.FindNode(r"\Data\Streams\WATOUT\Output\MASSFLMX\MIXED").Value
-        WATOUT_Massflow = round(3600 * WATOUT_Massflow, 5)
-
-        # WATOUT MEA flow rate in kg/h
-        WATOUT_MEAMassFlow = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\WATOUT\Output\STR_MAIN\MASSFLOW\MIXED\MEA").Value
-        WATOUT_MEAMassFlow = round(3600 * WATOUT_MEAMassFlow, 5)
-
         # Dataframe for material flow to export data to Excel
         array_MaterialFlow = np.array(
             [[CO2OUT_CO2CaptureRate, FLUEGAS_TotalMassFlow, FLUEGAS_CO2MassFlow, FLUEGAS_N2MassFlow,
@@ -399,22 +704,21 @@ class Aspen_Plus_ProcessTools:
 
     def retrieve_EnergyFlow(self, Aspen_Plus):
 
-        # Reboiler duty in kW
-        STRIPPER_ReboilerDuty = Aspen_Plus.Application.Tree.FindNode(r"\Data\Blocks\REBOILER\Output\QCALC").Value
-        STRIPPER_ReboilerDuty = round(1e-03 * STRIPPER_ReboilerDuty, 5)
-        CO2OUT_CO2CaptureRate = Aspen_Plus.Application.Tree.FindNode(
-            r"\Data\Streams\CO2-OUT\Output\STR_MAIN\MASSFLOW\MIXED\CO2").Value
-        CO2OUT_CO2CaptureRate = round(3600 * CO2OUT_CO2CaptureRate, 7)
+        # Reboiler duty in kW, CO2 capture rate in kg/h and electric power for pump compression in kW
+        STRIPPER_ReboilerDuty, CO2OUT_CO2CaptureRate, PUMP_Elec = Aspen_Plus.read_many([
+            r"\Data\Blocks\REBOILER\Output\QCALC",
+            r"\Data\Streams\CO2-OUT\Output\STR_MAIN\MASSFLOW\MIXED\CO2",
+            r"\Data\Blocks\PUMP\Output\ELEC_POWER",
+        ], np.array([1e-03, 3600, 1e-03]))
+        STRIPPER_ReboilerDuty = round(STRIPPER_ReboilerDuty, 5)
+        CO2OUT_CO2CaptureRate = round(CO2OUT_CO2CaptureRate, 7)
+        PUMP_Elec = round(PUMP_Elec, 5)
 
         try:
             STRIPPER_SpecReboilerDuty = round((STRIPPER_ReboilerDuty / (CO2OUT_CO2CaptureRate / 3600)), 5)
         except ZeroDivisionError:
             return False
 
-        # Electric power for pump compression in kW
-        PUMP_Elec = round(1e-03 * Aspen_Plus.Application.Tree.FindNode(r"\Data\Blocks\PUMP\Output\ELEC_POWER").Value,
-                            5)
-
         # Total electricity
         Total_Elec = round(6 * PUMP_Elec, 5)
 
@@ -428,15 +732,15 @@ class Aspen_Plus_ProcessTools:
         # cp - Specific heat capacity of water in kJ/kgK
         # dT - Temperature difference between cooling water inlet and outlet temperature in K
 
-        # COOLER Cooling duty in kW
-        COOLER_CoolingDuty = Aspen_Plus.Application.Tree.FindNode(r"\Data\Blocks\COOLER\Output\QCALC").Value
-        COOLER_CoolingDuty = round(-1e-03 * COOLER_CoolingDuty, 5)
+        # COOLER and COND Cooling duty in kW
+        COOLER_CoolingDuty, COND_CoolingDuty = np.round(Aspen_Plus.read_many([
+            r"\Data\Blocks\COOLER\Output\QCALC",
+            r"\Data\Blocks\COND\Output\QCALC",
+        ], -1e-03), 5)
+
         # COOLER Cooling water in kg/h
         COOLER_CoolingWater = round((COOLER_CoolingDuty / (cp * dT)) * 3600, 2)
 
-        # COND Cooling duty in kW
-        COND_CoolingDuty = Aspen_Plus.Application.Tree.FindNode(r"\Data\Blocks\COND\Output\QCALC").Value
-        COND_CoolingDuty = round(-1e-03 * COND_CoolingDuty, 5)
         # COND Cooling water in kg/h
         COND_CoolingWater = round((COND_CoolingDuty / (cp * dT)) * 3600, 5)
 
@@ -464,15 +768,15 @@ class Aspen_Plus_ProcessTools:
 
         # In this example the packing type is always Mellapak. However, you could change it in the simulation and
         # adjust it here accordingly
-        PackingType = Aspen_Plus.Application.Tree.FindNode(
+        PackingType = Aspen_Plus.find_node(
             r"\Data\Blocks\ABSORBER\Input\CA_PACKTYPE\OPT-R\P-1").Value
 
-        # Number of stages absorber and its height (1 stage equal 1 m height)
-        ABSORBER_NStages = Aspen_Plus.Application.Tree.FindNode(r"\Data\Blocks\ABSORBER\Input\NSTAGE").Value
+        # Number of stages absorber and stripper and their height (1 stage equal 1 m height)
+        ABSORBER_NStages, STRIPPER_NStages = Aspen_Plus.read_many([
+            r"\Data\Blocks\ABSORBER\Input\NSTAGE",
+            r"\Data\Blocks\STRIPPER\Input\NSTAGE",
+        ])
         ABSORBER_Height = ABSORBER_NStages
-
-        # Number of stages stripper and its height (1 stage equal 1 m height)
-        STRIPPER_NStages = Aspen_Plus.Application.Tree.FindNode(r"\Data\Blocks\STRIPPER\Input\NSTAGE").Value
         STRIPPER_Height = STRIPPER_NStages
 
         ABSORBER_ColumnMaterial = ABSORBER_Height * k + d
@@ -3,16 +3,46 @@
 
 import os
 import time
-from win32com.client import GetObject, Dispatch
 import numpy as np
 
 
 class Aspen_Plus_Interface():
     def __init__(self):
+        # COM is only available on Windows, the tools of this module are imported on other platforms as well
+        from win32com.client import Dispatch
         self.Application = Dispatch("Apwn.Document")
         # {"V10.0": "36.0", V11.0": "37.0", V12.0": "38.0"}
         print(self.Application)
 
+        # Nodes of the Aspen Plus tree by path (see find_node)
+        self._nodes = {}
+        self.node_hits = 0
+        self.node_misses = 0
+
+        # Values written by write_many by path, and counters of the values read and written
+        self._written = {}
+        self.values_read = 0
+        self.values_written = 0
+        self.writes_skipped = 0
+
+        # Values read by read_many by path with the generation they were read in. The generation is increased by every
+        # run, thus values are read again from Aspen Plus after the next run.
+        self._values = {}
+        self.generation = 0
+        self.value_hits = 0
+
+        # Wall time of each completed run in s (see check_run_completion) and bounds of the polling interval in s
+        self.run_times = []
+        self.run_timeouts = 0
+        # False if the last run was stopped at the time limit, its results are not valid
+        self.last_run_completed = True
+        self.poll_interval_min = 0.005
+        self.poll_interval_max = 0.25
+        self._run_start = None
+
+        # Function called while waiting for a run, e.g. the heartbeat of a supervised worker (see aspen_pool.py)
+        self.heartbeat = None
+
     def load_bkp(self, bkp_file, visible_state=1, dialog_state=0):
         """
         Load a process via bkp file
@@ -21,32 +51,139 @@ class Aspen_Plus_Interface():
         :param dialog_state: Aspen Plus dialogs, 0 is not to suppress and 1 is to suppress
         """
         self.Application.InitFromArchive2(os.path.abspath(bkp_file))
+        self.clear_node_cache()
+        self._written = {}
+        self.generation += 1
         self.Application.Visible = visible_state
         self.Application.SuppressDialogs = dialog_state
 
     def re_initialization(self):
         # initial the chemical process in Aspen Plus
         self.Application.Reinit()
+        self.clear_node_cache()
+        self.generation += 1
+
+    def find_node(self, path):
+        # Node of the Aspen Plus tree, resolved on first use and cached until the file is reloaded or reinitialized
+        node = self._nodes.get(path)
+        if node is None:
+            self.node_misses += 1
+            node = self.Application.Tree.FindNode(path)
+            if node is not None:
+                self._nodes[path] = node
+        else:
+            self.node_hits += 1
+        return node
+
+    def clear_node_cache(self):
+        self._nodes = {}
+
+    def read_many(self, paths, scale=1.0):
+        """
+        Read the values of several nodes. Values already read since the last run are served from memory.
+        :param paths: list of node paths
+        :param scale: factor applied to all values or array of factors (one per path), e.g. 3600 for kg/s to kg/h
+        :return: array of the scaled values
+        """
+        values = []
+        for path in paths:
+            generation, value = self._values.get(path, (None, None))
+            if generation == self.generation:
+                self.value_hits += 1
+            else:
+                value = self.find_node(path).Value
+                self._values[path] = (self.generation, value)
+                self.values_read += 1
+            values.append(value)
+        return np.array(values, dtype=float) * scale
 
-    def run_simulation(self):
-        # run the process simulation
-        self.Application.Engine.Run2()
+    def write_many(self, mapping):
+        """
+        Write the values of several input nodes. Values which are unchanged since the last write are skipped, thus
+        Aspen Plus does not reset the results of unchanged blocks.
+        :param mapping: dict of node path and value
+        :return: number of values written
+        """
+        written = 0
+        for path, value in mapping.items():
+            if path in self._written and self._written[path] == value:
+                self.writes_skipped += 1
+                continue
+            self.find_node(path).Value = value
+            self._written[path] = value
+            self._values[path] = (self.generation, value)
+            written += 1
+        self.values_written += written
+        return written
+
+    def report_access(self):
+        print(f"  Aspen Plus tree: {self.node_misses} nodes resolved, {self.node_hits} cached lookups, "
+              f"{self.values_read} values read, {self.value_hits} served from memory, {self.values_written} written, "
+              f"{self.writes_skipped} unchanged writes skipped")
+        if self.run_times or self.run_timeouts:
+            mean = np.mean(self.run_times) if self.run_times else 0.0
+            print(f"  Aspen Plus runs: {len(self.run_times)} completed runs in {sum(self.run_times):.1f} s "
+                  f"({mean:.2f} s per run), {self.run_timeouts} stopped at the time limit")
+
+    def run_simulation(self, asynchronous=False):
+        # run the process simulation, all values read before are outdated afterwards. An asynchronous run returns
+        # immediately (e.g. to run several instances at once), check_run_completion waits for it.
+        self.generation += 1
+        self._run_start = time.perf_counter()
+        if asynchronous:
+            self.Application.Engine.Run2(True)
+        else:
+            self.Application.Engine.Run2()
 
     def check_run_completion(self, time_limit=60):
-        # check whether the simulation completed
-        times = 0
+        """
+        Wait until the simulation completed. The first check follows after most of the typical duration of the recent
+        runs, afterwards the engine is polled in short intervals which increase up to poll_interval_max. The heartbeat is
+        called at least every poll_interval_max s, also during the first wait. Runs exceeding the time limit are stopped,
+        only the wall times of completed runs are kept as typical duration.
+        :param time_limit: maximum wall time of the run in s
+        :return: True if the run completed, False if it was stopped
+        """
+        start = self._run_start if self._run_start is not None else time.perf_counter()
+        self._run_start = None
+
+        if self.heartbeat is not None:
+            self.heartbeat()
+
+        if self.run_times:
+            expected = float(np.median(self.run_times[-10:]))
+            end = start + min(0.8 * expected, time_limit)
+            wait = end - time.perf_counter()
+            while wait > 0:
+                time.sleep(min(wait, self.poll_interval_max))
+                wait = end - time.perf_counter()
+                if self.heartbeat is not None:
+                    self.heartbeat()
+
+        completed = True
+        interval = self.poll_interval_min
         while self.Application.Engine.IsRunning == 1:
-            time.sleep(1)
-            times += 1
-            if times >= time_limit:
+            elapsed = time.perf_counter() - start
+            if elapsed >= time_limit:
                 print("Violate time limitation")
-                self.Application.Engine.Stop
+                self.Application.Engine.Stop()
+                self.run_timeouts += 1
+                completed = False
                 break
+            time.sleep(min(interval, time_limit - elapsed))
+            if self.heartbeat is not None:
+                self.heartbeat()
+            interval = min(1.5 * interval, self.poll_interval_max)
+
+        if completed:
+            self.run_times.append(time.perf_counter() - start)
+        self.last_run_completed = completed
+        return completed
 
 
     def check_convergency(self, last_line_checked):
         # check the simulation convergency by detecting errors in the history file
-        runID = self.Application.Tree.FindNode(r"\Data\Results Summary\Run-Status\Output\RUNID").Value
+        runID = self.find_node(r"\Data\Results Summary\Run-Status\Output\RUNID").Value
         his_file = rf"C:\Users\Jonas\PycharmProjects\master_thesis\Aspen\AspenPlus-Python-Interface\Automation tests\Test run_base model\{runID}.his"
 
         with open(his_file, "r") as f:
@@ -92,7 +229,7 @@ class Aspen_Plus_Interface():
     def collect_stream(self):
         # colloct all streams involved in the process
         streams = []
-        node = self.Application.Tree.FindNode(r"\Data\Streams")
+        node = self.find_node(r"\Data\Streams")
         for item in node.Elements:
             streams.append(item.Name)
         return tuple(streams)
@@ -100,7 +237,7 @@ class Aspen_Plus_Interface():
     def collect_block(self):
         # colloct all blocks involved in the process
         blocks = []
-        node = self.Application.Tree.FindNode(r"\Data\Blocks")
+        node = self.find_node(r"\Data\Blocks")
         for item in node.Elements:
             blocks.append(item.Name)
         return tuple(blocks)
@@ -134,11 +271,24 @@ class Aspen_Plus_Interface():
 
 def KillAspen():
     # kill the Aspen Plus
+    from win32com.client import GetObject
     WMI = GetObject("winmgmts:")
     for p in WMI.ExecQuery("select * from Win32_Process where Name='AspenPlus.exe'"):
         os.system("taskkill /pid " + str(p.ProcessId))
 
 
+def AspenProcessIDs():
+    # process IDs of all running Aspen Plus instances
+    from win32com.client import GetObject
+    WMI = GetObject("winmgmts:")
+    return {p.ProcessId for p in WMI.ExecQuery("select * from Win32_Process where Name='AspenPlus.exe'")}
+
+
+def KillAspenProcess(pid):
+    # kill a single Aspen Plus instance, e.g. a hung instance of a worker, without touching the other instances
+    os.system("taskkill /f /pid " + str(pid))
+
+
 def SequenceWithEndPoint(start, stop, step):
     # generate evenly spaced values containing the end point
     return np.arange(start, stop + step, step)
@@ -0,0 +1,162 @@
+from aspen_processtools import *
+import hashlib
+import json
+import sqlite3
+import uuid
+
+########################################################################################################################
+# WARM-START STORE OF CONVERGED FLOWSHEET STATES
+########################################################################################################################
+
+# After a converged scenario, the state of the flowsheet is saved with the input vector of the scenario: the loadings of
+# the tear stream LEANMEA, the target of DS-1, WATOUT and the water make-up, the convergence method of the tear streams
+# and the estimates of the closure solvers. Optionally, a snapshot of the whole flowsheet is saved as bkp file. Before a
+# scenario, the state of the nearest stored input vector is restored as initial guess, thus the closure starts close to
+# the solution also if the scenarios are run out of order or on several Aspen Plus instances (see aspen_pool.py). The
+# states are saved with the hash of the bkp file, states of another bkp file are not restored.
+
+# Numeric nodes of a converged state
+WarmStart_Nodes = LEANMEA_Loadings + [DS1_Target, WATOUT_Flow, MAKEUP_H2OFlow]
+
+def file_hash(filepath):
+    # SHA-256 of the content of a file, None without file
+    if filepath is None:
+        return None
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def capture_state(Aspen_Plus, solvers=None):
+    # Current state of the flowsheet and of the closure solvers
+    return {
+        "nodes": dict(zip(WarmStart_Nodes, Aspen_Plus.read_many(WarmStart_Nodes).tolist())),
+        "tear_method": Aspen_Plus.find_node(TearMethod).Value,
+        "solvers": {name: solver.get_estimate() for name, solver in (solvers or {}).items()},
+    }
+
+def restore_state(Aspen_Plus, state, solvers=None):
+    # Write a state of capture_state to the flowsheet and to the closure solvers
+    Aspen_Plus.write_many(state["nodes"])
+    Aspen_Plus.write_many({TearMethod: state["tear_method"]})
+    for name, estimate in state["solvers"].items():
+        if solvers is not None and name in solvers:
+            solvers[name].set_estimate(estimate)
+
+class Warm_Start_Store:
+    """
+    Converged states in a SQLite table with one row per converged scenario. Several Aspen Plus instances can share the
+    store, each reads the states saved by the others before restoring a state.
+    """
+
+    def __init__(self, filepath="Warm_starts.sqlite", inputs=("FLUEGAS CO2 conc",), scale=1.0, max_distance=np.inf,
+                 snapshot_dir=None, bkp_file=None):
+        """
+        :param filepath: location of the SQLite database, created if it does not exist
+        :param inputs: keys of the scenario forming the input vector
+        :param scale: scale of each input (scalar or one per input) for the distance of input vectors
+        :param max_distance: maximum scaled distance of a stored state to be restored
+        :param snapshot_dir: directory of the snapshots of the flowsheet (bkp files), None for no snapshots
+        :param bkp_file: location of the Aspen Plus file the states are calculated with. Only the states saved with the
+                         same content of the bkp file are restored.
+        """
+        self.filepath = os.path.abspath(filepath)
+        self.inputs = list(inputs)
+        self.scale = np.broadcast_to(np.asarray(scale, dtype=float), (len(self.inputs),))
+        self.max_distance = max_distance
+        self.snapshot_dir = os.path.abspath(snapshot_dir) if snapshot_dir else None
+        if self.snapshot_dir:
+            os.makedirs(self.snapshot_dir, exist_ok=True)
+        self.bkp_hash = file_hash(bkp_file)
+
+        self._connection = sqlite3.connect(self.filepath, timeout=60)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS states "
+                                 "(id INTEGER PRIMARY KEY, inputs TEXT, state TEXT, snapshot TEXT, bkp_hash TEXT)")
+        # Stores of earlier versions have no hash of the bkp file, their states are not restored with a bkp file
+        columns = [row[1] for row in self._connection.execute("PRAGMA table_info(states)")]
+        if "bkp_hash" not in columns:
+            self._connection.execute("ALTER TABLE states ADD COLUMN bkp_hash TEXT")
+        self._connection.commit()
+        self._vectors = np.zeros((0, len(self.inputs)))
+        self._states = []
+        self._last_id = 0
+        self.restored = 0
+        self.saved = 0
+
+    def vector(self, scenario):
+        return np.array([scenario[name] for name in self.inputs], dtype=float)
+
+    def _refresh(self):
+        # Load the states of the bkp file saved since the last refresh, also by other Aspen Plus instances
+        rows = self._connection.execute("SELECT id, inputs, state, snapshot FROM states WHERE id > ? AND bkp_hash IS ? "
+                                        "ORDER BY id", (self._last_id, self.bkp_hash)).fetchall()
+        if not rows:
+            return
+        self._vectors = np.vstack([self._vectors] + [json.loads(row[1]) for row in rows])
+        self._states += [(row[0], json.loads(row[2]), row[3]) for row in rows]
+        self._last_id = rows[-1][0]
+
+    def nearest(self, scenario):
+        """
+        :param scenario: dict of process parameters with the keys of inputs
+        :return: distance, state, snapshot and input vector of the nearest stored state, None if no state is within
+                 max_distance
+        """
+        self._refresh()
+        if not self._states:
+            return None
+        distances = np.linalg.norm((self._vectors - self.vector(scenario)) / self.scale, axis=1)
+        i = int(np.argmin(distances))
+        if distances[i] > self.max_distance:
+            return None
+        _, state, snapshot = self._states[i]
+        return float(distances[i]), state, snapshot, self._vectors[i]
+
+    def restore(self, Aspen_Plus, scenario, solvers=None):
+        """
+        Restore the nearest converged state as initial guess of the scenario
+        :param solvers: closure solvers (see closure_solvers), their estimates are restored as well
+        :return: True if a state was restored
+        """
+        found = self.nearest(scenario)
+        if found is None:
+            print("  Warm start: no converged state available, the scenario starts from the current state.")
+            return False
+        distance, state, snapshot, _ = found
+
+        if snapshot is not None and os.path.exists(snapshot):
+            Aspen_Plus.load_bkp(snapshot, Aspen_Plus.Application.Visible, Aspen_Plus.Application.SuppressDialogs)
+        restore_state(Aspen_Plus, state, solvers)
+
+        print(f"  Warm start: converged state at distance {distance:.4g} restored"
+              f"{' from snapshot' if snapshot is not None else ''}.")
+        self.restored += 1
+        return True
+
+    def save(self, Aspen_Plus, scenario, solvers=None):
+        """
+        Save the state of a converged scenario
+        :param solvers: closure solvers (see closure_solvers), their estimates are saved as well
+        """
+        state = capture_state(Aspen_Plus, solvers)
+        # The snapshot is saved before the transaction, thus the database is not locked for the other instances while
+        # Aspen Plus writes the file
+        snapshot = None
+        if self.snapshot_dir:
+            snapshot = os.path.join(self.snapshot_dir, f"state_{uuid.uuid4().hex}.bkp")
+            Aspen_Plus.SaveAs(snapshot)
+        with self._connection:
+            self._connection.execute("INSERT INTO states (inputs, state, snapshot, bkp_hash) VALUES (?, ?, ?, ?)",
+                                     (json.dumps(self.vector(scenario).tolist()), json.dumps(state), snapshot,
+                                      self.bkp_hash))
+        self.saved += 1
+
+    def close(self):
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,261 @@
+import time
+from brightway_utilis import *
+from brightway_foreground import *
+import bw2calc as bc
+import bw2data as bd
+import numpy as np
+import pandas as pd
+
+########################################################################################################################
+# LCA ENGINE WITH CACHED BACKGROUND FACTORIZATION
+########################################################################################################################
+
+# The ecoinvent background does not depend on the MEA carbon capture foreground. Thus, the technosphere matrix is block
+# triangular and each scenario can be solved in two steps:
+# 1. Solve the small foreground system for the scaling of the foreground activities
+# 2. Solve the background for the products demanded by the foreground, reusing the factorized background technosphere
+# The LCA score is the score of the background plus the characterized direct emissions of the foreground.
+
+class LCA_Engine:
+
+    def __init__(self, method_input, project="project_E2DT", use_distributions=False, seed=None):
+        """
+        Load and factorize the background technosphere once for all scenarios
+        :param method_input: LCIA method name, list of methods or pattern of methods (see find_methods). The inventory
+                             of a scenario is calculated once and characterized with all methods.
+        :param project: Brightway project with databases ecoinvent_cutoff_391 and biosphere3
+        :param use_distributions: sample the background matrices from the ecoinvent uncertainty data (see next_sample)
+        :param seed: seed for sampling the background matrices
+        """
+        start = time.perf_counter()
+
+        bd.projects.set_current(name=project)
+        self.methods = find_methods(method_input)
+        self.method = self.methods[0]
+        self.background_ids = background_registry.ids()
+
+        # LCA of the background with all products demanded by the foreground system
+        self.lca = bc.LCA(
+            demand={self.background_ids[name]: 1 for name in background_technosphere},
+            data_objs=background_datapackages(self.method),
+            use_distributions=use_distributions,
+            seed_override=seed
+        )
+        self.lca.lci(factorize=True)
+
+        # Characterization matrix (methods x biosphere flows of the background) and characterization factors of the
+        # elementary flows emitted directly by the foreground system (methods x background_biosphere)
+        flows = self.lca.dicts.biosphere
+        self.characterization = np.zeros((len(self.methods), len(flows)))
+        self.foreground_cfs = np.zeros((len(self.methods), len(background_biosphere)))
+        for m, method in enumerate(self.methods):
+            cfs = characterization_factors(method)
+            for flow, cf in cfs.items():
+                if flow in flows:
+                    self.characterization[m, flows[flow]] = cf
+            self.foreground_cfs[m] = [cfs.get(self.background_ids[name], 0) for name in background_biosphere]
+
+        # Demand of the functional unit (same as calculate_LCA)
+        self.demand = np.zeros(len(foreground_activities))
+        self.demand[list(foreground_activities).index(functional_unit_activity)] = 1000
+
+        self.setup_time = time.perf_counter() - start
+        self.solve_time = 0.0
+        self.scenarios = 0
+        self._unit_scores = None
+        self._unit_supplies = None
+        self._process_cfs = None
+        self._process_labels = {}
+
+    def calculate(self, inventory_row):
+        """
+        Calculate the LCA score of the functional unit for one scenario
+        :param inventory_row: row of the inventory table (see inventory_table) for the current run
+        :return: LCA score of the first method
+        """
+        return float(self.calculate_methods(inventory_row)[0])
+
+    def calculate_methods(self, inventory_row):
+        """
+        Calculate the LCA scores of the functional unit for one scenario and all methods of the engine
+        :param inventory_row: row of the inventory table (see inventory_table) for the current run
+        :return: array of LCA scores (methods)
+        """
+        start = time.perf_counter()
+
+        technosphere, background, biosphere = foreground_matrices(inventory_row.to_frame().T)
+
+        # Scaling of the foreground activities and demand of background products
+        supply = np.linalg.solve(technosphere[0], self.demand)
+        background_demand = background[0] @ supply
+
+        # Background solved with the cached factorization
+        self.lca.lci(demand={
+            self.background_ids[name]: amount for name, amount in zip(background_technosphere, background_demand)
+        })
+
+        # Inventory of the scenario characterized with all methods
+        inventory = self.lca.biosphere_matrix @ self.lca.supply_array
+        scores = self.characterization @ inventory + self.foreground_cfs @ (biosphere[0] @ supply)
+
+        self.solve_time += time.perf_counter() - start
+        self.scenarios += 1
+        return scores
+
+    def next_sample(self):
+        """
+        Draw new background matrices from the uncertainty distributions (requires use_distributions=True) and factorize
+        the sampled technosphere. All following calculations use the new sample.
+        """
+        # The inventory is recalculated by the scenarios. Dropping it avoids one solve with the old demand in bc.LCA.
+        if hasattr(self.lca, "inventory"):
+            del self.lca.inventory
+        next(self.lca)
+        if not bc.PYPARDISO:
+            self.lca.decompose_technosphere()
+        self._unit_scores = None
+        self._process_cfs = None
+
+    def unit_scores(self):
+        """
+        Characterized impact per unit of each product in background_technosphere. They are calculated once with the
+        cached factorization and reused for all batches.
+        :return: array (methods x background_technosphere)
+        """
+        if self._unit_scores is None:
+            unit_supplies = []
+            for name in background_technosphere:
+                self.lca.lci(demand={self.background_ids[name]: 1})
+                unit_supplies.append(self.lca.supply_array.copy())
+            # Supply of the background processes per unit of each product (processes x background_technosphere)
+            self._unit_supplies = np.array(unit_supplies).T
+            self._unit_scores = self.characterization @ (self.lca.biosphere_matrix @ self._unit_supplies)
+        return self._unit_scores
+
+    def calculate_batch(self, amounts):
+        """
+        Calculate the LCA scores of many scenarios at once
+        :param amounts: array (scenarios x foreground_parameters), e.g. from foreground_amounts(sim_data)
+        :return: array of LCA scores of the first method (scenarios)
+        """
+        return self.calculate_batch_methods(amounts)[:, 0]
+
+    def calculate_batch_methods(self, amounts):
+        """
+        Calculate the LCA scores of many scenarios and all methods of the engine at once. As the background is linear,
+        the score of a scenario is the scaling of the foreground activities times the characterized impact of their
+        direct inputs and emissions.
+        :param amounts: array (scenarios x foreground_parameters), e.g. from foreground_amounts(sim_data)
+        :return: array of LCA scores (scenarios x methods)
+        """
+        start = time.perf_counter()
+
+        table = pd.DataFrame(np.atleast_2d(amounts), columns=foreground_parameters)
+        technosphere, background, biosphere = foreground_matrices(table)
+
+        # Characterized impact of the direct inputs and emissions per unit of each foreground activity
+        activity_scores = (np.einsum("nbf,mb->nmf", background, self.unit_scores())
+                           + np.einsum("nef,me->nmf", biosphere, self.foreground_cfs))
+
+        # Scaling of the foreground activities of all scenarios
+        demand = np.broadcast_to(self.demand, (len(table), len(self.demand)))[..., np.newaxis]
+        supply = np.linalg.solve(technosphere, demand)[..., 0]
+
+        scores = np.einsum("nf,nmf->nm", supply, activity_scores)
+
+        self.solve_time += time.perf_counter() - start
+        self.scenarios += len(scores)
+        return scores
+
+    def process_cfs(self):
+        # Characterized impact per unit of supply of each background process (methods x processes)
+        if self._process_cfs is None:
+            self._process_cfs = (self.lca.biosphere_matrix.T @ self.characterization.T).T
+        return self._process_cfs
+
+    def process_labels(self, indices):
+        # Names and locations of background processes by their column in the technosphere matrix
+        missing = [index for index in indices if index not in self._process_labels]
+        if missing:
+            ids = {self.lca.dicts.activity.reversed[index]: index for index in missing}
+            query = (ActivityDataset
+                     .select(ActivityDataset.id, ActivityDataset.name, ActivityDataset.location)
+                     .where(ActivityDataset.id << list(ids)))
+            for activity_id, name, location in query.tuples():
+                self._process_labels[ids[activity_id]] = f"{name} ({location})"
+        return [self._process_labels.get(index, str(index)) for index in indices]
+
+    def contributions_batch(self, amounts, top=10, method=0, chunk_size=1000):
+        """
+        Contributions to the LCA score of many scenarios by foreground exchange and by background process. They are
+        calculated from the unit scores and supplies of the background products, thus without solving the background
+        again. The foreground contributions add up to the LCA score, the background contributions to the part of the
+        score caused in the background.
+        :param amounts: array (scenarios x foreground_parameters), e.g. from foreground_amounts(sim_data)
+        :param top: number of largest contributors (absolute value) per scenario included in the table
+        :param method: index of the method in self.methods
+        :param chunk_size: number of scenarios for which the contributions of all background processes are held at once
+        :return: dataframe (scenarios x contributors) with columns ("foreground"/"background", contributor)
+        """
+        table = pd.DataFrame(np.atleast_2d(amounts), columns=foreground_parameters)
+        technosphere, background, biosphere = foreground_matrices(table)
+        demand = np.broadcast_to(self.demand, (len(table), len(self.demand)))[..., np.newaxis]
+        supply = np.linalg.solve(technosphere, demand)[..., 0]
+        unit_scores = self.unit_scores()[method]
+
+        # Foreground exchanges: inputs from the background and emissions times the scaling of their activity
+        foreground = list(foreground_activities)
+        labels, columns = [], []
+        for activity, name, input_name, amount, _, exchange_type in foreground_exchanges:
+            if input_name in background_technosphere:
+                unit = unit_scores[background_technosphere.index(input_name)]
+            elif input_name in background_biosphere:
+                unit = self.foreground_cfs[method, background_biosphere.index(input_name)]
+            else:
+                continue
+            if isinstance(amount, str):
+                amount = table[amount].to_numpy(dtype=float)
+            columns.append(supply[:, foreground.index(activity)] * amount * unit)
+            labels.append(f"{foreground_activities[activity]['name']}: {name}")
+        foreground_contributions = np.column_stack(columns)
+        selected_foreground = _top_columns(foreground_contributions, top)
+
+        # Background processes: supply of the processes for the products demanded by the foreground
+        background_demand = np.einsum("nbf,nf->nb", background, supply)
+        process_cfs = self.process_cfs()[method]
+        selected_background = set()
+        for start in range(0, len(table), chunk_size):
+            contributions = (background_demand[start:start + chunk_size] @ self._unit_supplies.T) * process_cfs
+            selected_background.update(_top_columns(contributions, top))
+        selected_background = sorted(selected_background)
+        background_contributions = (background_demand @ self._unit_supplies[selected_background].T
+                                    * process_cfs[selected_background])
+
+        return pd.concat([
+            pd.DataFrame(foreground_contributions[:, selected_foreground],
+                         columns=[labels[index] for index in selected_foreground]),
+            pd.DataFrame(background_contributions, columns=self.process_labels(selected_background)),
+        ], axis=1, keys=["foreground", "background"])
+
+    def timing(self):
+        # Time split between setup (loading and factorizing the background) and the solves of the scenarios in s
+        return {
+            "setup": self.setup_time,
+            "solve total": self.solve_time,
+            "solve mean": self.solve_time / self.scenarios if self.scenarios else 0.0,
+            "scenarios": self.scenarios,
+        }
+
+    def report_timing(self):
+        timing = self.timing()
+        print(f"  LCA engine: setup {timing['setup']:.3f} s, {timing['scenarios']} scenarios solved in "
+              f"{timing['solve total']:.3f} s ({1000 * timing['solve mean']:.4f} ms per scenario)")
+
+
+def _top_columns(values, top):
+    # Sorted union of the columns with the largest absolute values of each row
+    top = min(top, values.shape[1])
+    if top == 0:
+        return []
+    columns = np.argpartition(-np.abs(values), top - 1, axis=1)[:, :top]
+    return sorted(set(columns.ravel().tolist()))
@@ -0,0 +1,491 @@
+from brightway_utilis import Background_Registry
+import bw2calc as bc
+import bw2data as bd
+import bw_processing as bwp
+from bw2data.errors import UnknownObject
+import numpy as np
+import pandas as pd
+
+########################################################################################################################
+# DEFINITION OF THE MEA CARBON CAPTURE FOREGROUND SYSTEM
+########################################################################################################################
+
+# Names of the databases created in advance in the initial setup and of the custom foreground database
+ecoinvent_version_cutoff = "ecoinvent_cutoff_391"
+ecoinvent_version_biosphere = "biosphere3"
+foreground_database = "MEA_Carbon_Capture"
+
+# Plant normalisation: operating hours over the lifetime of the carbon capture plant
+total_hours = 216000
+
+# Activities of database MEA_Carbon_Capture
+foreground_activities = {
+    # Activity: Absorber
+    "abs": {
+        'name': 'Absorber',
+        'code': '1',
+        'location': 'GLO',
+        'reference product': 'Absorber with Packing',
+        'type': 'process',
+        'unit': 'unit',
+    },
+    # Activity: Desorber
+    "des": {
+        'name': 'Desorber',
+        'code': '2',
+        'location': 'GLO',
+        'reference product': "Desorber with Packing",
+        'type': "process",
+        'unit': 'unit',
+    },
+    # Activity: MEA production
+    "MEAprod": {
+        'name': 'MEA production',
+        'code': '4',
+        'location': 'GLO',
+        'reference product': "MEA production",
+        'type': "process",
+        'unit': 'kg',
+    },
+    # Activity:Infrastructure Absorption/ Desorption
+    "InfraAbsDes": {
+        'name': 'inf_absorption_desorption',
+        'code': '5',
+        'location': 'GLO',
+        'reference product': 'Carbon Capture Plant',
+        'type': 'process',
+        'unit': 'unit',
+    },
+    # Activity: Production Absorption/ Desorption
+    "ProAbsDes": {
+        'name': 'pro_absorption_desorption',
+        'code': '6',
+        'location': 'GLO',
+        'reference product': 'CO2 produced',
+        'type': 'process',
+        'unit': 'kg/h',
+    },
+}
+
+# Activities of the databases biosphere3 and ecoinvent used as inputs of the foreground system: (database, code)
+background_activities = {
+    # Data (activities) from database biosphere 3 for Carbon dioxide, Nitrogen, Water, Monoethanolamine
+    "CarbonDioxide_airurban": (ecoinvent_version_biosphere, "aa7cac3a-3625-41d4-bc54-33e2cf11ec46"),
+    "Nitrogen_air": (ecoinvent_version_biosphere, "e5ea66ee-28e2-4e9b-9a25-4414551d821c"),
+    "Water_air": (ecoinvent_version_biosphere, "075e433b-4be4-448e-9510-9a5029c1ce94"),
+    "Monoethanolamine_air": (ecoinvent_version_biosphere, "9f550c00-0f0f-45e7-a29c-a450752d4c7a"),
+    # Market for steel, low-alloyed and unalloy for packings (low-alloyed) and columns (unalloyed)
+    "low_alloyed": (ecoinvent_version_cutoff, "a0bd454544d5b0919de48edec5c458e7"),
+    "unalloyed": (ecoinvent_version_cutoff, "d872e0d78319cb13e12b96de83e19dd7"),
+    # Reboiler: heat production, natural gas, at industrial furnace >100kW
+    "heatprod": (ecoinvent_version_cutoff, "b74c8625e0adf3b76b6a1aafed10312b"),
+    # Market for monoethanolamine
+    "marketMEA": (ecoinvent_version_cutoff, "1d95a9865e5ecb049eb64f6823865078"),
+    # Market for tap water
+    "markettapwater": (ecoinvent_version_cutoff, "4fe1f2dae4830593ee2d608cb2d5ff2c"),
+    # Market for waste water, average
+    "marketwastewater": (ecoinvent_version_cutoff, "ef9e2b6a0815008d49a77388e7c5b0e8"),
+    # Market group for electricity, medium voltage
+    "marketelectr": (ecoinvent_version_cutoff, "476b68dc744251f288055e5ce8264feb"),
+    # Market for water, deionised
+    "marketwaterdeion": (ecoinvent_version_cutoff, "95d26245bc411de42cbca001406f6131"),
+    # Water production, deionsed
+    "waterproddeion": (ecoinvent_version_cutoff, "395d665bd9b8ce065b590bd96fd74ca9"),
+    # Market for air compressor, screw-type compressor, 300kW
+    "compr": (ecoinvent_version_cutoff, "fdabbf27abc2d302066ebce8affec56a"),
+    # Market for borehole heat exchanger, 150m
+    "heatex": (ecoinvent_version_cutoff, "5d68a7fd42b989d214867478b999a04c"),
+    # Market for gas boiler
+    "gasboil": (ecoinvent_version_cutoff, "976694b4c0b31641b846a89d2fbf6c4b"),
+    # Market for pump, 40W
+    "pump": (ecoinvent_version_cutoff, "1358cde069b0d7df0f29529d19c6f900"),
+}
+
+# Activities of background_activities resolved once per project (see Background_Registry in brightway_utilis.py)
+background_registry = Background_Registry(background_activities)
+
+# Background activities supplying products (ecoinvent) and elementary flows (biosphere3) to the foreground system
+background_technosphere = [name for name, (database, _) in background_activities.items()
+                           if database == ecoinvent_version_cutoff]
+background_biosphere = [name for name, (database, _) in background_activities.items()
+                        if database == ecoinvent_version_biosphere]
+
+# Exchanges of the activities of database MEA_Carbon_Capture:
+# (activity, name, input, amount, unit, type)
+# The input is a key of foreground_activities or background_activities. The amount is either fixed or the name of a
+# column of the inventory table (see inventory_table), which holds the Aspen Plus results of the current run.
+foreground_exchanges = [
+    # Exchanges for activity Absorber
+    ("abs", "Absorber", "abs", 1, "unit", "production"),
+    ("abs", "market for steel, low-alloyed", "low_alloyed", "Absorber Packing", "kilogram/kilogram CO2",
+     "technosphere"),
+    ("abs", "market for steel, unalloyed", "unalloyed", "Absorber Column", "kilogram/kilogram CO2", "technosphere"),
+
+    # Exchanges for activity Desorber
+    ("des", "Desorber", "des", 1, "unit", "production"),
+    ("des", "market for steel, low-alloyed", "low_alloyed", "Desorber Packing", "kilogram/kilogram CO2",
+     "technosphere"),
+    ("des", "market for steel, unalloyed", "unalloyed", "Desorber Column", "kilogram/kilogram CO2", "technosphere"),
+
+    # Exchanges for activity MEA production
+    ("MEAprod", "MEA production", "MEAprod", 1, "kilogram", "production"),
+    ("MEAprod", "market for monoethanolamine", "marketMEA", 0.3, "kilogram", "technosphere"),
+    ("MEAprod", "market for water, deionised", "marketwaterdeion", 0.7, "kilogram", "technosphere"),
+
+    # Exchanges for activity InfraAbsDes
+    ("InfraAbsDes", "InfraAbsDes", "InfraAbsDes", 1, "unit", "production"),
+    ("InfraAbsDes", "Absorber", "abs", 1, "unit", "technosphere"),
+    ("InfraAbsDes", "Desorber", "des", 1, "unit", "technosphere"),
+    ("InfraAbsDes", "market for air compressor, screw-type compressor, 300kW", "compr", 1, "unit", "technosphere"),
+    ("InfraAbsDes", "Market for borehole heat exchanger, 150m", "heatex", 3, "unit", "technosphere"),
+    ("InfraAbsDes", "Market for gas boiler", "gasboil", 1, "unit", "technosphere"),
+    ("InfraAbsDes", "Market for pump, 40W", "pump", 6, "unit", "technosphere"),
+
+    # Exchanges for activity ProAbsDes
+    ("ProAbsDes", "Carbon dioxide, fossil", "CarbonDioxide_airurban", "FLUEOFF CO2", "kilogram", "biosphere"),
+    ("ProAbsDes", "Monoethanolamine", "Monoethanolamine_air", "FLUEOFF MEA", "kilogram", "biosphere"),
+    ("ProAbsDes", "Nitrogen", "Nitrogen_air", "FLUEOFF N2", "kilogram", "biosphere"),
+    ("ProAbsDes", "Water", "Water_air", "FLUEOFF H2O", "cubicmeter", "biosphere"),
+    ("ProAbsDes", "pro_absorption_desorption", "ProAbsDes", "CO2 captured", "kilogram", "production"),
+    ("ProAbsDes", "MEA production", "MEAprod", "Norm Solvent flow rate", "kilogram", "technosphere"),
+    ("ProAbsDes", "heat production, natural gas, at industrial furnace >100kW", "heatprod", "Reboiler heat in MJ",
+     "megajoule", "technosphere"),
+    ("ProAbsDes", "Infrastructure Absorber/ Desorber", "InfraAbsDes", "Norm Carbon capture plant", "unit",
+     "technosphere"),
+    ("ProAbsDes", "Market for monoethanolamine", "marketMEA", "WATOUT out MEA", "kilogram", "technosphere"),
+    ("ProAbsDes", "Market for tap water", "markettapwater", "Cooling water total", "kilogram", "technosphere"),
+    ("ProAbsDes", "Market for tap wastewater, average", "marketwastewater", "WATOUT out water", "cubicmeter",
+     "technosphere"),
+    ("ProAbsDes", "Market group for electricity, medium voltage", "marketelectr", "Total electr.", "kilowatt hour",
+     "technosphere"),
+    ("ProAbsDes", "Water production, deionised", "waterproddeion", "WASHWAT in", "kilogram", "technosphere"),
+]
+
+# Activity the functional unit refers to
+functional_unit_activity = "ProAbsDes"
+
+# Columns of the inventory table the amounts of the foreground exchanges depend on
+foreground_parameters = list(dict.fromkeys(
+    exchange[3] for exchange in foreground_exchanges if isinstance(exchange[3], str)
+))
+
+########################################################################################################################
+# INVENTORY FROM ASPEN PLUS RESULTS
+########################################################################################################################
+
+def get_inventory(sim_data):
+    """
+    Structure the Aspen Plus results according to the LCI
+    :param sim_data: list of dataframes returned by the retrieve_* methods of Aspen_Plus_ProcessTools (one column per run)
+    :return: list of dataframes (one row per run) for process parameters, material flow, natural resources, energy flow
+             and infrastructure
+    """
+
+    # --- Get Process Parameters ---
+    df_ProcessParameters = sim_data[0].T.astype(float).reset_index(drop=True)
+    df_ProcessParameters.columns = ["Solvent flow rate"]
+
+    # --- Get Material Flows ---
+    df_MaterialFlow = sim_data[1].T.astype(float).reset_index(drop=True)
+    df_MaterialFlow.columns = [
+        "CO2 captured", "FLUEGAS total", "FLUEGAS CO2", "FLUEGAS N2", "FLUEGAS O2",
+        "FLUEGAS H2O", "MAKEUP Water", "MAKEUP Amine", "FLUEOFF total", "FLUEOFF CO2",
+        "FLUEOFF N2", "FLUEOFF H2O", "FLUEOFF MEA", "WASHWAT in", "WATOUT out water", "WATOUT out MEA"
+    ]
+
+    # Plant normalisation:
+    df_ProcessParameters["Norm Solvent flow rate"] = (
+        df_ProcessParameters["Solvent flow rate"] / (df_MaterialFlow["CO2 captured"] * total_hours)
+    )
+
+    # --- Get Natural Resources ---
+    df_NaturalResources = sim_data[2].T.astype(float).reset_index(drop=True)
+    df_NaturalResources.columns = ["Cooling water COOLER", "Cooling water COND"]
+
+    # --- Get Energy Flow (Background) ---
+    df_EnergyFlow = sim_data[3].T.astype(float).reset_index(drop=True)
+    df_EnergyFlow.columns = ["Reboiler steam in MJ/ton CO2", "Total electr.", "Pump electr."]
+
+    df_EnergyFlow["Reboiler steam in kWh"] = (
+        df_EnergyFlow["Reboiler steam in MJ/ton CO2"] * df_MaterialFlow["CO2 captured"] * 0.001 / 3.6
+    )
+    df_EnergyFlow["Total energy"] = (
+        df_EnergyFlow["Total electr."] / (df_MaterialFlow["CO2 captured"] * 0.001 / 3600)
+    )
+
+    # --- Get Infrastructure ---
+    df_Infrastructure = sim_data[4].T.astype(float).reset_index(drop=True)
+    df_Infrastructure.columns = [
+        "Absorber Column", "Absorber Packing", "Desorber Column", "Desorber Packing"
+    ]
+    df_Infrastructure["Norm Carbon capture plant"] = 1 / (
+        df_MaterialFlow["CO2 captured"] * total_hours
+    )
+
+    return [df_ProcessParameters, df_MaterialFlow, df_NaturalResources, df_EnergyFlow, df_Infrastructure]
+
+
+def inventory_table(inventory):
+    """
+    Combine the inventory dataframes to one table holding every amount referenced in foreground_exchanges
+    :param inventory: list of dataframes returned by get_inventory
+    :return: dataframe with one row per run
+    """
+    table = pd.concat(inventory, axis=1)
+
+    # Reboiler - heat production, natural gas, at industrial furnace >100kW
+    table["Reboiler heat in MJ"] = table["Reboiler steam in MJ/ton CO2"] * (table["CO2 captured"] / 1000)
+
+    # Cooling water of COOLER and COND supplied by market for tap water
+    table["Cooling water total"] = table["Cooling water COOLER"] + table["Cooling water COND"]
+
+    return table
+
+
+def foreground_amounts(sim_data):
+    """
+    Amounts of the foreground exchanges for all runs of sim_data
+    :param sim_data: list of dataframes returned by the retrieve_* methods of Aspen_Plus_ProcessTools (one column per run)
+    :return: array (runs x foreground_parameters)
+    """
+    return inventory_table(get_inventory(sim_data))[foreground_parameters].to_numpy(dtype=float)
+
+
+def exchange_amount(amount, inventory_row):
+    # fixed amount or value of the inventory table for the current run
+    if isinstance(amount, str):
+        return float(inventory_row[amount])
+    return amount
+
+
+def exchange_input(name):
+    # (database, code) of the input of an exchange
+    if name in foreground_activities:
+        return (foreground_database, foreground_activities[name]['code'])
+    return background_activities[name]
+
+
+def exchange_key(exchange):
+    # Unique key of an exchange in database MEA_Carbon_Capture: (activity code, input, type)
+    activity, _, input_name, _, _, exchange_type = exchange
+    return (foreground_activities[activity]['code'], exchange_input(input_name), exchange_type)
+
+
+def foreground_matrices(table):
+    """
+    Foreground system as dense matrices for all runs of an inventory table
+    :param table: inventory table (see inventory_table) with one row per run
+    :return: technosphere matrix (runs x foreground x foreground), amounts of background_technosphere
+             (runs x background x foreground) and of background_biosphere (runs x flows x foreground), each with the
+             activities in the order of foreground_activities as columns
+    """
+    runs = len(table)
+    foreground = list(foreground_activities)
+    technosphere = np.zeros((runs, len(foreground), len(foreground)))
+    background = np.zeros((runs, len(background_technosphere), len(foreground)))
+    biosphere = np.zeros((runs, len(background_biosphere), len(foreground)))
+
+    for activity, _, input_name, amount, _, exchange_type in foreground_exchanges:
+        if isinstance(amount, str):
+            amount = table[amount].to_numpy(dtype=float)
+        col = foreground.index(activity)
+        if exchange_type == "biosphere":
+            biosphere[:, background_biosphere.index(input_name), col] += amount
+        elif input_name in background_activities:
+            background[:, background_technosphere.index(input_name), col] += amount
+        elif exchange_type == "production":
+            technosphere[:, foreground.index(input_name), col] += amount
+        else:
+            technosphere[:, foreground.index(input_name), col] -= amount
+
+    return technosphere, background, biosphere
+
+
+########################################################################################################################
+# DATABASE MEA CARBON CAPTURE
+########################################################################################################################
+
+# Exchanges of database MEA_Carbon_Capture per project for the persistent foreground (see update_foreground_database)
+_foreground_cache = {}
+
+
+def create_foreground_database(inventory_row):
+    """
+    Delete and recreate database MEA_Carbon_Capture with the amounts of the current run
+    :param inventory_row: row of the inventory table (see inventory_table) for the current run
+    :return: activity the functional unit refers to
+    """
+
+    # Delete old database MEA_Carbon_Capture (It is recreated below and populated with new Aspen Plus simulation results)
+    try:
+        del bd.databases[foreground_database]
+    except KeyError:
+        pass
+
+    # Create new database MEA Carbon Capture for new run
+    my_database = bd.Database(foreground_database)
+    my_database.register()
+
+    activities = {}
+    for name, data in foreground_activities.items():
+        activities[name] = my_database.new_activity(**data)
+        activities[name].save()
+
+    for activity, name, input_name, amount, unit, exchange_type in foreground_exchanges:
+        activities[activity].new_exchange(
+            name = name,
+            input = exchange_input(input_name),
+            amount = exchange_amount(amount, inventory_row),
+            unit = unit,
+            type = exchange_type,
+        ).save()
+
+    # The exchanges of the new database are not known for a persistent foreground anymore
+    _foreground_cache.pop(bd.projects.current, None)
+
+    return activities[functional_unit_activity]
+
+
+def _load_foreground_database():
+    # Collect the exchanges of database MEA_Carbon_Capture. Returns None if the database does not match the definition
+    # of the foreground system above (e.g. missing or created by an older version)
+    if foreground_database not in bd.databases:
+        return None
+
+    expected = {exchange_key(exchange): exchange[3] for exchange in foreground_exchanges}
+    activities = {}
+    exchanges = {}
+    for name, data in foreground_activities.items():
+        try:
+            activities[name] = bd.get_activity((foreground_database, data['code']))
+        except UnknownObject:
+            return None
+        for exc in activities[name].exchanges():
+            key = (data['code'], exc.input.key, exc['type'])
+            if key not in expected or key in exchanges:
+                return None
+            # Fixed amounts are not updated per run and have to match the definition
+            if not isinstance(expected[key], str) and exc['amount'] != expected[key]:
+                return None
+            exchanges[key] = exc
+
+    if set(exchanges) != set(expected):
+        return None
+    return activities[functional_unit_activity], exchanges
+
+
+def update_foreground_database(inventory_row):
+    """
+    Update database MEA_Carbon_Capture in place for the current run. The database is only created if it does not exist
+    yet in the current project. Afterwards, only exchanges whose amount changed are saved.
+    :param inventory_row: row of the inventory table (see inventory_table) for the current run
+    :return: activity the functional unit refers to
+    """
+    project = bd.projects.current
+
+    if project not in _foreground_cache:
+        loaded = _load_foreground_database()
+        if loaded is None:
+            print("  Creating persistent database " + foreground_database + ".")
+            create_foreground_database(inventory_row)
+            loaded = _load_foreground_database()
+        _foreground_cache[project] = loaded
+
+    functional_unit, exchanges = _foreground_cache[project]
+
+    updated = 0
+    for exchange in foreground_exchanges:
+        amount = exchange[3]
+        if not isinstance(amount, str):
+            continue
+        exc = exchanges[exchange_key(exchange)]
+        new_amount = exchange_amount(amount, inventory_row)
+        if exc['amount'] != new_amount:
+            exc['amount'] = new_amount
+            exc.save()
+            updated += 1
+
+    print(f"  Updated {updated} exchanges of database {foreground_database}.")
+
+    return functional_unit
+
+
+########################################################################################################################
+# IN-MEMORY FOREGROUND (NO DATABASE WRITES)
+########################################################################################################################
+
+# Matrix ids of the foreground activities of an in-memory foreground. Matrix ids have to be positive, so the ids are
+# placed far above the ids bw2data assigns to the activities and biosphere flows of the project.
+foreground_ids = {name: 2 ** 62 + index for index, name in enumerate(foreground_activities)}
+
+# Processed datapackages per project and method (see background_datapackages)
+_background_datapackages = {}
+
+
+def background_datapackages(method):
+    """
+    Processed datapackages of ecoinvent, biosphere3 and the LCIA method. They are loaded once per project and method.
+    :param method: LCIA method (tuple)
+    :return: list of datapackages
+    """
+    project = bd.projects.current
+    if (project, method) not in _background_datapackages:
+        _, data_objs, _ = bd.prepare_lca_inputs(
+            {background_activities["heatprod"]: 1},
+            method=method,
+            remapping=False
+        )
+        _background_datapackages[(project, method)] = data_objs
+    return _background_datapackages[(project, method)]
+
+
+def matrix_id(name):
+    # Matrix id of a foreground or background activity
+    if name in foreground_ids:
+        return foreground_ids[name]
+    return background_registry.load()[name]["id"]
+
+
+def foreground_datapackage(inventory_row):
+    """
+    Assemble the technosphere and biosphere exchanges of the foreground system as in-memory datapackage
+    :param inventory_row: row of the inventory table (see inventory_table) for the current run
+    :return: datapackage which can be passed to bc.LCA together with background_datapackages
+    """
+    dp = bwp.create_datapackage(name=foreground_database)
+
+    for matrix, exchange_types in (("technosphere_matrix", ("production", "technosphere")),
+                                   ("biosphere_matrix", ("biosphere",))):
+        exchanges = [exchange for exchange in foreground_exchanges if exchange[5] in exchange_types]
+        indices = np.array(
+            [(matrix_id(input_name), foreground_ids[activity]) for activity, _, input_name, _, _, _ in exchanges],
+            dtype=bwp.INDICES_DTYPE
+        )
+        data = np.array([exchange_amount(exchange[3], inventory_row) for exchange in exchanges], dtype=float)
+        # Inputs from the technosphere are negative in the technosphere matrix
+        flip = np.array([exchange[5] == "technosphere" for exchange in exchanges], dtype=bool)
+        dp.add_persistent_vector(
+            matrix=matrix,
+            name=f"{foreground_database}-{matrix}",
+            indices_array=indices,
+            data_array=data,
+            flip_array=flip,
+        )
+
+    return dp
+
+
+def calculate_LCA_in_memory(inventory_row, method):
+    """
+    Calculate the LCA score of the functional unit without writing database MEA_Carbon_Capture
+    :param inventory_row: row of the inventory table (see inventory_table) for the current run
+    :param method: LCIA method (tuple)
+    :return: LCA score
+    """
+    my_lca = bc.LCA(
+        demand={foreground_ids[functional_unit_activity]: 1000},
+        data_objs=background_datapackages(method) + [foreground_datapackage(inventory_row)]
+    )
+    my_lca.lci()
+    my_lca.lcia()
+    return my_lca.score
@@ -0,0 +1,194 @@
+import multiprocessing as mp
+import time
+from brightway_engine import *
+import numpy as np
+import pandas as pd
+
+########################################################################################################################
+# PARALLEL MONTE CARLO UNCERTAINTY ANALYSIS
+########################################################################################################################
+
+# Each worker process builds one LCA_Engine, thus loads the background once, and draws its own deterministic stream of
+# samples (seed + worker index). Per iteration, a worker samples the background matrices (ecoinvent uncertainty data)
+# and factorizes them once, and scores all scenarios with sampled foreground amounts (relative ranges on the Aspen
+# Plus results) with this factorization. Without background uncertainty the factorization is reused for all
+# iterations. The workers send their scores in chunks, the main process only keeps streaming summaries.
+
+class Streaming_Summary:
+    """
+    Summary statistics of Monte Carlo scores which are updated chunk by chunk. Mean and standard deviation are exact,
+    percentiles are calculated from a reservoir sample of fixed size, so the memory does not grow with the iterations.
+    """
+
+    def __init__(self, shape, reservoir_size=10000, seed=0):
+        """
+        :param shape: shape of the scores of one iteration, e.g. (scenarios, methods)
+        :param reservoir_size: maximum number of iterations kept for the percentiles
+        :param seed: seed for the replacement in the reservoir
+        """
+        self.count = 0
+        self.mean = np.zeros(shape)
+        self.M2 = np.zeros(shape)
+        self.min = np.full(shape, np.inf)
+        self.max = np.full(shape, -np.inf)
+        self.reservoir = np.zeros((reservoir_size,) + tuple(shape))
+        self.rng = np.random.default_rng(seed)
+
+    def update(self, scores):
+        """
+        :param scores: array (iterations x shape)
+        """
+        # Welford's algorithm for merging the chunk into mean and variance
+        n = len(scores)
+        chunk_mean = scores.mean(axis=0)
+        delta = chunk_mean - self.mean
+        total = self.count + n
+        self.mean = self.mean + delta * n / total
+        self.M2 = self.M2 + ((scores - chunk_mean) ** 2).sum(axis=0) + delta ** 2 * self.count * n / total
+        self.min = np.minimum(self.min, scores.min(axis=0))
+        self.max = np.maximum(self.max, scores.max(axis=0))
+
+        # Reservoir sampling
+        size = len(self.reservoir)
+        for score in scores:
+            if self.count < size:
+                self.reservoir[self.count] = score
+            else:
+                j = self.rng.integers(0, self.count + 1)
+                if j < size:
+                    self.reservoir[j] = score
+            self.count += 1
+
+    def percentile(self, q):
+        return np.percentile(self.reservoir[:min(self.count, len(self.reservoir))], q, axis=0)
+
+    def to_dataframe(self, scenarios, methods):
+        """
+        :return: dataframe with one row per scenario and method
+        """
+        std = np.sqrt(self.M2 / (self.count - 1)) if self.count > 1 else np.zeros_like(self.mean)
+        statistics = {
+            "mean": self.mean, "std": std, "min": self.min,
+            "p2.5": self.percentile(2.5), "median": self.percentile(50), "p97.5": self.percentile(97.5),
+            "max": self.max,
+        }
+        index = pd.MultiIndex.from_product([scenarios, [" | ".join(m) for m in methods]], names=["scenario", "method"])
+        return pd.DataFrame({name: values.ravel() for name, values in statistics.items()}, index=index)
+
+
+def sample_amounts(amounts, ranges, rng):
+    """
+    Sample the foreground amounts of all scenarios
+    :param amounts: array (scenarios x foreground_parameters)
+    :param ranges: dict of foreground parameter and (low, high) relative range, e.g. {"Reboiler heat in MJ": (0.9, 1.1)}.
+                   The factor is drawn uniformly and applied to all scenarios.
+    :param rng: numpy random generator
+    :return: array (scenarios x foreground_parameters)
+    """
+    sampled = amounts.copy()
+    for parameter, (low, high) in ranges.items():
+        sampled[:, foreground_parameters.index(parameter)] *= rng.uniform(low, high)
+    return sampled
+
+
+def _monte_carlo_worker(worker, iterations, chunk_size, seed, project, method_input, amounts, ranges,
+                        background_uncertainty, queue):
+    try:
+        engine = LCA_Engine(method_input, project, use_distributions=background_uncertainty, seed=seed)
+        rng = np.random.default_rng(seed)
+
+        done = 0
+        while done < iterations:
+            chunk = min(chunk_size, iterations - done)
+            scores = np.zeros((chunk, len(amounts), len(engine.methods)))
+            for it in range(chunk):
+                if background_uncertainty and done + it > 0:
+                    engine.next_sample()
+                scores[it] = engine.calculate_batch_methods(sample_amounts(amounts, ranges, rng))
+            done += chunk
+            queue.put((worker, scores))
+    except Exception as error:
+        queue.put((worker, error))
+    queue.put((worker, None))
+
+
+def _worker_count(iterations, workers):
+    # Number of workers started for the iterations, a worker without iterations would only load the background
+    if iterations < 1 or workers < 1:
+        raise ValueError(f"Monte Carlo requires at least one iteration and one worker: {iterations} iterations, "
+                         f"{workers} workers")
+    return min(workers, iterations)
+
+
+def monte_carlo_stream(table, method_input, iterations=1000, workers=4, ranges=None, background_uncertainty=True,
+                       seed=42, chunk_size=50, project="project_E2DT"):
+    """
+    Run a Monte Carlo analysis on a pool of worker processes and yield the summary whenever a chunk of iterations
+    arrives. The samples are not kept in memory.
+    :param table: inventory table (see inventory_table) with one row per scenario
+    :param method_input: LCIA method name, list of methods or pattern of methods (see find_methods)
+    :param iterations: total number of iterations (at least 1), split evenly over the workers
+    :param workers: number of worker processes, at most one per iteration
+    :param ranges: relative ranges of the foreground amounts (see sample_amounts)
+    :param background_uncertainty: sample the background from the ecoinvent uncertainty data
+    :param seed: seed of worker 0, worker k uses seed + k
+    :param chunk_size: number of iterations a worker calculates before sending the scores
+    :param project: Brightway project
+    :return: generator of (iterations done, iterations per second, Streaming_Summary)
+    """
+    workers = _worker_count(iterations, workers)
+    amounts = table[foreground_parameters].to_numpy(dtype=float)
+    ranges = ranges or {}
+
+    # Spawn (default on Windows) starts the workers with a fresh interpreter without inherited Brightway state
+    context = mp.get_context("spawn")
+    queue = context.Queue()
+    processes = []
+    for worker in range(workers):
+        worker_iterations = iterations // workers + (1 if worker < iterations % workers else 0)
+        process = context.Process(
+            target=_monte_carlo_worker,
+            args=(worker, worker_iterations, chunk_size, seed + worker, project, method_input, amounts, ranges,
+                  background_uncertainty, queue),
+        )
+        process.start()
+        processes.append(process)
+
+    start = time.perf_counter()
+    summary = None
+    running = workers
+    try:
+        while running:
+            worker, scores = queue.get()
+            if scores is None:
+                running -= 1
+                continue
+            if isinstance(scores, Exception):
+                raise scores
+            if summary is None:
+                summary = Streaming_Summary(scores.shape[1:], seed=seed)
+            summary.update(scores)
+            yield summary.count, summary.count / (time.perf_counter() - start), summary
+    finally:
+        for process in processes:
+            process.join(timeout=1)
+            if process.is_alive():
+                process.terminate()
+
+
+def run_monte_carlo(table, method_input, iterations=1000, workers=4, ranges=None, background_uncertainty=True,
+                    seed=42, chunk_size=50, project="project_E2DT"):
+    """
+    Run a Monte Carlo analysis on a pool of worker processes (see monte_carlo_stream) and report the progress
+    :return: dataframe with the summary statistics per scenario and method
+    """
+    workers = _worker_count(iterations, workers)
+    print(f"Monte Carlo: {iterations} iterations for {len(table)} scenarios on {workers} workers")
+    summary = None
+    for done, rate, summary in monte_carlo_stream(table, method_input, iterations, workers, ranges,
+                                                  background_uncertainty, seed, chunk_size, project):
+        print(f"  {done}/{iterations} iterations ({rate:.1f} iterations per second)")
+
+    # The methods are resolved again in the main process for labelling the results
+    bd.projects.set_current(name=project)
+    return summary.to_dataframe(list(table.index), find_methods(method_input))
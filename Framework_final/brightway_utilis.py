@@ -1,13 +1,22 @@
-import win32com.client as win32
-from openpyxl import load_workbook
+import hashlib
+import json
+import os
+import sqlite3
+from fnmatch import fnmatch
+from openpyxl import load_workbook, Workbook
+from openpyxl.utils import column_index_from_string
+import numpy as np
 import pandas as pd
 import bw2analyzer as ba
 import bw2calc as bc
 import bw2data as bd
+from bw2data.backends import ActivityDataset
 import bw2io as bi
 from rapidfuzz import process, fuzz
 
 def init_excel(filepath = r"C:\Users\apuscas\Python\Environment\GitHubRep\Coding_AspenPlus-Brightway-LCA-Platform\E2DT2025\Framework_final\Inventory_Scenario_2_raw_file.xlsx"):
+    # Excel is only available on Windows, read_excel_rows reads the inventory without it
+    import win32com.client as win32
     global excel, wb, sheet
     excel = win32.gencache.EnsureDispatch('Excel.Application')
     excel.Visible = True
@@ -18,33 +27,151 @@ def init_excel(filepath = r"C:\Users\apuscas\Python\Environment\GitHubRep\Coding
 # Utility function to extract rows into DataFrame
 def read_excel_row(skiprow, usecols, nrows=1, names=None):
         global sheet
-        data = []
-        for i in range(skiprow, skiprow + nrows):
-            row = [(sheet.Cells(i+2, col+1)).Value for col in usecols]  
-            data.append(row)
+        # One COM call for the block of rows and columns instead of one call per cell
+        first_col, last_col = min(usecols), max(usecols)
+        block = sheet.Range(sheet.Cells(skiprow+2, first_col+1), sheet.Cells(skiprow+nrows+1, last_col+1)).Value
+        if nrows == 1 and first_col == last_col:
+            block = ((block,),)
+        data = [[row[col - first_col] for col in usecols] for row in block]
         df = pd.DataFrame(data, columns=names)
         return df
 
+def read_excel_rows(skiprow, usecols, nrows=1, names=None, filepath = r"C:\Users\apuscas\Python\Environment\GitHubRep\Coding_AspenPlus-Brightway-LCA-Platform\E2DT2025\Framework_final\Inventory_Scenario_2_raw_file.xlsx", sheet_name="Scenario_1_base case"):
+    """
+    Read rows of the inventory sheet without Excel (same rows and columns as read_excel_row). The workbook is streamed
+    in read-only mode, thus the rows of many scenarios are read in one pass.
+    :param skiprow: first row, read from Excel row skiprow+2
+    :param usecols: columns (0-based)
+    :param nrows: number of rows, e.g. one per scenario
+    :param names: column names of the dataframe
+    :param filepath: inventory workbook
+    :param sheet_name: sheet of the inventory
+    :return: dataframe (nrows x usecols), numeric columns as float
+    """
+    wb = load_workbook(filepath, read_only=True, data_only=True)
+    ws = wb[sheet_name]
+    first_col, last_col = min(usecols), max(usecols)
+    data = [[row[col - first_col] for col in usecols]
+            for row in ws.iter_rows(min_row=skiprow+2, max_row=skiprow+nrows+1, min_col=first_col+1,
+                                    max_col=last_col+1, values_only=True)]
+    wb.close()
+
+    df = pd.DataFrame(data, columns=names)
+    for column in df.columns:
+        numeric = pd.to_numeric(df[column], errors="coerce")
+        if numeric.notna().sum() == df[column].notna().sum():
+            df[column] = numeric.astype(float)
+    return df
+
 def close_excel():
     global excel, wb
     wb.Close(SaveChanges=False)
     excel.Quit()
 
+class Method_Resolver:
+    """
+    Resolves LCIA method names to the methods of the current project by fuzzy matching. The formatted method names are
+    indexed once per project and resolved names are memoized in a cache file in the project directory. The index and
+    the cache are rebuilt when the methods of the project change.
+    """
+
+    cache_filename = "method_resolver_cache.json"
+
+    def __init__(self):
+        self._projects = {}
+
+    def _signature(self):
+        # Changes whenever methods are registered or deleted
+        names = hashlib.sha256(json.dumps(sorted(bd.methods)).encode()).hexdigest()
+        return [len(bd.methods), names]
+
+    def _index(self):
+        project = bd.projects.current
+        signature = self._signature()
+        index = self._projects.get(project)
+        if index is None or index["signature"] != signature:
+            methods = list(bd.methods)
+            index = {
+                "signature": signature,
+                "methods": methods,
+                "names": [" | ".join(m).lower() for m in methods],
+                "queries": {},
+            }
+            cache_file = bd.projects.dir / self.cache_filename
+            if cache_file.exists():
+                with open(cache_file, "r") as f:
+                    cached = json.load(f)
+                if cached["signature"] == signature:
+                    index["queries"] = {query: tuple(method) if method else None
+                                        for query, method in cached["queries"].items()}
+            self._projects[project] = index
+        return index
+
+    def _save(self, index):
+        with open(bd.projects.dir / self.cache_filename, "w") as f:
+            json.dump({"signature": index["signature"], "queries": index["queries"]}, f)
+
+    def resolve_many(self, method_inputs):
+        """
+        Resolve several method names in one call
+        :param method_inputs: list of method names
+        :return: list of methods (tuples), None for names without match
+        """
+        index = self._index()
+        queries = [method_input.strip().lower() for method_input in method_inputs]
+        new_queries = list(dict.fromkeys(query for query in queries if query not in index["queries"]))
+
+        if new_queries and index["names"]:
+            # Scores below the cutoff are zero, thus a zero maximum means no match
+            scores = process.cdist(new_queries, index["names"], scorer=fuzz.ratio, score_cutoff=60)
+            for query, query_scores in zip(new_queries, scores):
+                best = int(np.argmax(query_scores))
+                index["queries"][query] = index["methods"][best] if query_scores[best] else None
+            self._save(index)
+
+        return [index["queries"].get(query) for query in queries]
+
+    def resolve(self, method_input):
+        return self.resolve_many([method_input])[0]
+
+
+method_resolver = Method_Resolver()
+
 def find_method(method_input):
-    formatted_methods = [" | ".join(m) for m in bd.methods]
-    match = process.extractOne(
-        method_input.strip().lower(),
-        [m.lower() for m in formatted_methods],
-        scorer=fuzz.ratio,
-        score_cutoff=60
-    )
-    if match:
-        # Find the original tuple
-        index = [m.lower() for m in formatted_methods].index(match[0])
-        print(f"Loaded method: {list(bd.methods)[index]}")
-        return (list(bd.methods)[index])
-    else: 
-        return print("Couldn't find method")
+    method = method_resolver.resolve(method_input)
+    if not method:
+        raise KeyError(f"LCIA method not found: {method_input}")
+    print(f"Loaded method: {method}")
+    return method
+
+def find_methods(method_inputs):
+    """
+    Resolve several LCIA methods
+    :param method_inputs: method (tuple), method name (see find_method), list of both or a pattern with wildcards
+                          matching the formatted method names, e.g. "ReCiPe 2016 v1.03 | midpoint (E) | *"
+    :return: list of methods (tuples). Raises KeyError if a pattern matches no method or if names are not found.
+    """
+    if isinstance(method_inputs, tuple) and method_inputs in bd.methods:
+        return [method_inputs]
+    if isinstance(method_inputs, str):
+        if "*" not in method_inputs:
+            return [find_method(method_inputs)]
+        pattern = method_inputs.strip().lower()
+        methods = [m for m in bd.methods if fnmatch(" | ".join(m).lower(), pattern)]
+        if not methods:
+            raise KeyError(f"No LCIA method matches: {method_inputs}")
+        print(f"Loaded {len(methods)} methods matching: {method_inputs}")
+        return methods
+    methods = [m if m in bd.methods else None for m in method_inputs]
+    names = [m for m, method in zip(method_inputs, methods) if method is None]
+    resolved = iter(method_resolver.resolve_many(names))
+    methods = [method if method else next(resolved) for method in methods]
+    missing = [str(method_input) for method_input, method in zip(method_inputs, methods) if method is None]
+    if missing:
+        raise KeyError("LCIA methods not found: " + ", ".join(missing))
+    if not methods:
+        raise KeyError("No LCIA method given")
+    return methods
 
 def clear_LCA_excel_output(name=str):
     print("Clearing " + name + ".xlsx")
@@ -69,10 +196,222 @@ def calculate_LCA(functional_unit_activity_1, method_input):
     my_lca.lcia()
     return my_lca.score
 
-def extract_res(result,i):
+class Background_Registry:
+    """
+    Activities of the background databases (ecoinvent, biosphere3) referenced by the foreground system. They are
+    resolved with one query per database, validated once per project and afterwards served from memory.
+    """
+
+    def __init__(self, activities):
+        """
+        :param activities: dict of name and (database, code) of the referenced activities
+        """
+        self.activities = activities
+        self._projects = {}
+
+    def load(self):
+        """
+        Resolve all activities of the registry in the current project. Raises a KeyError naming all activities which
+        are missing, e.g. because the codes do not exist in the installed ecoinvent version.
+        :return: dict of name and record with database, code, id and name of the activity
+        """
+        project = bd.projects.current
+        if project not in self._projects:
+            found = {}
+            for database in dict.fromkeys(database for database, _ in self.activities.values()):
+                codes = [code for db, code in self.activities.values() if db == database]
+                query = (ActivityDataset
+                         .select(ActivityDataset.code, ActivityDataset.id, ActivityDataset.name)
+                         .where((ActivityDataset.database == database) & (ActivityDataset.code << codes)))
+                for code, activity_id, activity_name in query.tuples():
+                    found[(database, code)] = {"database": database, "code": code, "id": activity_id,
+                                               "name": activity_name}
+
+            missing = [f"{name} {key}" for name, key in self.activities.items() if key not in found]
+            if missing:
+                raise KeyError(f"Background activities not found in project {project}: " + ", ".join(missing))
+
+            self._projects[project] = {name: found[key] for name, key in self.activities.items()}
+            print(f"  Background registry: {len(found)} activities resolved in project {project}.")
+        return self._projects[project]
+
+    def ids(self):
+        # dict of name and id of the activities
+        return {name: record["id"] for name, record in self.load().items()}
+
+    def matrix_indices(self, lca):
+        """
+        Rows of the activities in the matrices of an LCA: products in the technosphere matrix and elementary flows in
+        the biosphere matrix
+        :param lca: bc.LCA after loading the inventory data
+        :return: dict of name and matrix index (None if the activity is not part of the matrices)
+        """
+        indices = {}
+        for name, record in self.load().items():
+            if record["id"] in lca.dicts.product:
+                indices[name] = lca.dicts.product[record["id"]]
+            else:
+                indices[name] = lca.dicts.biosphere.get(record["id"])
+        return indices
+
+def characterization_factors(method, cache=True):
+    """
+    Characterization factors of a method (duplicates are summed as in the characterization matrix). The factors are
+    cached on disk in the project directory and reloaded as long as the processed method is unchanged.
+    :param method: LCIA method (tuple)
+    :param cache: use the cache in the project directory
+    :return: dict of biosphere flow id and characterization factor
+    """
+    method_obj = bd.Method(method)
+    modified = method_obj.filepath_processed().stat().st_mtime
+    cache_file = bd.projects.dir / "characterization_cache" / f"{method_obj.filename}.npz"
+
+    if cache and cache_file.exists():
+        cached = np.load(cache_file)
+        if cached["modified"] == modified:
+            return dict(zip(cached["flows"].tolist(), cached["cfs"].tolist()))
+
+    cfs = {}
+    dp = method_obj.datapackage()
+    for name, group in dp.groups.items():
+        if group.resources[0]["matrix"] != "characterization_matrix":
+            continue
+        indices, _ = group.get_resource(f"{name}.indices")
+        data, _ = group.get_resource(f"{name}.data")
+        for flow, cf in zip(indices["row"].tolist(), data.tolist()):
+            cfs[flow] = cfs.get(flow, 0) + cf
+
+    if cache:
+        cache_file.parent.mkdir(exist_ok=True)
+        np.savez(cache_file, flows=np.array(list(cfs), dtype=np.int64), cfs=np.array(list(cfs.values())),
+                 modified=modified)
+    return cfs
+
+def extract_res(result,i, store=None):
+    # With a Result_Store, the results are buffered in the store instead of being written to the Excel file
+    if store is not None:
+        store.append(result)
+        return
     with pd.ExcelWriter(r"LCA_results_rawfile.xlsx", mode="a" , engine="openpyxl", if_sheet_exists="overlay") as writer:
          result.to_excel(writer, header=False, sheet_name="LCA_results",index=False, startrow=i+1, startcol=1)
 
+class Result_Store:
+    """
+    Results of a campaign in a SQLite table with one row per scenario: scenario id, inputs, Aspen Plus results and LCA
+    scores. Rows are buffered and written in batches, columns are added when new results appear. Runs finishing at the
+    same time wait for the database lock instead of corrupting the file. The Excel report is written once at the end of
+    the campaign (see export_excel).
+    """
+
+    def __init__(self, filepath="LCA_results.sqlite", table="results", flush_every=50):
+        """
+        :param filepath: location of the SQLite database, created if it does not exist
+        :param table: name of the table of the campaign
+        :param flush_every: number of buffered scenarios which are written at once
+        """
+        self.filepath = filepath
+        self.table = table
+        self.flush_every = flush_every
+        self._buffer = []
+        self._connection = sqlite3.connect(filepath, timeout=60)
+        self._connection.execute(f"CREATE TABLE IF NOT EXISTS {_quote(table)} (scenario INTEGER PRIMARY KEY)")
+        self._columns = [row[1] for row in self._connection.execute(f"PRAGMA table_info({_quote(table)})")]
+
+    def append(self, results):
+        """
+        :param results: dataframe with one row per scenario (index: scenario id) and one column per input, result or
+                        score. Results of a scenario which is already stored are overwritten, the others are kept.
+        """
+        self._buffer.append(results)
+        if sum(len(df) for df in self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        # Write the buffered scenarios in one transaction
+        if not self._buffer:
+            return
+        results = pd.concat(self._buffer)
+        results = results.groupby(level=0).last()
+        self._buffer = []
+
+        columns = [str(column) for column in results.columns]
+        names = ", ".join(_quote(column) for column in ["scenario"] + columns)
+        placeholders = ", ".join("?" * (len(columns) + 1))
+        # Missing values (NULL) do not overwrite stored results of the scenario
+        updates = ", ".join(f"{_quote(column)} = COALESCE(excluded.{_quote(column)}, {_quote(column)})"
+                            for column in columns)
+        rows = [[int(scenario)] + [_sql_value(value) for value in values]
+                for scenario, values in zip(results.index, results.itertuples(index=False))]
+
+        with self._connection:
+            for column in columns:
+                if column not in self._columns:
+                    self._connection.execute(f"ALTER TABLE {_quote(self.table)} ADD COLUMN {_quote(column)}")
+                    self._columns.append(column)
+            self._connection.executemany(
+                f"INSERT INTO {_quote(self.table)} ({names}) VALUES ({placeholders}) "
+                f"ON CONFLICT(scenario) DO UPDATE SET {updates}", rows
+            )
+
+    def read(self):
+        """
+        :return: dataframe of all stored scenarios (index: scenario id)
+        """
+        self.flush()
+        return pd.read_sql_query(f"SELECT * FROM {_quote(self.table)} ORDER BY scenario", self._connection,
+                                 index_col="scenario")
+
+    def export_excel(self, filepath="LCA_results_rawfile.xlsx", columns=None, sheet_name="LCA_results",
+                     table_sheet_name="Result_store"):
+        """
+        Write the Excel report of the campaign in one workbook session
+        :param filepath: Excel file, created if it does not exist
+        :param columns: columns written to sheet_name in the layout of extract_res (row of scenario i: i+2, from column
+                        B, without header), e.g. the LCA scores. None writes no columns to sheet_name.
+        :param sheet_name: sheet with the layout of extract_res
+        :param table_sheet_name: sheet which is replaced by the complete table with header
+        """
+        results = self.read()
+        wb = load_workbook(filepath) if os.path.exists(filepath) else Workbook()
+
+        if columns:
+            ws = wb[sheet_name] if sheet_name in wb.sheetnames else wb.create_sheet(sheet_name)
+            for scenario, values in zip(results.index, results[columns].itertuples(index=False)):
+                for col, value in enumerate(values):
+                    ws.cell(row=scenario + 2, column=col + 2).value = _excel_value(value)
+
+        if table_sheet_name in wb.sheetnames:
+            del wb[table_sheet_name]
+        ws = wb.create_sheet(table_sheet_name)
+        ws.append(["scenario"] + list(results.columns))
+        for scenario, values in zip(results.index, results.itertuples(index=False)):
+            ws.append([scenario] + [_excel_value(value) for value in values])
+
+        wb.save(filepath)
+        print(f"Exported {len(results)} scenarios to {filepath}")
+
+    def close(self):
+        self.flush()
+        self._connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+def _quote(name):
+    # SQLite identifier, e.g. column names with spaces or brackets
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _sql_value(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    return None if isinstance(value, float) and np.isnan(value) else value
+
+def _excel_value(value):
+    return None if value is None or (isinstance(value, float) and np.isnan(value)) else value
+
 def search_row(search_value,filepath = r"C:\Users\apuscas\Python\Environment\GitHubRep\Coding_AspenPlus-Brightway-LCA-Platform\E2DT2025\Framework_final\Inventory_Scenario_2_raw_file.xlsx", column="B", sheet_name="Scenario_1_base case"):
     # Load the workbook in read-only mode
     wb = load_workbook(filepath, data_only=True)
@@ -85,6 +424,96 @@ def search_row(search_value,filepath = r"C:\Users\apuscas\Python\Environment\Git
 
     return None  # If not found
 
+def search_rows(search_values, filepath = r"C:\Users\apuscas\Python\Environment\GitHubRep\Coding_AspenPlus-Brightway-LCA-Platform\E2DT2025\Framework_final\Inventory_Scenario_2_raw_file.xlsx", column="B", sheet_name="Scenario_1_base case"):
+    # Rows of several values found in one pass over the column (see search_row), None for values not found
+    wb = load_workbook(filepath, read_only=True, data_only=True)
+    ws = wb[sheet_name]
+    column_index = column_index_from_string(column)
+    rows = dict.fromkeys(search_values)
+    for row_number, (value,) in enumerate(ws.iter_rows(min_col=column_index, max_col=column_index, values_only=True),
+                                          start=1):
+        if value in rows and rows[value] is None:
+            rows[value] = row_number
+    wb.close()
+    return rows
+
+class LCI_Exporter:
+    """
+    Export of the inventories of many runs to LCI_raw.xlsx. The rows of the sections ("Process Parameters", ...) are
+    searched once and cached, the rows of the runs are buffered and written in one workbook session per flush.
+    """
+
+    # Section title, offset of the first run from the title row and first column (0-based) of each inventory dataframe
+    # (see get_inventory)
+    sections = [
+        ("Process Parameters", 5, 2),
+        ("Material Flow (Foreground System)", 7, 2),
+        ("Natural Resources (Background System)", 6, 2),
+        ("Energy Flow (Background)", 6, 2),
+        ("Infrastructure", 19, 3),
+    ]
+
+    def __init__(self, filepath="LCI_raw.xlsx", anchor_filepath=None, sheet_name="Scenario_1_base case",
+                 flush_every=50):
+        """
+        :param filepath: Excel file the inventories are written to
+        :param anchor_filepath: Excel file in which the section titles are searched (default of search_row if None)
+        :param sheet_name: sheet of the inventory
+        :param flush_every: number of buffered runs which are written at once
+        """
+        self.filepath = filepath
+        self.anchor_filepath = anchor_filepath
+        self.sheet_name = sheet_name
+        self.flush_every = flush_every
+        self._start_rows = None
+        self._buffer = {}
+
+    def start_rows(self):
+        # Row (0-based, as startrow of DataFrame.to_excel) of run 0 in each section
+        if self._start_rows is None:
+            kwargs = {"sheet_name": self.sheet_name}
+            if self.anchor_filepath is not None:
+                kwargs["filepath"] = self.anchor_filepath
+            rows = search_rows([title for title, _, _ in self.sections], column="B", **kwargs)
+            missing = [title for title, row in rows.items() if row is None]
+            if missing:
+                raise KeyError("Sections not found in inventory sheet: " + ", ".join(missing))
+            self._start_rows = [rows[title] + offset for title, offset, _ in self.sections]
+        return self._start_rows
+
+    def add(self, i, inventory):
+        """
+        :param i: index of the (first) run
+        :param inventory: list of dataframes (see get_inventory), row k is written as run i+k
+        """
+        for k in range(len(inventory[0])):
+            self._buffer[i + k] = [df.iloc[k].tolist() for df in inventory]
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        # Write the buffered runs in one workbook session
+        if not self._buffer:
+            return
+        start_rows = self.start_rows()
+        wb = load_workbook(self.filepath)
+        ws = wb[self.sheet_name]
+        for i, rows in self._buffer.items():
+            for start_row, (_, _, start_col), values in zip(start_rows, self.sections, rows):
+                for col, value in enumerate(values):
+                    ws.cell(row=start_row + i + 1, column=start_col + col + 1).value = _excel_value(value)
+        wb.save(self.filepath)
+        self._buffer = {}
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
 
 if __name__=="__main__":
     row_number = search_row(column="B", search_value="Process Parameters")
@@ -2,6 +2,11 @@ from aspen_utils import *
 import pandas as pd
 from aspen_processtools import *
 from brightway_LCA import run_LCA
+from brightway_engine import LCA_Engine
+from brightway_utilis import Result_Store
+from aspen_pool import Aspen_Pool
+from aspen_warmstart import Warm_Start_Store
+from aspen_campaign import continuation_order, Continuation
 
 def main():
 
@@ -9,51 +14,101 @@ def main():
     SimRunIndex = 1  # Start index of run
     SimRunNumber = 1  # Number of runs to perform
 
-    # Open Aspen Plus file
-    Aspen_Instance = Aspen_Plus_Interface()
-    Aspen_Sim = Aspen_Plus_ProcessTools()
-    Aspen_Instance.load_bkp(rf"Aspen_Plus_File/Post_combustion_solvent_based_MEA.bkp", 0, 1)
-    time.sleep(2)
+    # Scenario table: parsed and checked for feasibility once, before any simulation is started
+    process_parameter_list = ["Runs", "FLUEGAS CO2 conc"]
+    scenarios = Scenario_Source("Sensitivity_GWP_Fluegas_CO2.xlsx", process_parameter_list)
+
+    # Aspen Plus file and number of Aspen Plus instances simulating the runs in parallel (see aspen_pool.py)
+    bkp_file = rf"Aspen_Plus_File/Post_combustion_solvent_based_MEA.bkp"
+    workers = 1
+
+    # Supervision of the Aspen Plus instances: each instance runs in a child process which is killed and restarted with
+    # the bkp file if it crashes, stops responding for heartbeat_timeout s or exceeds scenario_timeout s for a run. The
+    # run is retried up to retries times before it is marked as failed. Off by default, set supervised = True to turn it
+    # on (workers > 1 always runs supervised).
+    supervised = False
+    scenario_timeout = 3600
+    heartbeat_timeout = 300
+    retries = 2
+
+    # Closure of the MEA and water balance of the tear streams:
+    # "sequential" closes the MEA balance first and the water balance second, "coupled" closes both in one iteration,
+    # "speculative" closes them one after another with candidates evaluated on several Aspen Plus instances at once: one
+    # candidate per helper, the instance holding the best state is kept
+    closure = "sequential"
+    helpers = 3 if closure == "speculative" else 0
+
+    # Warm starts: converged states are saved by their flue gas CO2 conc. and the nearest state is restored before a run
+    # (see aspen_warmstart.py), states of another bkp file are not restored. Off by default, to turn them on:
+    # warm_start = {"filepath": os.path.abspath("Warm_starts.sqlite")}
+    warm_start = None
+
+    # Continuation: the runs are simulated along a short path through the scenario table and runs farther than max_step
+    # from the last converged run are approached by intermediate steps (see aspen_campaign.py). The results keep the
+    # run numbers of the scenario table. Off by default, to turn it on: continuation = {"max_step": 0.02}
+    continuation = None
+
+    # LCA engine: the ecoinvent background is loaded and factorized once and reused for all runs
+    # A list or pattern of methods (e.g. "ReCiPe 2016 v1.03 | midpoint (E) | *") assesses each run with all methods
+    LCA_engine = LCA_Engine("ReCiPe 2016 v1.03 midpoint (E) global warming potential")
+
+    # Results of all runs are collected in a SQLite file, the Excel report is written once at the end
+    LCA_results = Result_Store("LCA_results.sqlite")
 
     ####################################################################################################################
     # SIMULATION START AND LOOPING
     ####################################################################################################################
 
-    for run in range(SimRunIndex, SimRunNumber+1):
-
-        print(f"------------------------------------- Run {SimRunNumber}--------------------------------------------\n")
+    runs = list(range(SimRunIndex, SimRunNumber+1))
+    if continuation:
+        runs = [runs[i] for i in continuation_order([scenarios[run-1] for run in runs])]
+
+    pooled = workers > 1 or supervised
+    if pooled:
+        # Each worker simulates with its own Aspen Plus instance, the results arrive in the order of the runs
+        Aspen_Instance = None
+        backend_options = {"bkp_file": bkp_file, "closure": closure, "warm_start": warm_start,
+                           "continuation": continuation, "helpers": helpers}
+        pool = Aspen_Pool(workers, backend_options=backend_options,
+                          scenario_timeout=scenario_timeout, heartbeat_timeout=heartbeat_timeout, retries=retries)
+        simulations = pool.imap([scenarios[run-1] for run in runs])
+    else:
+        # Open Aspen Plus file
+        Aspen_Instance = Aspen_Plus_Interface()
+        Aspen_Sim = Aspen_Plus_ProcessTools()
+        Aspen_Instance.load_bkp(bkp_file, 0, 1)
+        Aspen_Helpers = [Aspen_Plus_Interface() for _ in range(helpers)]
+        for Aspen_Helper in Aspen_Helpers:
+            Aspen_Helper.load_bkp(bkp_file, 0, 1)
+        time.sleep(2)
+
+        # Closure solvers for the MEA and water balance, their slope estimates are reused for all runs
+        solvers = closure_solvers()
+        Warm_Starts = Warm_Start_Store(bkp_file=bkp_file, **warm_start) if warm_start else None
+        Simulator = Continuation(Aspen_Sim, **continuation) if continuation else Aspen_Sim
+
+    for run in runs:
+
+        print(f"------------------------------------- Run {run}--------------------------------------------\n")
 
         print("PROCESS SIMULATION IN ASPEN PLUS:")
 
         # Specify process parameter for variation
         print("1. Specify process parameter for variation")
-        process_parameter_list = ["Runs", "FLUEGAS CO2 conc"]
-        FluegasCO2conc = Aspen_Sim.get_fluegasCO2(SimRunIndex-1, process_parameter_list, "Sensitivity_GWP_Fluegas_CO2")
-
-        # Adjust design specification for new value of process parameter
-        print("2. Adjust design specification for simulation and start initial run with new values. Simulation running...")
-        Aspen_Sim.design_spec(Aspen_Instance, FluegasCO2conc)
-
-        print("3. Close MEA mass balance (by decreasing difference in mass flows in tear stroms below tolerance. Simulation running...")
-        Aspen_Sim.check_MEAbalance_tearstreams(Aspen_Instance, MEA_tol=6)
-
-        print("4. Close water mass balance (by decreasing difference in mass flows in tear stroms below tolerance. Simulation running...")
-        Aspen_Sim.check_waterbalance_tearstreams(Aspen_Instance, H2O_tol=6)
-
-        print("5. Check simulation status of final results")
-        # Through adjusting the design specification and checking the component mass balance of MEA and H2O of tear streams
-        # LEANMEA and LEANMEAC the simulation has to be run several times. Thus, at the end, it is checked whether the simulation
-        # was successful or if there occurred a warning/ error.
-        Aspen_Sim.check_simulation_status(Aspen_Instance, "Final simulation")
-
-        print("6. Collect and export results to an Excel file for inspection (optional)")
-        data = [
-            Aspen_Sim.retrieve_ProcessParam(Aspen_Instance),
-            Aspen_Sim.retrieve_Foreground(Aspen_Instance),
-            Aspen_Sim.retrieve_NaturalRes(Aspen_Instance, 4.2, 5),
-            Aspen_Sim.retrieve_EnergyFlow(Aspen_Instance),
-            Aspen_Sim.retrieve_Infrastruct(Aspen_Instance, k=2000, d=2000, diameter=1)
-        ]
+        FluegasCO2conc = scenarios[run-1]["FLUEGAS CO2 conc"]
+
+        # Steps 2 to 6 (design specification, closure of the balances, status and results) see
+        # Aspen_Plus_ProcessTools.simulate
+        if pooled:
+            simulation = next(simulations)
+        else:
+            simulation = Simulator.simulate(Aspen_Instance, scenarios[run-1], closure, solvers, warm_start=Warm_Starts,
+                                            helpers=Aspen_Helpers)
+        if "error" in simulation:
+            print(f"  Simulation of run {run} failed after {simulation['attempts']} attempts: {simulation['error']}")
+            continue
+        data = simulation["data"]
+        closure_runs = simulation["closure_runs"]
 
         print("LCA CALCULATION IN BRIGHTWAY")
 
@@ -67,11 +122,27 @@ def main():
         # 5. Defining activities and exchanges
         # 6. LCA calculation and post-processing (e.g. extracting LCA results to an Excel file)
 
-        run_LCA(data, run-1)
+        # The foreground of each run is solved by the LCA engine against the factorized background. Alternatively,
+        # foreground="persistent" creates the MEA_carbon_capture database once and only updates its changing exchanges.
+        # data holds the results of this run only (column 0), the results are stored under the run number
+        run_LCA(data, 0, engine=LCA_engine, store=LCA_results, run_id=run-1,
+                inputs={"FLUEGAS CO2 conc": FluegasCO2conc, "Closure runs": closure_runs})
 
         print("Calculations finished.")
 
-    Aspen_Instance.close_bkp()
+    LCA_engine.report_timing()
+    if Aspen_Instance is not None:
+        Aspen_Instance.report_access()
+
+    LCA_results.export_excel("LCA_results_rawfile.xlsx", columns=[" | ".join(m) for m in LCA_engine.methods])
+    LCA_results.close()
+
+    if Aspen_Instance is not None:
+        if Warm_Starts is not None:
+            Warm_Starts.close()
+        for Aspen_Helper in Aspen_Helpers:
+            Aspen_Helper.close_bkp()
+        Aspen_Instance.close_bkp()
 
     # KillAspen()
 
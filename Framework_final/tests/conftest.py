@@ -0,0 +1,142 @@
+import functools
+import os
+import sys
+import time
+import types
+
+import pytest
+
+# The modules of Framework_final are imported by name, as in main.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Node:
+    def __init__(self, value=None, unit=""):
+        self.Value = value
+        self.UnitString = unit
+
+    def AttributeValue(self, index):
+        # The run status (attribute 12) of the tree and of its blocks is kept as value of their nodes
+        return self.Value
+
+
+class Tree:
+    # Nodes by path (value or tuple of value and unit), missing nodes are None as in Aspen Plus
+    def __init__(self, nodes):
+        self.nodes = {path: Node(*value) if isinstance(value, tuple) else Node(value) for path, value in nodes.items()}
+
+    def FindNode(self, path):
+        return self.nodes.get(path)
+
+
+class Engine:
+    """
+    Engine of the stand-in application: a run calls simulate with the dict of node values and writes the returned
+    values to the tree. The run is reported as running for duration s, the runs in hang (1-based) do not finish.
+    """
+
+    def __init__(self, tree, simulate=None, duration=0.0, hang=()):
+        self.tree = tree
+        self.simulate = simulate
+        self.duration = duration
+        self.hang = set(hang)
+        self.runs = []
+        self._end = 0.0
+        self.stopped = 0
+
+    def Run2(self, *args):
+        self.runs.append(args)
+        if self.simulate is not None:
+            values = {path: node.Value for path, node in self.tree.nodes.items()}
+            for path, value in self.simulate(values).items():
+                self.tree.nodes.setdefault(path, Node()).Value = value
+        self._end = float("inf") if len(self.runs) in self.hang else time.perf_counter() + self.duration
+
+    @property
+    def IsRunning(self):
+        return int(time.perf_counter() < self._end)
+
+    def Stop(self):
+        self.stopped += 1
+        self._end = 0.0
+
+
+class Application:
+    def __init__(self, nodes, simulate=None, duration=0.0, hang=()):
+        self.Tree = Tree(nodes)
+        self.Engine = Engine(self.Tree, simulate, duration, hang)
+        self.Visible = 0
+        self.SuppressDialogs = 1
+        self.saved = []
+
+    def InitFromArchive2(self, path):
+        pass
+
+    def SaveAs(self, path, overwrite=True):
+        self.saved.append(path)
+
+    def Quit(self):
+        pass
+
+
+@pytest.fixture
+def aspen(monkeypatch):
+    """
+    Factory of Aspen_Plus_Interface on a stand-in COM application (see Application), as Aspen Plus is not available in
+    the tests: aspen(nodes, simulate=None, duration=0.0, hang=(), time_limit=60)
+    """
+    client = types.ModuleType("win32com.client")
+    package = types.ModuleType("win32com")
+    package.client = client
+    monkeypatch.setitem(sys.modules, "win32com", package)
+    monkeypatch.setitem(sys.modules, "win32com.client", client)
+
+    def create(nodes, simulate=None, duration=0.0, hang=(), time_limit=60):
+        from aspen_utils import Aspen_Plus_Interface
+        client.Dispatch = lambda name: Application(nodes, simulate, duration, hang)
+        Aspen_Plus = Aspen_Plus_Interface()
+        Aspen_Plus.check_run_completion = functools.partial(Aspen_Plus.check_run_completion, time_limit=time_limit)
+        return Aspen_Plus
+
+    return create
+
+
+def mea_process(values):
+    """
+    Stand-in of the MEA process of the bkp file: delta MEA of the tear streams falls with the CO2 loading of LEANMEA
+    (closed at a loading of about 0.1742), delta water with the net water make-up and with delta MEA
+    """
+    from aspen_processtools import LEANMEA_Loadings, MAKEUP_H2OFlow, TearStreams_H2O, TearStreams_MEA, WATOUT_Flow
+    loading = values[LEANMEA_Loadings[0]]
+    delta_MEA = 2000 - 8000 * loading - 20000 * loading ** 2
+    delta_H2O = 300 - (values[MAKEUP_H2OFlow] - values[WATOUT_Flow]) - 0.1 * delta_MEA
+    return {
+        TearStreams_MEA[0]: 5.0, TearStreams_MEA[1]: 5.0 - delta_MEA / 3600,
+        TearStreams_H2O[0]: 50.0, TearStreams_H2O[1]: 50.0 - delta_H2O / 3600,
+        r"\Data\Streams\FLUEGAS\Output\MASSFLOW\MIXED\CO2": 0.2,
+    }
+
+
+def mea_nodes():
+    # Inputs of the MEA process with the flue gas given as mole flow
+    from aspen_processtools import (DS1_Target, LEANMEA_Loadings, MAKEUP_H2OFlow, TearMethod, WATOUT_Flow, sim_success,
+                                    fluegas_N2conc, FluegasH2Oconc, FluegasO2conc)
+    nodes = mea_process({LEANMEA_Loadings[0]: 0.1, MAKEUP_H2OFlow: 0, WATOUT_Flow: 0})
+    nodes.update({
+        r"\Data": sim_success,
+        r"\Data\Streams\FLUEGAS\Input\FLOWBASE\MIXED": "MOLE",
+        r"\Data\Streams\FLUEGAS\Input\TOTFLOW\MIXED": (200, "kmol/hr"),
+        r"\Data\Streams\FLUEGAS\Input\FLOW\MIXED\CO2": 0.1,
+        r"\Data\Streams\FLUEGAS\Input\FLOW\MIXED\N2": fluegas_N2conc(0.1),
+        r"\Data\Streams\FLUEGAS\Input\FLOW\MIXED\O2": FluegasO2conc,
+        r"\Data\Streams\FLUEGAS\Input\FLOW\MIXED\H2O": FluegasH2Oconc,
+        LEANMEA_Loadings[0]: 0.1, LEANMEA_Loadings[1]: 1.0,
+        WATOUT_Flow: 0.0, MAKEUP_H2OFlow: 0.0, DS1_Target: 0.0, TearMethod: "WEGSTEIN",
+    })
+    return nodes
+
+
+@pytest.fixture
+def process(aspen):
+    # Factory of Aspen_Plus_Interface on the stand-in MEA process: process(**options of aspen)
+    return lambda **options: aspen(mea_nodes(), mea_process, **options)
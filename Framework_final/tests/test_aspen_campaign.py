@@ -0,0 +1,136 @@
+import itertools
+
+import numpy as np
+
+from aspen_campaign import input_vectors, path_length, continuation_order, Continuation
+from aspen_processtools import LEANMEA_Loadings
+
+
+def scenarios(values):
+    return [{"FLUEGAS CO2 conc": value} for value in values]
+
+
+def test_order_is_permutation():
+    table = scenarios(np.random.default_rng(0).uniform(0.04, 0.16, 25))
+    order = continuation_order(table)
+    assert sorted(order) == list(range(len(table)))
+
+
+def test_order_of_one_input_is_sorted():
+    values = [0.10, 0.04, 0.16, 0.07, 0.13, 0.05, 0.15]
+    order = continuation_order(scenarios(values))
+    ordered = [values[i] for i in order]
+    assert ordered in (sorted(values), sorted(values, reverse=True))
+
+
+def test_order_starts_closest_to_start():
+    values = [0.10, 0.04, 0.16, 0.07, 0.13]
+    order = continuation_order(scenarios(values), start={"FLUEGAS CO2 conc": 0.15})
+    assert values[order[0]] == 0.16
+
+
+def test_order_shorter_than_table_order():
+    rng = np.random.default_rng(1)
+    table = [{"CO2": co2, "L/G": lg} for co2, lg in zip(rng.uniform(0.04, 0.16, 30), rng.uniform(2, 6, 30))]
+    inputs, scale = ("CO2", "L/G"), (0.01, 0.5)
+    vectors = input_vectors(table, inputs, scale)
+    order = continuation_order(table, inputs, scale)
+    assert path_length(vectors, order) < path_length(vectors, list(range(len(table))))
+
+
+def test_order_optimal_for_small_table():
+    rng = np.random.default_rng(2)
+    table = [{"x": x, "y": y} for x, y in rng.uniform(0, 1, (7, 2))]
+    vectors = input_vectors(table, ("x", "y"))
+    order = continuation_order(table, ("x", "y"), start=table[0])
+    best = min(path_length(vectors, [0] + list(rest)) for rest in itertools.permutations(range(1, 7)))
+    assert path_length(vectors, order) <= best * 1.05
+
+
+class Process_Tools:
+    """
+    Stand-in of Aspen_Plus_ProcessTools: the CO2 loading of LEANMEA of the flowsheet stands for the scenario it holds.
+    A step converges if it is at most diverge from the scenario the flowsheet starts from, otherwise the flowsheet is
+    left in a diverged state.
+    """
+
+    def __init__(self, diverge=0.03):
+        self.diverge = diverge
+        self.steps = []
+        self.results = 0
+
+    def step(self, Aspen_Plus, scenario, closure="sequential", solvers=None, **options):
+        value = scenario["FLUEGAS CO2 conc"]
+        self.steps.append(value)
+        state = Aspen_Plus.read_many(LEANMEA_Loadings[:1])[0]
+        converged = abs(value - state) <= self.diverge
+        Aspen_Plus.write_many({LEANMEA_Loadings[0]: value if converged else -1.0})
+        return Aspen_Plus, [converged, False, False, False, False], 2, converged
+
+    def retrieve_results(self, Aspen_Plus):
+        self.results += 1
+        return []
+
+
+class Warm_Starts:
+    # Stand-in of Warm_Start_Store without stored states
+    inputs = ["FLUEGAS CO2 conc"]
+
+    def __init__(self):
+        self.saved = []
+
+    def nearest(self, scenario):
+        return None
+
+    def save(self, Aspen_Plus, scenario, solvers=None):
+        self.saved.append(scenario["FLUEGAS CO2 conc"])
+
+
+def flowsheet(process, value):
+    # Stand-in flowsheet holding the converged state of a scenario
+    Aspen_Plus = process()
+    Aspen_Plus.write_many({LEANMEA_Loadings[0]: value})
+    return Aspen_Plus
+
+
+def test_continuation_steps_towards_far_scenario(process):
+    tools = Process_Tools()
+    continuation = Continuation(tools, max_step=0.02)
+    warm_starts = Warm_Starts()
+    Aspen_Plus = flowsheet(process, 0.04)
+    continuation.simulate(Aspen_Plus, {"FLUEGAS CO2 conc": 0.04}, solvers={}, warm_start=warm_starts)
+    result = continuation.simulate(Aspen_Plus, {"FLUEGAS CO2 conc": 0.12}, solvers={}, warm_start=warm_starts)
+
+    assert result["converged"]
+    assert result["homotopy_steps"] == 3
+    assert result["closure_runs"] == 2 * 4
+    assert np.allclose(tools.steps, [0.04, 0.06, 0.08, 0.10, 0.12])
+    # Results and warm-start states only for the scenarios, not for the homotopy steps
+    assert tools.results == 2
+    assert warm_starts.saved == [0.04, 0.12]
+
+
+def test_continuation_halves_diverging_step_from_converged_state(process):
+    tools = Process_Tools(diverge=0.012)
+    continuation = Continuation(tools, max_step=0.02, min_step=0.005)
+    Aspen_Plus = flowsheet(process, 0.04)
+    continuation.simulate(Aspen_Plus, {"FLUEGAS CO2 conc": 0.04}, solvers={})
+    result = continuation.simulate(Aspen_Plus, {"FLUEGAS CO2 conc": 0.07}, solvers={})
+
+    # The halved step starts from the converged state of 0.04, not from the diverged step to 0.06
+    assert result["converged"]
+    assert np.allclose(tools.steps[1:3], [0.06, 0.05])
+    assert np.isclose(continuation.point[0], 0.07)
+
+
+def test_continuation_returns_to_converged_state_after_failed_scenario(process):
+    tools = Process_Tools(diverge=0.012)
+    continuation = Continuation(tools, max_step=0.02, min_step=0.015)
+    Aspen_Plus = flowsheet(process, 0.04)
+    continuation.simulate(Aspen_Plus, {"FLUEGAS CO2 conc": 0.04}, solvers={})
+    result = continuation.simulate(Aspen_Plus, {"FLUEGAS CO2 conc": 0.07}, solvers={})
+
+    # No step converges above min_step, the flowsheet returns to the last converged scenario
+    assert not result["converged"]
+    assert np.isclose(continuation.point[0], 0.04)
+    assert Aspen_Plus.read_many(LEANMEA_Loadings[:1])[0] == 0.04
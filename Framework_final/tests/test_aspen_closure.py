@@ -0,0 +1,171 @@
+import numpy as np
+
+from aspen_closure import Secant_Solver, Broyden_Solver, close_balance, close_balance_speculative
+
+# The solvers are tested on analytic residuals in place of Aspen Plus runs
+
+
+class Flowsheet:
+    # Stand-in of Aspen_Plus_Interface: the residuals are a function of the variables written before the run. The runs
+    # from stop_at (1-based) are stopped at the time limit.
+    def __init__(self, residuals, x0, stop_at=None):
+        self.residuals = residuals
+        self.x = np.atleast_1d(np.asarray(x0, dtype=float))
+        self.runs = 0
+        self.stop_at = stop_at
+
+    def set_variables(self, x):
+        self.x = np.array(x, dtype=float)
+
+    def get_residuals(self):
+        return self.residuals(self.x)
+
+    def run_simulation(self, asynchronous=False):
+        self.runs += 1
+        self.asynchronous = asynchronous
+
+    def check_run_completion(self):
+        return self.stop_at is None or self.runs < self.stop_at
+
+
+def close(residuals, x0, solver, tol, max_runs=25, stop_at=None):
+    flowsheet = Flowsheet(residuals, x0, stop_at)
+    x, r, runs = close_balance(flowsheet, x0, flowsheet.set_variables, flowsheet.get_residuals, solver, tol, max_runs)
+    assert runs == flowsheet.runs
+    return x, r, runs
+
+
+def test_secant_closes_nonlinear_balance():
+    # Residual falls with the variable, as Delta MEA with the CO2 loading of LEANMEA
+    x, r, runs = close(lambda x: 2000 - 8000 * x - 20000 * x ** 2, [0.1], Secant_Solver(-5000), tol=1)
+    assert abs(r[0]) <= 1
+    assert runs <= 8
+
+
+def test_closure_stops_at_stopped_run():
+    x, r, runs = close(lambda x: 2000 - 8000 * x - 20000 * x ** 2, [0.1], Secant_Solver(-5000), tol=1, stop_at=2)
+    # The residuals of the stopped run are not read, the closure is not closed
+    assert runs == 2
+    assert np.all(np.isinf(r))
+
+
+def test_closure_not_closed_after_max_runs():
+    _, r, runs = close(lambda x: 2000 - 8000 * x - 20000 * x ** 2, [0.1], Secant_Solver(-5000, max_step=0.01), tol=1,
+                       max_runs=3)
+    assert runs == 3
+    assert abs(r[0]) > 1
+
+
+def test_secant_keeps_slope_for_next_closure():
+    solver = Secant_Solver(-1000)
+    close(lambda x: 3000 - 10000 * x, [0.1], solver, tol=0.1)
+    assert np.isclose(solver.get_estimate(), -10000)
+
+    # The second closure starts with the learned slope and needs a single step
+    _, r, runs = close(lambda x: 2500 - 10000 * x, [0.3], solver, tol=0.1)
+    assert runs == 1
+    assert abs(r[0]) <= 0.1
+
+
+def test_secant_rejects_slope_of_wrong_sign():
+    solver = Secant_Solver(-5000)
+    solver.step([0.1], [100])
+    solver.step([0.12], [150])
+    assert solver.get_estimate() == -5000
+
+
+def test_secant_step_limited_to_max_step_and_bounds():
+    solver = Secant_Solver(-10, max_step=0.01, lower=0, upper=0.5)
+    assert np.isclose(solver.step([0.2], [100])[0], 0.21)
+    solver.reset()
+    assert solver.step([0.495], [100])[0] == 0.5
+
+
+def test_secant_stays_inside_bracket():
+    solver = Secant_Solver(-1)
+    solver.step([0.0], [10])
+    # The slope estimate is far off, the step would leave the bracket [0, 1]: regula falsi instead
+    solver.slope = -0.1
+    x = solver.step([1.0], [-30])[0]
+    assert np.isclose(x, 0.25)
+
+
+def test_secant_candidates_divide_bracket():
+    candidates = Secant_Solver(-1).candidates([(0.0, 10.0), (1.0, -30.0)], count=3)
+    assert np.all((candidates > 0) & (candidates < 1))
+    assert np.isclose(candidates, 0.25).any()
+
+
+def test_secant_candidates_march_by_max_step():
+    candidates = Secant_Solver(-1, max_step=0.1).candidates([(0.0, 10.0)], count=3)
+    assert np.allclose(candidates, [0.1, 0.2, 0.3])
+
+
+def test_broyden_closes_coupled_balances():
+    def residuals(x):
+        return np.array([1000 - 5000 * x[0] + 0.02 * x[1], 300 - x[1] - 800 * x[0]])
+
+    solver = Broyden_Solver([[-5000, 0], [0, -1]], max_step=[0.05, 500])
+    x, r, runs = close(residuals, [0.1, 0.0], solver, tol=np.array([1, 1]))
+    assert np.all(np.abs(r) <= 1)
+    assert runs <= 10
+
+
+def test_broyden_step_scaled_to_max_step():
+    solver = Broyden_Solver([[-1, 0], [0, -1]], max_step=[0.01, 100])
+    x = solver.step([0.0, 0.0], [1.0, 50.0])
+    # The first variable limits the step, the direction of the Newton step is kept
+    assert np.allclose(x, [0.01, 0.5])
+
+
+def test_broyden_estimate_roundtrip():
+    solver = Broyden_Solver([[-5000, 0], [0, -1]])
+    other = Broyden_Solver([[-1, 0], [0, -1]])
+    other.set_estimate(solver.get_estimate())
+    assert np.array_equal(other.jacobian, solver.jacobian)
+
+
+def speculative(residual, x0, solver, tol, count=3, max_rounds=25, stop=()):
+    # Instances of the speculative closure, the instances in stop do not finish their runs
+    instances = [Flowsheet(lambda x: np.array([residual(x[0])]), [x0]) for _ in range(count)]
+    for i in stop:
+        instances[i].stop_at = 1
+    x, r, best, runs = close_balance_speculative(instances, x0, lambda Aspen_Plus, x: Aspen_Plus.set_variables([x]),
+                                                 lambda Aspen_Plus: Aspen_Plus.get_residuals(), solver, tol,
+                                                 max_rounds)
+    assert runs == sum(instance.runs for instance in instances)
+    return x, r, best, instances
+
+
+def test_speculative_brackets_root():
+    x, r, best, instances = speculative(lambda x: 2000 - 8000 * x - 20000 * x ** 2, 0.1, Secant_Solver(-5000), tol=1)
+    assert abs(r) <= 1
+    # The instance returned holds the results of the best value
+    assert best.x[0] == x
+    assert best.get_residuals()[0] == r
+    assert all(instance.asynchronous for instance in instances if instance.runs)
+
+
+def test_speculative_keeps_best_state():
+    # The slope has the wrong sign, all candidates are worse than the start: its instance is not overwritten
+    x, r, best, instances = speculative(lambda x: x - 0.5, 0.49, Secant_Solver(-1), tol=1e-4, max_rounds=1)
+    assert x == 0.49
+    assert best is instances[0]
+    assert best.runs == 0
+    assert best.get_residuals()[0] == r
+
+
+def test_speculative_single_instance_restores_best_state():
+    x, r, best, instances = speculative(lambda x: x - 0.5, 0.49, Secant_Solver(-1), tol=1e-4, count=1, max_rounds=2)
+    assert x == 0.49
+    assert np.isclose(r, -0.01)
+    # The last candidate was worse, the best value was simulated again
+    assert best.x[0] == 0.49
+    assert best.runs == 3
+
+
+def test_speculative_ignores_stopped_runs():
+    residual = lambda x: 2000 - 8000 * x - 20000 * x ** 2
+    x, r, best, instances = speculative(residual, 0.1, Secant_Solver(-5000), tol=1, stop=[1])
+    assert abs(r) <= 1
+    assert best is not instances[1]
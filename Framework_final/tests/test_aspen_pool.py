@@ -0,0 +1,142 @@
+import itertools
+import os
+import time
+
+import pytest
+
+from aspen_pool import Aspen_Pool, Local_Backend, echo_scenario
+
+# The pool is tested with stand-in backends, the functions and classes are imported by the spawned worker processes
+
+
+def sleep_and_echo(scenario):
+    time.sleep(scenario.get("sleep", 0))
+    return {"x": scenario["x"], "pid": os.getpid()}
+
+
+def fail_once(scenario):
+    # Fails (hang or exception) in the first attempt, the marker file is shared by the attempts
+    if scenario.get("marker") and not os.path.exists(scenario["marker"]):
+        open(scenario["marker"], "w").close()
+        if scenario.get("hang"):
+            time.sleep(60)
+        raise RuntimeError("first attempt")
+    return {"x": scenario["x"]}
+
+
+def always_fail(scenario):
+    raise RuntimeError("broken scenario")
+
+
+def hang(scenario):
+    time.sleep(60)
+
+
+backends = itertools.count()
+
+
+class Breaking_Backend(Local_Backend):
+    # Backend which stays broken after its first error, as a crashed Aspen Plus
+    def __init__(self, worker, run_dir, **options):
+        super().__init__(worker, run_dir, **options)
+        self.number = next(backends)
+        self.broken = False
+
+    def run(self, scenario):
+        if self.broken or scenario.get("break"):
+            self.broken = True
+            raise RuntimeError("backend broken")
+        return {"x": scenario["x"], "backend": self.number}
+
+
+class Failing_Close_Backend(Local_Backend):
+    def close(self):
+        raise RuntimeError("close failed")
+
+
+killed = []
+
+
+class Hanging_Start_Backend(Local_Backend):
+    # Backend which reports its processes and hangs while loading
+    def __init__(self, worker, run_dir, heartbeat=None, started=None, **options):
+        started([4711, 4712])
+        time.sleep(60)
+
+    @staticmethod
+    def kill(process_ids):
+        killed.extend(process_ids)
+
+
+def pool(workers=2, backend=Local_Backend, evaluate=echo_scenario, **options):
+    backend_options = {"evaluate": evaluate} if backend is not Hanging_Start_Backend else {}
+    options.setdefault("check_interval", 0.05)
+    return Aspen_Pool(workers, backend, backend_options, **options)
+
+
+def test_results_in_scenario_order(tmp_path):
+    scenarios = [{"x": i, "sleep": 0.1 * (i % 3)} for i in range(9)]
+    results = pool(3, evaluate=sleep_and_echo, work_dir=tmp_path, recycle_after=2).map(scenarios)
+
+    assert [result["x"] for result in results] == list(range(9))
+    assert {result["worker"] for result in results} == {0, 1, 2}
+    assert all(result["attempts"] == 1 for result in results)
+    assert sorted(os.listdir(tmp_path)) == ["worker_0", "worker_1", "worker_2"]
+
+
+def test_hung_scenario_is_retried(tmp_path):
+    scenarios = [{"x": 0}, {"x": 1, "marker": str(tmp_path / "marker"), "hang": True}, {"x": 2}]
+    test_pool = pool(2, evaluate=fail_once, work_dir=tmp_path, heartbeat_timeout=2, retries=1)
+    results = test_pool.map(scenarios)
+
+    assert [result["x"] for result in results] == [0, 1, 2]
+    assert results[1]["attempts"] == 2
+    assert test_pool.restarts == 1
+
+
+def test_hung_scenario_fails_after_retries(tmp_path):
+    results = pool(2, evaluate=hang, work_dir=tmp_path, heartbeat_timeout=2, retries=1).map([{"x": 0}])
+
+    assert results == [{"error": "no heartbeat for 2 s", "worker": 0, "attempts": 2}]
+
+
+def test_scenario_budget(tmp_path):
+    # The stand-in keeps beating while it runs, thus only the wall-clock budget stops it
+    test_pool = Aspen_Pool(1, Local_Backend, {"delay": 30}, work_dir=tmp_path, scenario_timeout=0.5,
+                           heartbeat_timeout=None, retries=0, check_interval=0.05)
+    assert test_pool.map([{"x": 0}]) == [{"error": "no result within 0.5 s", "worker": 0, "attempts": 1}]
+
+
+def test_backend_exception_is_retried_on_new_backend(tmp_path):
+    scenarios = [{"x": 0}, {"x": 1, "break": True}, {"x": 2}]
+    results = pool(1, Breaking_Backend, work_dir=tmp_path, retries=1).map(scenarios)
+
+    # The broken backend is replaced, thus the following scenario succeeds
+    assert results[0]["x"] == 0 and results[2]["x"] == 2
+    assert results[2]["backend"] != results[0]["backend"]
+    assert results[1]["error"] == "RuntimeError('backend broken')"
+    assert results[1]["attempts"] == 2
+
+
+def test_backend_exception_retry_succeeds(tmp_path):
+    results = pool(1, evaluate=fail_once, work_dir=tmp_path, retries=2).map(
+        [{"x": 0, "marker": str(tmp_path / "marker")}])
+    assert results == [{"x": 0, "worker": 0, "attempts": 2}]
+
+
+def test_failed_scenario_after_retries(tmp_path):
+    results = pool(2, evaluate=always_fail, work_dir=tmp_path, retries=2).map([{"x": 0}])
+    assert results == [{"error": "RuntimeError('broken scenario')", "worker": 0, "attempts": 3}]
+
+
+def test_recycle_with_failing_close(tmp_path):
+    results = pool(1, Failing_Close_Backend, work_dir=tmp_path, recycle_after=1).map([{"x": i} for i in range(3)])
+    assert [result["scenario"]["x"] for result in results] == [0, 1, 2]
+
+
+def test_processes_killed_if_start_hangs(tmp_path):
+    killed.clear()
+    results = pool(1, Hanging_Start_Backend, work_dir=tmp_path, scenario_timeout=0.5, retries=0).map([{"x": 0}])
+
+    assert results == [{"error": "no result within 0.5 s", "worker": 0, "attempts": 1}]
+    assert killed == [4711, 4712]
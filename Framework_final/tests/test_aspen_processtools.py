@@ -0,0 +1,122 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aspen_processtools import (Aspen_Plus_ProcessTools, DS1_Target, MolarMasses_FLUEGAS, fluegas_N2conc,
+                                FluegasH2Oconc, FluegasO2conc)
+
+FLUEGAS = r"\Data\Streams\FLUEGAS"
+FLUEGAS_CO2Output = FLUEGAS + r"\Output\MASSFLOW\MIXED\CO2"
+
+
+def fluegas_nodes(flow_basis, total_flow, unit, composition=None):
+    nodes = {
+        FLUEGAS + r"\Input\FLOWBASE\MIXED": flow_basis,
+        FLUEGAS + r"\Input\TOTFLOW\MIXED": (total_flow, unit),
+        FLUEGAS + r"\Input\TEMP\MIXED": (48, "C"),
+        FLUEGAS + r"\Input\PRES\MIXED": (112, "kPa"),
+        FLUEGAS + r"\Input\FLOW\MIXED\CO2": 0.1,
+        FLUEGAS + r"\Input\FLOW\MIXED\N2": fluegas_N2conc(0.1),
+        FLUEGAS + r"\Input\FLOW\MIXED\O2": FluegasO2conc,
+        FLUEGAS + r"\Input\FLOW\MIXED\H2O": FluegasH2Oconc,
+        DS1_Target: 0.0,
+    }
+    if composition is not None:
+        nodes[FLUEGAS + r"\Input\BASIS\MIXED"] = composition
+    return nodes
+
+
+def create(aspen, nodes, CO2_output=0.2):
+    # The simulation of FLUEGAS returns a fixed CO2 mass flow in kg/s, e.g. of a two-phase feed
+    return aspen(nodes, simulate=lambda values: {FLUEGAS_CO2Output: CO2_output})
+
+
+def test_design_spec_mole_flow_without_extra_run(aspen):
+    Aspen_Plus = create(aspen, fluegas_nodes("MOLE", 200, "kmol/hr"))
+    Aspen_Plus_ProcessTools().design_spec(Aspen_Plus, 0.08)
+
+    target = 200 * 0.08 * MolarMasses_FLUEGAS["CO2"] * 0.95
+    assert Aspen_Plus.find_node(DS1_Target).Value == pytest.approx(target)
+    assert len(Aspen_Plus.Application.Engine.runs) == 1
+
+
+def test_design_spec_mass_flow_without_extra_run(aspen):
+    Aspen_Plus = create(aspen, fluegas_nodes("MASS", 6000, "kg/hr"))
+    Aspen_Plus_ProcessTools().design_spec(Aspen_Plus, 0.08)
+
+    fractions = np.array([0.08, fluegas_N2conc(0.08), FluegasO2conc, FluegasH2Oconc])
+    moles = 6000 / (fractions @ list(MolarMasses_FLUEGAS.values()))
+    assert Aspen_Plus.find_node(DS1_Target).Value == pytest.approx(moles * 0.08 * MolarMasses_FLUEGAS["CO2"] * 0.95)
+    assert len(Aspen_Plus.Application.Engine.runs) == 1
+
+
+@pytest.mark.parametrize("nodes", [
+    # The flue gas of the bkp file: the mole flow of a volume flow depends on the phase equilibrium of the feed
+    fluegas_nodes("VOLUME", 5000, "cum/hr"),
+    fluegas_nodes("MOLE", 200, "lbmol/hr"),
+    fluegas_nodes("MOLE", 200, "kmol/hr", composition="STDVOL-FRAC"),
+])
+def test_design_spec_runs_simulation_otherwise(aspen, nodes):
+    Aspen_Plus = create(aspen, nodes, CO2_output=0.2)
+    Aspen_Plus_ProcessTools().design_spec(Aspen_Plus, 0.08)
+
+    assert Aspen_Plus.find_node(DS1_Target).Value == pytest.approx(0.2 * 3600 * 0.95)
+    assert len(Aspen_Plus.Application.Engine.runs) == 2
+
+
+@pytest.mark.parametrize("closure", ["sequential", "coupled"])
+def test_step_closes_balances(process, closure):
+    Aspen_Plus = process()
+    Aspen_Plus, status, closure_runs, converged = Aspen_Plus_ProcessTools().step(Aspen_Plus, {"FLUEGAS CO2 conc": 0.1},
+                                                                                 closure)
+    assert converged
+    assert status[0]
+    assert 0 < closure_runs <= 20
+
+
+def test_step_not_converged_if_design_spec_run_stopped(process):
+    # The run of the design specification does not finish
+    Aspen_Plus = process(hang=[1], time_limit=0.05)
+    _, _, closure_runs, converged = Aspen_Plus_ProcessTools().step(Aspen_Plus, {"FLUEGAS CO2 conc": 0.1})
+    assert not converged
+    assert closure_runs == 0
+    assert len(Aspen_Plus.Application.Engine.runs) == 1
+
+
+def test_step_stops_closure_at_stopped_run(process):
+    # The second run of the MEA closure does not finish, the water balance is not closed from its results
+    Aspen_Plus = process(hang=[3], time_limit=0.05)
+    _, _, closure_runs, converged = Aspen_Plus_ProcessTools().step(Aspen_Plus, {"FLUEGAS CO2 conc": 0.1})
+    assert not converged
+    assert closure_runs == 2
+    assert Aspen_Plus.run_timeouts == 1
+
+
+def test_speculative_closure_on_several_instances(process):
+    instances = [process() for _ in range(3)]
+    tools = Aspen_Plus_ProcessTools()
+    Aspen_Plus, status, closure_runs, converged = tools.step(instances[0], {"FLUEGAS CO2 conc": 0.1}, "speculative",
+                                                             helpers=instances[1:])
+    assert converged
+    assert abs(tools.get_deltaMEA(Aspen_Plus)[0]) <= 6 and abs(tools.get_deltaH2O(Aspen_Plus)[0]) <= 6
+    # The candidates of a round run asynchronously on all instances except the one holding the best state
+    assert closure_runs == sum(len(instance.Application.Engine.runs) for instance in instances) - 1
+    runs = instances[0].Application.Engine.runs[1:] + [args for instance in instances[1:]
+                                                       for args in instance.Application.Engine.runs]
+    assert runs and all(args == (True,) for args in runs)
+
+
+def test_scenario_table_parsed_again_if_modified(tmp_path):
+    filename = str(tmp_path / "Scenarios")
+    columns = ["Runs", "FLUEGAS CO2 conc"]
+    pd.DataFrame({"Runs": [1, 2], "CO2 %": [4.0, 8.0]}).to_excel(filename + ".xlsx", index=False)
+    tools = Aspen_Plus_ProcessTools()
+    assert tools.get_fluegasCO2(1, columns, filename) == pytest.approx(0.08)
+
+    pd.DataFrame({"Runs": [1, 2], "CO2 %": [4.0, 12.0]}).to_excel(filename + ".xlsx", index=False)
+    # The modification time may not change within the resolution of the file system
+    mtime = os.stat(filename + ".xlsx").st_mtime_ns
+    os.utime(filename + ".xlsx", ns=(mtime + 10 ** 9, mtime + 10 ** 9))
+    assert tools.get_fluegasCO2(1, columns, filename) == pytest.approx(0.12)
@@ -0,0 +1,27 @@
+import time
+
+
+def test_heartbeat_during_first_wait(aspen):
+    # Typical runs of 1 s: the first check follows after 0.8 s, the heartbeat is called in between
+    Aspen_Plus = aspen({}, duration=1.0)
+    Aspen_Plus.run_times = [1.0]
+    beats = []
+    Aspen_Plus.heartbeat = lambda: beats.append(time.perf_counter())
+    Aspen_Plus.run_simulation()
+    assert Aspen_Plus.check_run_completion()
+
+    gaps = [b - a for a, b in zip(beats, beats[1:])]
+    assert len(beats) >= 4
+    assert max(gaps) <= Aspen_Plus.poll_interval_max + 0.1
+
+
+def test_only_completed_runs_are_typical_duration(aspen):
+    Aspen_Plus = aspen({}, hang=[2], time_limit=0.05)
+    Aspen_Plus.run_simulation()
+    assert Aspen_Plus.check_run_completion()
+    Aspen_Plus.run_simulation()
+    assert not Aspen_Plus.check_run_completion()
+
+    assert len(Aspen_Plus.run_times) == 1
+    assert Aspen_Plus.run_timeouts == 1
+    assert not Aspen_Plus.last_run_completed
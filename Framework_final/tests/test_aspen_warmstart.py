@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from aspen_processtools import LEANMEA_Loadings, TearMethod, closure_solvers
+from aspen_warmstart import Warm_Start_Store
+
+
+@pytest.fixture
+def bkp_file(tmp_path):
+    path = tmp_path / "MEA.bkp"
+    path.write_bytes(b"flowsheet")
+    return path
+
+
+def converged(process, loading):
+    # Stand-in flowsheet with the converged state of a scenario
+    Aspen_Plus = process()
+    Aspen_Plus.write_many({LEANMEA_Loadings[0]: loading})
+    return Aspen_Plus
+
+
+def test_nearest_state(process, tmp_path, bkp_file):
+    with Warm_Start_Store(tmp_path / "states.sqlite", bkp_file=bkp_file, max_distance=0.05) as store:
+        for conc, loading in [(0.04, 0.15), (0.10, 0.17), (0.16, 0.19)]:
+            store.save(converged(process, loading), {"FLUEGAS CO2 conc": conc})
+
+        distance, state, snapshot, vector = store.nearest({"FLUEGAS CO2 conc": 0.11})
+        assert distance == pytest.approx(0.01)
+        assert state["nodes"][LEANMEA_Loadings[0]] == 0.17
+        assert snapshot is None
+        assert np.allclose(vector, [0.10])
+        assert store.nearest({"FLUEGAS CO2 conc": 0.30}) is None
+
+
+def test_restore_state_and_solver_estimates(process, tmp_path, bkp_file):
+    solvers = closure_solvers()
+    solvers["MEA"].set_estimate(-1234.0)
+    filepath = tmp_path / "states.sqlite"
+    with Warm_Start_Store(filepath, bkp_file=bkp_file) as store:
+        store.save(converged(process, 0.17), {"FLUEGAS CO2 conc": 0.10}, solvers)
+
+    # A second instance reads the states of the first one
+    Aspen_Plus = process()
+    Aspen_Plus.write_many({TearMethod: "BROYDEN"})
+    restored_solvers = closure_solvers()
+    with Warm_Start_Store(filepath, bkp_file=bkp_file) as store:
+        assert store.restore(Aspen_Plus, {"FLUEGAS CO2 conc": 0.11}, restored_solvers)
+    assert Aspen_Plus.find_node(LEANMEA_Loadings[0]).Value == 0.17
+    assert Aspen_Plus.find_node(TearMethod).Value == "WEGSTEIN"
+    assert restored_solvers["MEA"].get_estimate() == -1234.0
+
+
+def test_states_of_other_bkp_file_ignored(process, tmp_path, bkp_file):
+    filepath = tmp_path / "states.sqlite"
+    with Warm_Start_Store(filepath, bkp_file=bkp_file) as store:
+        store.save(converged(process, 0.17), {"FLUEGAS CO2 conc": 0.10})
+
+    bkp_file.write_bytes(b"modified flowsheet")
+    Aspen_Plus = process()
+    with Warm_Start_Store(filepath, bkp_file=bkp_file) as store:
+        assert store.nearest({"FLUEGAS CO2 conc": 0.10}) is None
+        assert not store.restore(Aspen_Plus, {"FLUEGAS CO2 conc": 0.10})
+    assert Aspen_Plus.find_node(LEANMEA_Loadings[0]).Value == 0.1
+
+
+def test_snapshot_saved_outside_transaction(process, tmp_path, bkp_file):
+    store = Warm_Start_Store(tmp_path / "states.sqlite", bkp_file=bkp_file, snapshot_dir=tmp_path / "snapshots")
+    Aspen_Plus = converged(process, 0.17)
+    transactions = []
+    save_as = Aspen_Plus.SaveAs
+
+    def record(path, overwrite=True):
+        transactions.append(store._connection.in_transaction)
+        save_as(path, overwrite)
+
+    Aspen_Plus.SaveAs = record
+    store.save(Aspen_Plus, {"FLUEGAS CO2 conc": 0.10})
+    assert transactions == [False]
+
+    snapshot = store.nearest({"FLUEGAS CO2 conc": 0.10})[2]
+    assert Aspen_Plus.Application.saved == [snapshot]
+    assert snapshot.startswith(str(tmp_path / "snapshots"))
+    store.close()
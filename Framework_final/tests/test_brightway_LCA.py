@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+bd = pytest.importorskip("bw2data")
+
+# Methods of the fixture project, the characterization factors are given by code of biosphere3
+GWP = ("ReCiPe 2016 v1.03", "midpoint (E)", "global warming potential (GWP1000)")
+methods = {
+    GWP: {"aa7cac3a-3625-41d4-bc54-33e2cf11ec46": 1.0, "methane": 34.0},
+    ("ReCiPe 2016 v1.03", "midpoint (E)", "water consumption potential (WCP)"): {
+        "075e433b-4be4-448e-9510-9a5029c1ce94": 1.0},
+    ("ReCiPe 2016 v1.03", "midpoint (E)", "human toxicity: carcinogenic (HTPc)"): {
+        "9f550c00-0f0f-45e7-a29c-a450752d4c7a": 0.3, "methane": 0.01},
+}
+
+# Aspen Plus results of two runs (see brightway_LCA.py)
+sim_data = [
+    pd.DataFrame(np.array([[19300], [19200]])).T,
+    pd.DataFrame(np.array([
+        [889.705289, 6093.5031, 936.35607, 4466.55226, 259.38827, 431.20635, 0.0, 0.0, 5379.03648, 45.19897,
+         4466.45466, 862.40675, 0.00819, 200.0, 16.55464, 0.14295],
+        [800.0, 6000.0, 900.0, 4400.0, 260.0, 430.0, 0.0, 0.0, 5300.0, 45.0, 4400.0, 860.0, 0.01, 210.0, 17.0, 0.15],
+    ])).T,
+    pd.DataFrame(np.array([[82367.01, 45010.44686], [82000, 44000]])).T,
+    pd.DataFrame(np.array([[3708.06766, 5.3988, 0.8998], [3600, 5.5, 1.0]])).T,
+    pd.DataFrame(np.array([[50000, 2327.55259, 38000, 1745.66444], [49000, 2300, 37000, 1700]])).T,
+]
+
+
+@pytest.fixture(scope="module")
+def project(tmp_path_factory):
+    """
+    Project project_E2DT in a temporary directory with a small background in place of ecoinvent: the background
+    activities of the foreground system emit CO2 and methane and supply each other
+    """
+    from brightway_foreground import background_activities, ecoinvent_version_biosphere, ecoinvent_version_cutoff
+
+    base_dir = bd.projects._base_data_dir
+    bd.projects.change_base_directories(tmp_path_factory.mktemp("brightway"), project_name="project_E2DT")
+
+    biosphere = [code for database, code in background_activities.values() if database == ecoinvent_version_biosphere]
+    bd.Database(ecoinvent_version_biosphere).write({
+        (ecoinvent_version_biosphere, code): {"name": code, "type": "emission", "unit": "kilogram"}
+        for code in biosphere + ["methane"]
+    })
+    codes = [code for database, code in background_activities.values() if database == ecoinvent_version_cutoff]
+    rng = np.random.default_rng(0)
+    bd.Database(ecoinvent_version_cutoff).write({
+        (ecoinvent_version_cutoff, code): {
+            "name": f"background {k}", "unit": "kilogram", "location": "GLO", "type": "process",
+            "exchanges": [
+                {"input": (ecoinvent_version_cutoff, code), "amount": 1, "type": "production"},
+                {"input": (ecoinvent_version_cutoff, codes[(k + 1) % len(codes)]), "amount": 0.05,
+                 "type": "technosphere"},
+                {"input": (ecoinvent_version_biosphere, biosphere[0]), "amount": rng.uniform(0.1, 3),
+                 "type": "biosphere"},
+                {"input": (ecoinvent_version_biosphere, "methane"), "amount": rng.uniform(0.001, 0.01),
+                 "type": "biosphere"},
+            ],
+        }
+        for k, code in enumerate(codes)
+    })
+    for method, factors in methods.items():
+        bd.Method(method).register()
+        bd.Method(method).write([((ecoinvent_version_biosphere, code), factor) for code, factor in factors.items()])
+
+    yield
+    bd.projects.change_base_directories(base_dir)
+
+
+@pytest.fixture
+def store(tmp_path):
+    # The results are kept in a Result_Store, thus no Excel file is written
+    from brightway_utilis import Result_Store
+    return Result_Store(str(tmp_path / "LCA_results.sqlite"))
+
+
+def test_foreground_modes_agree(project, store):
+    from brightway_LCA import run_LCA, run_LCA_batch
+    from brightway_engine import LCA_Engine
+
+    rebuild = [run_LCA(sim_data, i, store=store) for i in (0, 1)]
+    assert all(score > 0 for score in rebuild)
+    for foreground in ("persistent", "in_memory"):
+        scores = [run_LCA(sim_data, i, foreground=foreground, store=store) for i in (0, 1)]
+        assert np.allclose(scores, rebuild, rtol=4e-9, atol=0)
+
+    engine = LCA_Engine("ReCiPe 2016 v1.03 midpoint (E) global warming potential")
+    assert engine.methods == [GWP]
+    scores = [run_LCA(sim_data, i, engine=engine, store=store) for i in (0, 1)]
+    assert np.allclose(scores, rebuild, rtol=4e-9, atol=0)
+    assert np.allclose(run_LCA_batch(sim_data, engine, store=store)[:, 0], rebuild, rtol=4e-9, atol=0)
+
+    # All methods of the project at once, the scores of the GWP agree with the single method
+    engine = LCA_Engine("ReCiPe 2016 v1.03 | midpoint (E) | *")
+    assert sorted(engine.methods) == sorted(methods)
+    batch = run_LCA_batch(sim_data, engine, store=store)
+    assert batch.shape == (2, len(methods))
+    gwp = engine.methods.index(GWP)
+    assert np.allclose(batch[:, gwp], rebuild, rtol=4e-9, atol=0)
+    for i in (0, 1):
+        assert np.allclose(run_LCA(sim_data, i, engine=engine, store=store), batch[i], rtol=4e-9, atol=0)
+
+
+def test_method_resolver_index_follows_methods(project):
+    from brightway_utilis import Method_Resolver, find_methods
+
+    resolver = Method_Resolver()
+    assert resolver.resolve("ReCiPe 2016 v1.03 midpoint (E) global warming potential") == GWP
+    signature = resolver._signature()
+    assert Method_Resolver()._index()["queries"]
+
+    # A new method changes the signature, the cached queries are dropped
+    method = ("ReCiPe 2016 v1.03", "midpoint (E)", "ozone depletion (ODPinfinite)")
+    bd.Method(method).register()
+    try:
+        assert resolver._signature() != signature
+        assert resolver.resolve("ReCiPe 2016 v1.03 midpoint (E) ozone depletion") == method
+    finally:
+        bd.Method(method).deregister()
+    assert resolver._signature() == signature
+
+    with pytest.raises(KeyError, match="No LCIA method matches"):
+        find_methods("EF v3.1 | *")